@@ -0,0 +1,11 @@
+import os
+from django.core.asgi import get_asgi_application
+
+from deals import metrics
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm_project.settings")
+# Under ASGI the sync ORM work of each request runs in that request's own thread,
+# so a persistent connection would never be reused; open one per request instead.
+os.environ.setdefault("DB_CONN_MAX_AGE", "0")
+application = get_asgi_application()
+metrics.flush_at_exit()
@@ -25,6 +25,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so that session/auth queries are counted too
+    "deals.middleware.QueryMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -32,6 +34,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # After auth: PROFILE_STAFF looks at request.user. Removes itself when profiling is off
+    "deals.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "crm_project.urls"
@@ -51,13 +55,31 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "crm_project.wsgi.application"
+# ASGI entry point for many slow clients on one process (async downloads and JSON endpoints):
+#   gunicorn crm_project.asgi:application -k uvicorn.workers.UvicornWorker
+ASGI_APPLICATION = "crm_project.asgi.application"
 
+# deals.sqlite_backend = the stock sqlite3 backend + OPTIONS["transaction_mode"]:
+# IMMEDIATE makes concurrent writers wait for busy_timeout instead of failing with
+# "database is locked". Connections are kept between requests (CONN_MAX_AGE; asgi.py defaults it to 0).
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
+        "ENGINE": "deals.sqlite_backend",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "600")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"transaction_mode": os.getenv("SQLITE_TRANSACTION_MODE", "IMMEDIATE")},
     }
 }
+# Applied to every new SQLite connection by deals.db (connection_created)
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "20000")),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),  # with WAL a power loss may drop only the last commits
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MB per connection
+    "temp_store": "MEMORY",
+}
 
 # Upload / BLOB-specific settings
 FILE_UPLOAD_HANDLERS = [
@@ -65,6 +87,68 @@ FILE_UPLOAD_HANDLERS = [
 ]
 FILE_UPLOAD_MAX_MEMORY_SIZE = 2_621_440  # 2.5 MB: larger goes to temp file
 MAX_UPLOAD_SIZE = 200 * 1024 * 1024  # 200 MB limit for writing to DB
+DOCUMENT_DOWNLOAD_CHUNK_SIZE = 256 * 1024  # download is streamed in slices of this size
+IMPORT_CHUNK_SIZE = 1000  # companies/contacts import: rows per bulk write and transaction
+EXPORT_CHUNK_SIZE = 2000  # streaming export: rows fetched from the DB per round trip
+
+# Document bytes live outside the DB, addressed by SHA-256 (identical files are stored once)
+DOCUMENT_STORAGE = {
+    "BACKEND": "deals.storage.LocalBlobStorage",
+    "OPTIONS": {"location": os.getenv("DOCUMENT_STORAGE_ROOT", BASE_DIR / "blobs")},
+}
+
+# Shared between gunicorn workers: deals.refdata keeps reference data (stages, choices)
+# in process memory and uses a version key here to invalidate it in every worker.
+# Point CACHE_BACKEND/CACHE_LOCATION at redis or memcached when workers span hosts.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / "cache")),
+    }
+}
+REFDATA_CACHE = "default"
+
+# Per-request DB metrics (deals.middleware): Server-Timing header and a "deals.queries" log line,
+# logged as WARNING above QUERY_COUNT_WARNING queries. The header reveals timings, keep it off in prod.
+SERVER_TIMING_HEADER = os.getenv("SERVER_TIMING_HEADER", str(DEBUG)) == "True"
+QUERY_COUNT_WARNING = int(os.getenv("QUERY_COUNT_WARNING", "50"))
+
+# On-demand profiling (deals.middleware.ProfilingMiddleware), off unless one of the triggers is set:
+# a share of all requests, requests sending "X-Profile: <PROFILE_SECRET>", or (PROFILE_STAFF) staff users.
+# Sync-only: under ASGI, requests are handed to a thread while profiling is on.
+# "sample" = low-overhead stack sampler, collapsed stacks for flamegraphs; "cprofile" = .pstats; "both".
+# Files go to PROFILE_DIR, only the newest PROFILE_KEEP are kept.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SECRET = os.getenv("PROFILE_SECRET", "")
+PROFILE_STAFF = os.getenv("PROFILE_STAFF", "False") == "True"
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+# Prometheus text metrics (deals.metrics) at /metrics. A background thread in each process flushes
+# its values to METRICS_DIR/<pid>-<start time>.json at most every METRICS_FLUSH_INTERVAL seconds;
+# /metrics sums all files, so gunicorn workers and run_reminders must share the directory (on one
+# host: files of dead pids are folded into METRICS_DIR/archive.json).
+METRICS_DIR = os.getenv("METRICS_DIR", str(BASE_DIR / "metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))
+# Access is checked against REMOTE_ADDR, which behind a local reverse proxy is the proxy itself.
+# Proxied requests (Forwarded / X-Forwarded-For / X-Real-IP present) are therefore refused
+# unless METRICS_TOKEN is set; scrapers then send "Authorization: Bearer <token>".
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Points METRICS_DIR at a temporary directory for the duration of the test run.
+TEST_RUNNER = "deals.tests.runner.DealsTestRunner"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "deals": {"handlers": ["console"], "level": os.getenv("DEALS_LOG_LEVEL", "WARNING")},
+    },
+}
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -77,7 +161,7 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-# Since we store files in DB, MEDIA settings are minimal
+# Documents go to DOCUMENT_STORAGE, MEDIA settings are minimal
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
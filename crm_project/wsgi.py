@@ -1,5 +1,8 @@
 import os
 from django.core.wsgi import get_wsgi_application
 
+from deals import metrics
+
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "crm_project.settings")
 application = get_wsgi_application()
+metrics.flush_at_exit()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Stage, Company, Contact, Deal, DealCompany, Document
+from .models import Stage, Company, Contact, Deal, DealCompany, Document, Blob, PipelineRollup
 
 @admin.register(Stage)
 class StageAdmin(admin.ModelAdmin):
@@ -12,6 +12,7 @@ class CompanyAdmin(admin.ModelAdmin):
 @admin.register(Contact)
 class ContactAdmin(admin.ModelAdmin):
     list_display = ("name", "company", "position", "phone", "email")
+    list_select_related = ("company",)
 
 class DealCompanyInline(admin.TabularInline):
     model = DealCompany
@@ -20,9 +21,24 @@ class DealCompanyInline(admin.TabularInline):
 @admin.register(Deal)
 class DealAdmin(admin.ModelAdmin):
     list_display = ("title", "stage", "cost", "owner", "created_at", "updated_at")
+    list_select_related = ("stage", "owner")
     inlines = [DealCompanyInline]
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ("filename", "deal", "uploader", "size", "uploaded_at")
-    readonly_fields = ("size", "uploaded_at")
+    list_select_related = ("deal", "uploader")
+    readonly_fields = ("size", "uploaded_at", "blob")
+    exclude = ("data",)
+
+@admin.register(Blob)
+class BlobAdmin(admin.ModelAdmin):
+    list_display = ("sha256", "size", "ref_count", "created_at")
+    readonly_fields = ("sha256", "size", "ref_count", "created_at")
+
+@admin.register(PipelineRollup)
+class PipelineRollupAdmin(admin.ModelAdmin):
+    list_display = ("owner", "stage", "month", "deal_count", "total_cost")
+    list_select_related = ("owner", "stage")
+    list_filter = ("stage",)
+    readonly_fields = ("owner", "stage", "month", "deal_count", "total_cost")
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 class DealsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "deals"
+
+    def ready(self):
+        from . import db, signals, storage  # noqa: F401
@@ -0,0 +1,79 @@
+"""
+Помощники для async-представлений на Django 4.2.
+
+В 4.2 login_required, require_http_methods и get_object_or_404 работают только
+с синхронными представлениями, а request.user — ленивый объект, который при
+первом обращении идёт в БД и в async-коде падает с SynchronousOnlyOperation.
+Здесь их async-аналоги; синхронная работа (сессия, ORM) уходит в поток через
+sync_to_async(thread_sensitive=True) — под ASGI это отдельный поток запроса.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import Model
+from django.http import Http404, HttpResponseNotAllowed
+from django.utils.log import log_response
+
+
+async def aget_user(request):
+    """Вычисляет request.user в потоке ORM; дальше к нему можно обращаться из async-кода."""
+
+    def resolve():
+        request.user.is_authenticated
+        return request.user
+
+    return await sync_to_async(resolve)()
+
+
+def async_login_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_require_http_methods(methods):
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = HttpResponseNotAllowed(methods)
+                log_response(
+                    "Method Not Allowed (%s): %s", request.method, request.path, response=response, request=request
+                )
+                return response
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    if isinstance(queryset, type) and issubclass(queryset, Model):
+        queryset = queryset._default_manager.all()
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+
+
+async def aiter_sync(iterator):
+    """
+    Отдаёт синхронный итератор как асинхронный: каждый next() выполняется в
+    потоке ORM, event loop между кусками свободен. Итератор закрывается в том
+    же потоке — в том числе при обрыве соединения клиентом.
+    """
+    read = sync_to_async(next)
+    try:
+        while (chunk := await read(iterator, None)) is not None:
+            yield chunk
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await sync_to_async(close)()
@@ -0,0 +1,403 @@
+"""
+Бенчмарк представлений deals.views на синтетических данных.
+
+Для каждого размера набора данных создаётся отдельная временная SQLite-база
+(как тестовая, но в файле — с настоящим вводом-выводом), наполняется
+DatasetGenerator и прогоняется через django.test.Client: без сети и без
+запущенного сервера. По каждому сценарию считаются p50/p95/p99 задержки,
+среднее число запросов к БД (из QueryMetricsMiddleware), пропускная
+способность; по каждому размеру — пик памяти Python (tracemalloc) за
+отдельный проход сценариев.
+
+compare() сравнивает результат с сохранённым ранее JSON (базовой линией) и
+возвращает список регрессий.
+
+run_concurrency() сравнивает WSGI и ASGI на медленных клиентах, скачивающих
+документ: WSGIHandler в пуле из workers потоков (как синхронные воркеры
+gunicorn) против одного event loop с ASGIHandler. Медленный клиент ждёт
+chunk_delay после каждого куска; задержка считается от момента, когда все
+клиенты «подключились».
+"""
+import asyncio
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from .datagen import DatasetGenerator
+from .models import Blob, Company, Deal, DealAction, Document
+from .storage import get_storage
+
+UPLOAD_SIZE = 256 * 1024
+
+
+class BenchmarkContext:
+    def __init__(self, user, seed):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+        self.rng = random.Random(seed)
+        self.deal_ids = list(Deal.objects.filter(owner=user).values_list("pk", flat=True)[:500])
+        self.company_ids = list(
+            Company.objects.filter(contacts__isnull=False).distinct().values_list("pk", flat=True)[:500]
+        )
+        self.document_ids = list(
+            Document.objects.filter(deal__owner=user, blob__isnull=False).values_list("pk", flat=True)[:500]
+        )
+        self.upload_payload = self.rng.randbytes(UPLOAD_SIZE)
+
+    def deal_id(self):
+        return self.rng.choice(self.deal_ids)
+
+
+def _deals_list(ctx):
+    return ctx.client.get(reverse("deals_list"))
+
+
+def _deal_edit(ctx):
+    return ctx.client.get(reverse("deal_edit", args=[ctx.deal_id()]))
+
+
+def _company_contacts(ctx):
+    return ctx.client.get(reverse("company_contacts", args=[ctx.rng.choice(ctx.company_ids)]))
+
+
+def _create_deal(ctx):
+    return ctx.client.post(reverse("create_deal"))
+
+
+def _action_create(ctx):
+    return ctx.client.post(
+        reverse("deal_action_create", args=[ctx.deal_id()]),
+        data={"description": "Бенчмарк", "recurrence": DealAction.Recurrence.WEEKLY},
+    )
+
+
+def _action_update(ctx):
+    action = DealAction.objects.filter(deal__owner=ctx.user).only("pk", "deal_id").order_by("?").first()
+    return ctx.client.post(
+        reverse("deal_action_update", args=[action.deal_id, action.pk]),
+        data={"description": f"Изменено {ctx.rng.random()}", "recurrence": DealAction.Recurrence.NONE},
+    )
+
+
+def _action_delete(ctx):
+    deal_id = ctx.deal_id()
+    action = DealAction.objects.create(deal_id=deal_id, description="Удалить")
+    return ctx.client.post(reverse("deal_action_delete", args=[deal_id, action.pk]))
+
+
+def _upload_document(ctx):
+    upload = SimpleUploadedFile("bench.pdf", ctx.upload_payload, content_type="application/pdf")
+    return ctx.client.post(reverse("upload_document", args=[ctx.deal_id()]), data={"file": upload})
+
+
+def _download_document(ctx):
+    response = ctx.client.get(reverse("download_document", args=[ctx.rng.choice(ctx.document_ids)]))
+    # Файл отдаётся потоком — задержка включает чтение всего тела.
+    for _ in response.streaming_content:
+        pass
+    return response
+
+
+SCENARIOS = {
+    "deals_list": _deals_list,
+    "deal_edit": _deal_edit,
+    "company_contacts": _company_contacts,
+    "create_deal": _create_deal,
+    "action_create": _action_create,
+    "action_update": _action_update,
+    "action_delete": _action_delete,
+    "upload_document": _upload_document,
+    "download_document": _download_document,
+}
+
+
+def percentile(values, pct):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def peak_alloc_mb(ctx, scenarios):
+    """
+    Пик памяти Python за один проход сценариев. ru_maxrss — максимум за всю
+    жизнь процесса и после большого размера не опускается; пик tracemalloc
+    сбрасывается перед каждым проходом. Трассировка замедляет запросы в разы,
+    поэтому проход идёт после замеров времени.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    try:
+        for name in scenarios:
+            SCENARIOS[name](ctx)
+        return round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def run_scenario(ctx, scenario, iterations, warmup):
+    for _ in range(warmup):
+        scenario(ctx)
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request_started = time.perf_counter()
+        response = scenario(ctx)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.__name__}: HTTP {response.status_code}")
+        queries.append(response.query_stats.count)
+    elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries": round(sum(queries) / len(queries), 2),
+        "throughput_rps": round(iterations / elapsed, 1),
+    }
+
+
+def _bench_database(directory):
+    """Временная файловая база: create_test_db с TEST.NAME в каталоге directory."""
+    old_name = connection.settings_dict["NAME"]
+    connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(directory, "bench.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    return old_name
+
+
+@contextmanager
+def bench_environment(**overrides):
+    """Временные база и хранилище документов; кэш — в памяти процесса."""
+    with tempfile.TemporaryDirectory() as directory:
+        bench_settings = override_settings(
+            DOCUMENT_STORAGE={"BACKEND": "deals.storage.LocalBlobStorage", "OPTIONS": {"location": directory}},
+            # refdata не должен делить версию справочников с рабочим кэшем.
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+            METRICS_DIR=os.path.join(directory, "metrics"),
+            **overrides,
+        )
+        bench_settings.enable()
+        old_name = _bench_database(directory)
+        try:
+            yield directory
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            bench_settings.disable()
+
+
+def run_size(scale, scenarios, iterations, warmup, seed, progress):
+    with bench_environment():
+        generator = DatasetGenerator(
+            users=max(1, round(10 * scale)),
+            companies=round(1000 * scale),
+            deals=round(5000 * scale),
+            seed=seed,
+        )
+        started = time.perf_counter()
+        dataset = generator.run()
+        progress(f"scale {scale}: {sum(dataset.values())} rows in {time.perf_counter() - started:.1f}s")
+        user = get_user_model().objects.get(username=f"load{seed}_0")
+        ctx = BenchmarkContext(user, seed)
+        views = {}
+        for name in scenarios:
+            views[name] = run_scenario(ctx, SCENARIOS[name], iterations, warmup)
+            progress(f"  {name}: {views[name]}")
+        return {"dataset": dataset, "peak_alloc_mb": peak_alloc_mb(ctx, scenarios), "views": views}
+
+
+def run_benchmarks(scales, scenarios=None, iterations=50, warmup=5, seed=42, progress=None):
+    progress = progress or (lambda message: None)
+    scenarios = list(scenarios or SCENARIOS)
+    setup_test_environment()
+    try:
+        sizes = {str(scale): run_size(scale, scenarios, iterations, warmup, seed, progress) for scale in scales}
+    finally:
+        teardown_test_environment()
+    return {
+        "created_at": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "iterations": iterations,
+        "seed": seed,
+        "sizes": sizes,
+    }
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Регрессии относительно baseline: p95 вырос больше чем на threshold (доля)
+    или выросло число запросов — оно от шума не зависит.
+    """
+    regressions = []
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if previous is None:
+            continue
+        for view, metrics in current["views"].items():
+            before = previous["views"].get(view)
+            if before is None:
+                continue
+            if metrics["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(
+                    f"{size}/{view}: p95 {before['p95_ms']} -> {metrics['p95_ms']} ms "
+                    f"(+{(metrics['p95_ms'] / before['p95_ms'] - 1) * 100:.0f}%)"
+                )
+            if metrics["queries"] > before["queries"]:
+                regressions.append(f"{size}/{view}: queries {before['queries']} -> {metrics['queries']}")
+    return regressions
+
+
+def _bench_document(size):
+    user = get_user_model().objects.create_user(username="bench-download")
+    deal = Deal.objects.create(title="Бенчмарк загрузок", owner=user)
+    writer = get_storage().writer()
+    writer.write(os.urandom(size))
+    document = Document.objects.create(
+        deal=deal,
+        filename="bench.bin",
+        content_type="application/octet-stream",
+        size=size,
+        blob=Blob.objects.acquire(writer),
+        uploader=user,
+    )
+    client = Client()
+    client.force_login(user)
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    return reverse("download_document", args=[document.pk]), cookie
+
+
+def _wsgi_download(handler, path, cookie, chunk_delay, connected_at):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_COOKIE": cookie,
+        "wsgi.input": BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.url_scheme": "http",
+    }
+    statuses = []
+    body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in body:
+            # Синхронный воркер занят, пока медленный клиент не примет кусок.
+            time.sleep(chunk_delay)
+    finally:
+        body.close()
+    if not statuses[0].startswith("200"):
+        raise RuntimeError(f"WSGI download: HTTP {statuses[0]}")
+    return time.perf_counter() - connected_at
+
+
+async def _asgi_download(handler, path, cookie, chunk_delay, connected_at):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"localhost"), (b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("localhost", 80),
+    }
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+        elif message.get("body"):
+            await asyncio.sleep(chunk_delay)
+
+    await handler(scope, receive, send)
+    if statuses[0] != 200:
+        raise RuntimeError(f"ASGI download: HTTP {statuses[0]}")
+    return time.perf_counter() - connected_at
+
+
+async def _asgi_clients(handler, path, cookie, chunk_delay, clients):
+    connected_at = time.perf_counter()
+    return await asyncio.gather(
+        *(_asgi_download(handler, path, cookie, chunk_delay, connected_at) for _ in range(clients))
+    )
+
+
+def _concurrency_stats(latencies, elapsed):
+    latencies_ms = [value * 1000 for value in latencies]
+    return {
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies_ms, 50), 1),
+        "p95_ms": round(percentile(latencies_ms, 95), 1),
+        "max_ms": round(max(latencies_ms), 1),
+    }
+
+
+def run_concurrency(clients=50, workers=4, size=1024 * 1024, chunk_size=64 * 1024, chunk_delay=0.02):
+    """Одни и те же медленные скачивания через WSGI (workers потоков) и через ASGI (один event loop)."""
+    with bench_environment(DOCUMENT_DOWNLOAD_CHUNK_SIZE=chunk_size, ALLOWED_HOSTS=["localhost"]):
+        path, cookie = _bench_document(size)
+        results = {}
+
+        handler = WSGIHandler()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_wsgi_download, handler, path, cookie, chunk_delay, started) for _ in range(clients)
+            ]
+            latencies = [future.result() for future in futures]
+        results["wsgi"] = _concurrency_stats(latencies, time.perf_counter() - started)
+
+        # Как в crm_project/asgi.py: у каждого запроса свой поток ORM, соединения не переиспользуются.
+        conn_max_age = connection.settings_dict["CONN_MAX_AGE"]
+        connection.settings_dict["CONN_MAX_AGE"] = 0
+        try:
+            handler = ASGIHandler()
+            started = time.perf_counter()
+            latencies = asyncio.run(_asgi_clients(handler, path, cookie, chunk_delay, clients))
+            results["asgi"] = _concurrency_stats(latencies, time.perf_counter() - started)
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = conn_max_age
+    return {
+        "clients": clients,
+        "wsgi_workers": workers,
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunk_delay_ms": chunk_delay * 1000,
+        **results,
+    }
@@ -0,0 +1,346 @@
+"""
+Генератор синтетических данных для нагрузочных тестов и бенчмарков.
+
+Все записи создаются через bulk_create пачками по batch_size, каждая пачка —
+в своей транзакции. Случайность идёт от одного random.Random(seed), поэтому
+одинаковые параметры дают одинаковый набор данных. bulk_create проходит мимо
+save() и сигналов — нормализованные поля и полнотекстовый индекс генератор
+заполняет сам, а сводку воронки пересобирает в конце.
+
+Файлы документов: в хранилище пишется пул из blob_pool блобов с размерами из
+логнормального распределения (медиана ~150 КБ, хвост до MAX_DOCUMENT_SIZE),
+документы ссылаются на блобы пула — как одинаковые файлы после дедупликации.
+"""
+import math
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import fulltext, rollups
+from .models import Blob, Company, Contact, Deal, DealAction, DealCompany, DealContact, Document, Stage
+from .storage import get_storage
+
+
+User = get_user_model()
+
+DEFAULT_STAGES = ["Контакт", "Предложение", "Договор", "Выполнение", "Закрыто", "Сделка сорвана"]
+# Доля сделок на этапах: воронка сужается.
+STAGE_WEIGHTS = [30, 25, 15, 12, 10, 8]
+
+COMPANY_FORMS = ["ООО", "АО", "ПАО", "ИП", "ЗАО"]
+COMPANY_WORDS = [
+    "Альфа", "Вектор", "Гранит", "Дельта", "Заря", "Империя", "Квант", "Лидер", "Магистраль", "Норд",
+    "Омега", "Прогресс", "Ресурс", "Сигма", "Техно", "Урал", "Феникс", "Хорс", "Центр", "Эталон",
+]
+COMPANY_SUFFIXES = ["Строй", "Инвест", "Логистик", "Сервис", "Трейд", "Групп", "Софт", "Энерго", "Мед", "Агро"]
+FIRST_NAMES = ["Александр", "Анна", "Дмитрий", "Елена", "Иван", "Мария", "Сергей", "Ольга", "Павел", "Татьяна"]
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев", "Козлов", "Новиков", "Морозов"]
+POSITIONS = ["Директор", "Бухгалтер", "Менеджер", "Закупщик", "Юрист", "Инженер", ""]
+DEAL_SUBJECTS = ["Поставка оборудования", "Строительство склада", "Внедрение CRM", "Аренда техники",
+                 "Сервисный договор", "Поставка материалов", "Разработка сайта", "Аудит", "Обучение персонала"]
+ACTION_TEXTS = ["Позвонить клиенту", "Отправить КП", "Согласовать договор", "Выставить счёт",
+                "Встреча в офисе", "Проверить оплату", "Напомнить о продлении"]
+DOCUMENT_TYPES = [
+    ("pdf", "application/pdf"),
+    ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ("jpg", "image/jpeg"),
+]
+RECURRENCE_WEIGHTS = [
+    (DealAction.Recurrence.NONE, 60),
+    (DealAction.Recurrence.WEEKLY, 15),
+    (DealAction.Recurrence.MONTHLY, 10),
+    (DealAction.Recurrence.DAILY, 5),
+    (DealAction.Recurrence.YEARLY, 5),
+    (DealAction.Recurrence.CUSTOM, 5),
+]
+MEDIAN_DOCUMENT_SIZE = 150 * 1024
+MAX_DOCUMENT_SIZE = 20 * 1024 * 1024
+BLOB_CHUNK_SIZE = 1024 * 1024
+
+
+@contextmanager
+def explicit_timestamps(*model_classes):
+    """
+    Временно отключает auto_now/auto_now_add: иначе bulk_create перезапишет
+    сгенерированные даты текущим временем, и все сделки окажутся в одном месяце.
+    """
+    saved = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class DatasetGenerator:
+    def __init__(
+        self,
+        users=10,
+        companies=1000,
+        deals=5000,
+        contacts_per_company=2.0,
+        actions_per_deal=2.0,
+        documents_per_deal=0.5,
+        blob_pool=32,
+        days=730,
+        seed=42,
+        batch_size=5000,
+        progress=None,
+    ):
+        self.users = users
+        self.companies = companies
+        self.deals = deals
+        self.contacts_per_company = contacts_per_company
+        self.actions_per_deal = actions_per_deal
+        self.documents_per_deal = documents_per_deal
+        self.blob_pool = blob_pool
+        self.days = days
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.progress = progress or (lambda message: None)
+        self.now = timezone.now()
+        self.counts = {}
+
+    # --- распределения ---------------------------------------------------
+
+    def _poisson(self, mean):
+        # Алгоритм Кнута: для средних в единицы достаточно быстро.
+        limit, count, product = math.exp(-mean), 0, self.rng.random()
+        while product > limit:
+            count += 1
+            product *= self.rng.random()
+        return count
+
+    def _past(self, days=None):
+        return self.now - timedelta(seconds=self.rng.uniform(0, (days or self.days) * 86400))
+
+    def _phone(self):
+        return f"+7 9{self.rng.randint(0, 99):02d} {self.rng.randint(0, 999):03d}-{self.rng.randint(0, 9999):04d}"
+
+    def _document_size(self):
+        size = int(self.rng.lognormvariate(math.log(MEDIAN_DOCUMENT_SIZE), 1.3))
+        return max(1024, min(size, MAX_DOCUMENT_SIZE))
+
+    def _cost(self):
+        if self.rng.random() < 0.1:
+            return None
+        return Decimal(int(self.rng.lognormvariate(math.log(300_000), 1.0))).quantize(Decimal("0.01"))
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def _count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    # --- шаги --------------------------------------------------------------
+
+    def run(self):
+        with explicit_timestamps(Company, Contact, Deal, Document):
+            stage_ids = self._stages()
+            user_ids = self._users()
+            company_ids, company_contacts = self._companies_and_contacts(user_ids)
+            blobs = self._blobs()
+            self._deals(stage_ids, user_ids, company_ids, company_contacts, blobs)
+        return self.counts
+
+    def _stages(self):
+        stages = list(Stage.objects.order_by("order_index", "pk"))
+        if not stages:
+            stages = [Stage.objects.create(name=name, order_index=i + 1) for i, name in enumerate(DEFAULT_STAGES)]
+        return [stage.pk for stage in stages]
+
+    def _users(self):
+        usernames = [f"load{self.seed}_{i}" for i in range(self.users)]
+        existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+        # Один хеш на всех: PBKDF2 на каждого пользователя занял бы минуты.
+        password = make_password("load-test")
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in usernames if name not in existing],
+            batch_size=self.batch_size,
+        )
+        self._count("users", len(usernames) - len(existing))
+        return list(User.objects.filter(username__in=usernames).order_by("pk").values_list("pk", flat=True))
+
+    def _companies_and_contacts(self, user_ids):
+        company_ids, company_contacts = [], []
+        for batch in self._batches(self.companies):
+            companies = []
+            for i in batch:
+                word = self.rng.choice(COMPANY_WORDS) + self.rng.choice(COMPANY_SUFFIXES)
+                created_at = self._past()
+                company = Company(
+                    name=f'{self.rng.choice(COMPANY_FORMS)} «{word} {i + 1}»',
+                    type=self.rng.choices(["client", "partner", "supplier"], [80, 10, 10])[0],
+                    phone=self._phone(),
+                    email=f"info{i + 1}@{word.lower()}.example",
+                    inn=str(self.rng.randint(10 ** 9, 10 ** 10 - 1)),
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+                companies.append(company.normalize())
+            with transaction.atomic():
+                Company.objects.bulk_create(companies)
+                contacts = []
+                for company in companies:
+                    for _ in range(self._poisson(self.contacts_per_company)):
+                        first, last = self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+                        created_at = company.created_at + (self.now - company.created_at) * self.rng.random()
+                        contacts.append(
+                            Contact(
+                                company=company,
+                                owner_id=self.rng.choice(user_ids),
+                                name=f"{last} {first}",
+                                position=self.rng.choice(POSITIONS),
+                                phone=self._phone(),
+                                email=f"{last.lower()}{self.rng.randint(1, 99999)}@example.com",
+                                created_at=created_at,
+                                updated_at=created_at,
+                            ).normalize()
+                        )
+                Contact.objects.bulk_create(contacts, batch_size=self.batch_size)
+                fulltext.index_objects(companies + contacts)
+            by_company = {}
+            for contact in contacts:
+                by_company.setdefault(contact.company_id, []).append(contact.pk)
+            for company in companies:
+                company_ids.append(company.pk)
+                company_contacts.append(by_company.get(company.pk, []))
+            self._count("companies", len(companies))
+            self._count("contacts", len(contacts))
+            self.progress(f"companies: {len(company_ids)}/{self.companies}")
+        return company_ids, company_contacts
+
+    def _blobs(self):
+        if not self.documents_per_deal:
+            return []
+        storage = get_storage()
+        blobs = []
+        for _ in range(self.blob_pool):
+            size = self._document_size()
+            chunks = (
+                self.rng.randbytes(min(BLOB_CHUNK_SIZE, size - offset)) for offset in range(0, size, BLOB_CHUNK_SIZE)
+            )
+            sha256, size = storage.save(chunks)
+            blob, _ = Blob.objects.get_or_create(sha256=sha256, defaults={"size": size})
+            blobs.append(blob)
+        self.progress(f"blobs: {len(blobs)} files written")
+        return blobs
+
+    def _deals(self, stage_ids, user_ids, company_ids, company_contacts, blobs):
+        blob_refs = {}
+        created = 0
+        stage_weights = [STAGE_WEIGHTS[min(i, len(STAGE_WEIGHTS) - 1)] for i in range(len(stage_ids))]
+        for batch in self._batches(self.deals):
+            deals, clients = [], []
+            for _ in batch:
+                created_at = self._past()
+                client = self.rng.randrange(len(company_ids)) if company_ids else None
+                clients.append(client)
+                deals.append(
+                    Deal(
+                        title=f"{self.rng.choice(DEAL_SUBJECTS)} №{self.rng.randint(1, 99999)}",
+                        owner_id=self.rng.choice(user_ids),
+                        stage_id=self.rng.choices(stage_ids, stage_weights)[0],
+                        client_id=company_ids[client] if client is not None else None,
+                        cost=self._cost(),
+                        created_at=created_at,
+                        updated_at=created_at + (self.now - created_at) * self.rng.random(),
+                    )
+                )
+            with transaction.atomic():
+                Deal.objects.bulk_create(deals)
+                links, deal_contacts, actions, documents = [], [], [], []
+                for deal, client in zip(deals, clients):
+                    links.extend(self._deal_companies(deal, company_ids))
+                    if client is not None and company_contacts[client]:
+                        contacts = company_contacts[client]
+                        for contact_id in self.rng.sample(contacts, min(len(contacts), self.rng.randint(0, 3))):
+                            deal_contacts.append(DealContact(deal=deal, contact_id=contact_id))
+                    actions.extend(self._actions(deal))
+                    documents.extend(self._documents(deal, blobs, blob_refs))
+                DealCompany.objects.bulk_create(links, batch_size=self.batch_size)
+                DealContact.objects.bulk_create(deal_contacts, batch_size=self.batch_size)
+                DealAction.objects.bulk_create(actions, batch_size=self.batch_size)
+                Document.objects.bulk_create(documents, batch_size=self.batch_size)
+                fulltext.index_objects(deals + actions)
+            created += len(deals)
+            for name, items in (
+                ("deals", deals), ("deal_companies", links), ("deal_contacts", deal_contacts),
+                ("actions", actions), ("documents", documents),
+            ):
+                self._count(name, len(items))
+            self.progress(f"deals: {created}/{self.deals}")
+        # Счётчики ссылок — одним UPDATE на блоб пула.
+        for blob_id, count in blob_refs.items():
+            Blob.objects.filter(pk=blob_id).update(ref_count=F("ref_count") + count)
+        # Дельты по пачкам трогали бы каждую строку сводки на каждой пачке;
+        # один пересчёт по всей таблице сделок дешевле.
+        rollups.rebuild(batch_size=self.batch_size)
+        self.progress("pipeline rollups rebuilt")
+
+    def _deal_companies(self, deal, company_ids):
+        links = []
+        if deal.client_id:
+            links.append(DealCompany(deal=deal, company_id=deal.client_id, role="client"))
+        if company_ids and self.rng.random() < 0.3:
+            other = self.rng.choice(company_ids)
+            if other != deal.client_id:
+                links.append(DealCompany(deal=deal, company_id=other, role=self.rng.choice(["partner", "supplier"])))
+        return links
+
+    def _actions(self, deal):
+        recurrences, weights = zip(*RECURRENCE_WEIGHTS)
+        actions = []
+        for _ in range(self._poisson(self.actions_per_deal)):
+            recurrence = self.rng.choices(recurrences, weights)[0]
+            starts_at = deal.created_at + (self.now - deal.created_at) * self.rng.random()
+            remind_at = None
+            if self.rng.random() < 0.3:
+                remind_at = self.now + timedelta(seconds=self.rng.uniform(0, 30 * 86400))
+            action = DealAction(
+                deal=deal,
+                description=self.rng.choice(ACTION_TEXTS),
+                starts_at=starts_at,
+                remind_at=remind_at,
+                remind_anchor=remind_at,
+                recurrence=recurrence,
+                custom_interval_days=self.rng.randint(2, 30) if recurrence == DealAction.Recurrence.CUSTOM else None,
+            )
+            actions.append(action)
+        return actions
+
+    def _documents(self, deal, blobs, blob_refs):
+        if not blobs:
+            return []
+        documents = []
+        for _ in range(self._poisson(self.documents_per_deal)):
+            blob = self.rng.choice(blobs)
+            extension, content_type = self.rng.choice(DOCUMENT_TYPES)
+            blob_refs[blob.pk] = blob_refs.get(blob.pk, 0) + 1
+            documents.append(
+                Document(
+                    deal=deal,
+                    filename=f"document_{self.rng.randint(1, 10 ** 6)}.{extension}",
+                    content_type=content_type,
+                    size=blob.size,
+                    blob=blob,
+                    uploaded_at=deal.created_at + (self.now - deal.created_at) * self.rng.random(),
+                    uploader_id=deal.owner_id,
+                )
+            )
+        return documents
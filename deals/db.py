@@ -0,0 +1,42 @@
+"""
+Настройка SQLite-соединений.
+
+Каждое новое соединение (сигнал connection_created) получает PRAGMA из
+settings.SQLITE_PRAGMAS: WAL позволяет читать во время записи, busy_timeout —
+ждать блокировку вместо мгновенного "database is locked", остальные
+параметры уменьшают число обращений к диску. journal_mode=WAL сохраняется в
+файле базы, прочие PRAGMA действуют только на соединение, поэтому
+выставляются заново для каждого.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+ALLOWED_PRAGMAS = {"journal_mode", "busy_timeout", "synchronous", "mmap_size", "cache_size", "temp_store"}
+VALUE_RE = re.compile(r"^(-?\d+|[A-Za-z_]+)$")
+
+
+def apply_pragmas(cursor, pragmas):
+    """Выполняет PRAGMA name=value. Имена и значения проверяются: в PRAGMA нельзя передать параметр запроса."""
+    for name, value in pragmas.items():
+        if name not in ALLOWED_PRAGMAS:
+            raise ValueError(f"Неподдерживаемая PRAGMA: {name}")
+        if not VALUE_RE.match(str(value)):
+            raise ValueError(f"Некорректное значение PRAGMA {name}: {value!r}")
+        cursor.execute(f"PRAGMA {name}={value}")
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(getattr(settings, "SQLITE_PRAGMAS", {}))
+    if connection.is_in_memory_db():
+        # У базы в памяти нет журнала на диске (тестовая БД).
+        pragmas.pop("journal_mode", None)
+    if pragmas:
+        with connection.cursor() as cursor:
+            apply_pragmas(cursor, pragmas)
@@ -0,0 +1,187 @@
+"""
+Поиск и слияние дубликатов компаний и контактов.
+
+Сравнивать каждую запись с каждой — O(n²). Вместо этого записи разбиваются на
+блоки по ключу (нормализованный ИНН, телефон, email, название): дубликаты
+могут быть только внутри блока. GROUP BY по индексированному ключу находит
+блоки из двух и более записей, а union-find склеивает блоки разных ключей
+в группы: A и B с общим телефоном, B и C с общим email → группа {A, B, C}.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from . import fulltext
+from .models import Company, Contact, Deal, DealCompany, DealContact
+
+
+COMPANY_KEYS = ("inn_normalized", "phone_normalized", "email_normalized", "search_name")
+CONTACT_KEYS = ("phone_normalized", "email_normalized")
+# Ограничение числа параметров в IN (...) для SQLite.
+IN_BATCH_SIZE = 500
+
+
+class DuplicateGroup:
+    def __init__(self, ids, reasons):
+        self.ids = sorted(ids)
+        # ключ -> значения, по которым записи группы совпали
+        self.reasons = reasons
+
+    def __repr__(self):
+        return f"DuplicateGroup({self.ids}, {self.reasons})"
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        root = self.parent.setdefault(item, item)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while item != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            # Корень — меньший id, чтобы группы были стабильны.
+            self.parent[max(first, second)] = min(first, second)
+
+
+def _batches(items, size=IN_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def find_duplicates(queryset, keys):
+    """Группы записей queryset, совпадающих хотя бы по одному из ключей keys."""
+    groups = _UnionFind()
+    reasons = {}
+    queryset = queryset.order_by()
+    for key in keys:
+        duplicated = (
+            queryset.exclude(**{key: ""})
+            .values(key)
+            .annotate(count=Count("pk"))
+            .filter(count__gt=1)
+            .values_list(key, flat=True)
+        )
+        for values in _batches(duplicated):
+            first_by_value = {}
+            for pk, value in queryset.filter(**{f"{key}__in": values}).values_list("pk", key):
+                if value in first_by_value:
+                    groups.union(first_by_value[value], pk)
+                else:
+                    first_by_value[value] = pk
+                reasons.setdefault(pk, {})[key] = value
+
+    members = {}
+    for pk in groups.parent:
+        members.setdefault(groups.find(pk), set()).add(pk)
+    result = []
+    for root in sorted(members):
+        ids = members[root]
+        # Значение ключа попадает сюда, только если его делят минимум две записи,
+        # а они после union оказываются в одной группе.
+        group_reasons = {}
+        for pk in ids:
+            for key, value in reasons[pk].items():
+                group_reasons.setdefault(key, set()).add(value)
+        result.append(DuplicateGroup(ids, {key: sorted(values) for key, values in group_reasons.items()}))
+    return result
+
+
+def find_company_duplicates():
+    return find_duplicates(Company.objects.all(), COMPANY_KEYS)
+
+
+def find_contact_duplicates(queryset=None):
+    return find_duplicates(queryset if queryset is not None else Contact.objects.all(), CONTACT_KEYS)
+
+
+def _fill_blanks(target, sources, fields):
+    changed = []
+    for field in fields:
+        if getattr(target, field) in ("", None):
+            for source in sources:
+                value = getattr(source, field)
+                if value not in ("", None):
+                    setattr(target, field, value)
+                    changed.append(field)
+                    break
+    return changed
+
+
+@transaction.atomic
+def merge_companies(target, sources):
+    """
+    Переносит в target контакты, связи DealCompany и Deal.client компаний sources
+    и удаляет их. Всё — массовыми UPDATE в одной транзакции. Пустые поля target
+    заполняются из sources.
+    """
+    source_ids = [source.pk for source in sources if source.pk != target.pk]
+    if not source_ids:
+        return {"contacts": 0, "deal_companies": 0, "deals": 0, "deleted": 0}
+    sources = list(Company.objects.filter(pk__in=source_ids).order_by("pk"))
+
+    contact_ids = list(Contact.objects.filter(company_id__in=source_ids).values_list("pk", flat=True))
+    now = timezone.now()
+    # QuerySet.update не трогает auto_now — версию для ETag выставляем сами.
+    Contact.objects.filter(pk__in=contact_ids).update(company=target, updated_at=now)
+
+    # DealCompany уникальна по (deal, company, role): связь, которая уже есть у
+    # target (или встречается у нескольких sources), не переносится, а удаляется.
+    taken = set(DealCompany.objects.filter(company=target).values_list("deal_id", "role"))
+    move, drop = [], []
+    for pk, deal_id, role in (
+        DealCompany.objects.filter(company_id__in=source_ids).order_by("pk").values_list("pk", "deal_id", "role")
+    ):
+        if (deal_id, role) in taken:
+            drop.append(pk)
+        else:
+            taken.add((deal_id, role))
+            move.append(pk)
+    DealCompany.objects.filter(pk__in=drop).delete()
+    DealCompany.objects.filter(pk__in=move).update(company=target)
+
+    deals = Deal.objects.filter(client_id__in=source_ids).update(client=target, updated_at=now)
+
+    changed = _fill_blanks(target, sources, ("phone", "email", "address", "inn", "website"))
+    if changed:
+        target.save(update_fields=[*changed, "updated_at"])
+
+    # Контакты переехали UPDATE'ом без сигналов — обновляем им родителя в индексе.
+    fulltext.index_objects(Contact.objects.filter(pk__in=contact_ids))
+    for source in sources:
+        source.delete()
+    return {"contacts": len(contact_ids), "deal_companies": len(move), "deals": deals, "deleted": len(sources)}
+
+
+@transaction.atomic
+def merge_contacts(target, sources):
+    """Переносит связи сделок DealContact с контактов sources на target и удаляет sources."""
+    source_ids = [source.pk for source in sources if source.pk != target.pk]
+    if not source_ids:
+        return {"deal_contacts": 0, "deleted": 0}
+    sources = list(Contact.objects.filter(pk__in=source_ids).order_by("pk"))
+
+    linked = set(DealContact.objects.filter(contact=target).values_list("deal_id", flat=True))
+    move, drop = [], []
+    for pk, deal_id in DealContact.objects.filter(contact_id__in=source_ids).order_by("pk").values_list("pk", "deal_id"):
+        if deal_id in linked:
+            drop.append(pk)
+        else:
+            linked.add(deal_id)
+            move.append(pk)
+    DealContact.objects.filter(pk__in=drop).delete()
+    DealContact.objects.filter(pk__in=move).update(contact=target)
+
+    changed = _fill_blanks(target, sources, ("position", "phone", "email", "messengers"))
+    if changed:
+        target.save(update_fields=[*changed, "updated_at"])
+    for source in sources:
+        source.delete()
+    return {"deal_contacts": len(move), "deleted": len(sources)}
@@ -0,0 +1,190 @@
+import asyncio
+import re
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.asyncio import aclosing
+from django.utils.encoding import smart_str
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import metrics
+from .async_support import aiter_sync
+from .models import Document
+from .storage import get_storage
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def get_chunk_size():
+    return getattr(settings, "DOCUMENT_DOWNLOAD_CHUNK_SIZE", 256 * 1024)
+
+
+def document_etag(doc):
+    return f'"doc-{doc.pk}-{doc.size}-{int(doc.uploaded_at.timestamp())}"'
+
+
+def parse_range(header, size):
+    """
+    Разбирает заголовок Range для одного диапазона.
+
+    Возвращает (start, end) включительно или None, если заголовок нужно
+    проигнорировать и отдать файл целиком. Для невыполнимого диапазона
+    поднимает ValueError (ответ 416).
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match:
+        # Несколько диапазонов и прочие единицы не поддерживаем — RFC 9110
+        # разрешает в этом случае отдать полный ответ.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, last_modified):
+    value = request.META.get("HTTP_IF_RANGE")
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(("W/", '"')):
+        # Для If-Range допустимо только строгое сравнение ETag.
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def iter_database_blob(doc_id, offset, length, chunk_size=None):
+    chunk_size = chunk_size or get_chunk_size()
+    end = offset + length
+    table = Document._meta.db_table
+    column = Document._meta.get_field("data").column
+
+    connection.ensure_connection()
+    raw = connection.connection
+    if connection.vendor == "sqlite" and hasattr(raw, "blobopen"):
+        # Инкрементальное чтение BLOB: SQLite не материализует значение целиком.
+        with raw.blobopen(table, column, doc_id, readonly=True) as blob:
+            blob.seek(offset)
+            while offset < end:
+                chunk = blob.read(min(chunk_size, end - offset))
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        return
+
+    qn = connection.ops.quote_name
+    sql = f"SELECT substr({qn(column)}, %s, %s) FROM {qn(table)} WHERE id = %s"
+    while offset < end:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [offset + 1, min(chunk_size, end - offset), doc_id])
+            row = cursor.fetchone()
+        if row is None or not row[0]:
+            break
+        chunk = bytes(row[0])
+        offset += len(chunk)
+        yield chunk
+
+
+def iter_storage_blob(sha256, offset, length, chunk_size=None):
+    chunk_size = chunk_size or get_chunk_size()
+    with get_storage().open(sha256) as fh:
+        fh.seek(offset)
+        while length > 0:
+            chunk = fh.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def aiter_storage_blob(sha256, offset, length, chunk_size=None):
+    # Обычный пул потоков, а не sync_to_async: файлу не нужен контекст Django,
+    # а переключение контекста на каждый кусок заметно дороже самого чтения.
+    chunk_size = chunk_size or get_chunk_size()
+    loop = asyncio.get_running_loop()
+    fh = await loop.run_in_executor(None, get_storage().open, sha256)
+    try:
+        await loop.run_in_executor(None, fh.seek, offset)
+        while length > 0:
+            chunk = await loop.run_in_executor(None, fh.read, min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await loop.run_in_executor(None, fh.close)
+
+
+def iter_document(doc, offset, length):
+    if doc.blob_id:
+        chunks = iter_storage_blob(doc.blob.sha256, offset, length)
+    else:
+        chunks = iter_database_blob(doc.pk, offset, length)
+    return metrics.count_bytes(chunks, "download")
+
+
+async def aiter_document(doc, offset, length):
+    if doc.blob_id:
+        chunks = aiter_storage_blob(doc.blob.sha256, offset, length)
+    else:
+        # BLOB в БД читается через соединение — только в потоке ORM.
+        chunks = aiter_sync(iter_database_blob(doc.pk, offset, length))
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            metrics.document_bytes.inc(len(chunk), direction="download")
+            yield chunk
+
+
+def document_response(request, doc):
+    size = doc.size
+    etag = document_etag(doc)
+    last_modified = int(doc.uploaded_at.timestamp())
+
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and size and if_range_matches(request, etag, last_modified):
+        try:
+            requested = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
+        if requested is not None:
+            start, end = requested
+            status = 206
+
+    length = end - start + 1 if size else 0
+    if isinstance(request, ASGIRequest):
+        # Синхронный итератор Django под ASGI сначала читает в память целиком;
+        # асинхронный отдаёт по куску, не занимая поток, пока клиент принимает.
+        chunks = aiter_document(doc, start, length)
+    else:
+        chunks = iter_document(doc, start, length)
+    response = StreamingHttpResponse(
+        chunks,
+        status=status,
+        content_type=doc.content_type or "application/octet-stream",
+    )
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Disposition"] = f'attachment; filename="{smart_str(doc.filename)}"'
+    return response
@@ -0,0 +1,195 @@
+"""
+Потоковая выгрузка сделок, компаний и контактов в CSV и JSON Lines.
+
+Строки читаются через values_list().iterator(chunk_size) — без создания
+моделей и без загрузки всей таблицы; связанные данные, которые нельзя
+получить JOIN'ом без размножения строк (контакты сделки), добираются одним
+запросом на пачку. Генераторы отдают готовые строки текста, так что память
+не зависит от размера таблицы.
+"""
+import csv
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import filters
+from .models import DealContact
+
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+# Колонка выгрузки → путь для values_list.
+DEAL_COLUMNS = {
+    "id": "id",
+    "title": "title",
+    "stage": "stage__name",
+    "owner": "owner__username",
+    "cost": "cost",
+    "client": "client__name",
+    "client_inn": "client__inn",
+    "client_phone": "client__phone",
+    "client_email": "client__email",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+COMPANY_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "type": "type",
+    "phone": "phone",
+    "email": "email",
+    "address": "address",
+    "inn": "inn",
+    "website": "website",
+    "created_at": "created_at",
+}
+CONTACT_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "position": "position",
+    "phone": "phone",
+    "email": "email",
+    "messengers": "messengers",
+    "company_id": "company_id",
+    "company": "company__name",
+    "company_inn": "company__inn",
+    "owner": "owner__username",
+    "created_at": "created_at",
+}
+
+
+def _deal_contacts(deal_ids):
+    contacts = {}
+    rows = (
+        DealContact.objects.filter(deal_id__in=deal_ids)
+        .order_by("deal_id", "pk")
+        .values_list("deal_id", "contact__name", "contact__email")
+    )
+    for deal_id, name, email in rows:
+        contacts.setdefault(deal_id, []).append(f"{name} <{email}>" if email else name)
+    return {deal_id: "; ".join(names) for deal_id, names in contacts.items()}
+
+
+class Entity:
+    def __init__(self, columns, visible, apply_filters, batch_columns=None):
+        self.columns = columns
+        self.visible = visible
+        self.apply_filters = apply_filters
+        # Колонки, которые считаются одним запросом на пачку по списку id.
+        self.batch_columns = batch_columns or {}
+
+    @property
+    def column_names(self):
+        return [*self.columns, *self.batch_columns]
+
+
+ENTITIES = {
+    "deals": Entity(DEAL_COLUMNS, filters.visible_deals, filters.filter_deals, {"contacts": _deal_contacts}),
+    "companies": Entity(COMPANY_COLUMNS, filters.visible_companies, filters.filter_companies),
+    "contacts": Entity(CONTACT_COLUMNS, filters.visible_contacts, filters.filter_contacts),
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def get_chunk_size():
+    return getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+
+
+def parse_columns(entity, value):
+    """Список колонок из "a,b,c"; пусто — все колонки."""
+    names = [name.strip() for name in (value or "").split(",") if name.strip()]
+    if not names:
+        return entity.column_names
+    unknown = [name for name in names if name not in entity.column_names]
+    if unknown:
+        raise ExportError(f"Неизвестные колонки: {', '.join(unknown)}")
+    return names
+
+
+def _value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat() if timezone.is_aware(value) else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def iter_records(entity_name, user, params, columns=None, chunk_size=None):
+    """Пары (колонки, генератор списков значений) с учётом прав и фильтров."""
+    if entity_name not in ENTITIES:
+        raise ExportError(f"Неизвестная выгрузка: {entity_name}")
+    entity = ENTITIES[entity_name]
+    columns = parse_columns(entity, columns)
+    chunk_size = chunk_size or get_chunk_size()
+
+    queryset, _ = entity.apply_filters(entity.visible(user), params)
+    value_columns = [name for name in columns if name in entity.columns]
+    batch_columns = [name for name in columns if name in entity.batch_columns]
+    paths = ["id", *(entity.columns[name] for name in value_columns)]
+    rows = queryset.order_by("pk").values_list(*paths).iterator(chunk_size=chunk_size)
+
+    def generate():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield from _emit(chunk)
+                chunk = []
+        if chunk:
+            yield from _emit(chunk)
+
+    def _emit(chunk):
+        extra = {
+            name: entity.batch_columns[name]([row[0] for row in chunk]) for name in batch_columns
+        }
+        for row in chunk:
+            values = dict(zip(value_columns, row[1:]))
+            for name in batch_columns:
+                values[name] = extra[name].get(row[0], "")
+            yield [_value(values[name]) for name in columns]
+
+    return columns, generate()
+
+
+class _Echo:
+    """Файл для csv.writer, который просто возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_csv(columns, records):
+    writer = csv.writer(_Echo())
+    # BOM — чтобы Excel открыл UTF-8 с кириллицей без мастера импорта.
+    yield "﻿" + writer.writerow(columns)
+    for values in records:
+        yield writer.writerow(["" if value is None else value for value in values])
+
+
+def render_jsonl(columns, records):
+    for values in records:
+        yield json.dumps(dict(zip(columns, values)), ensure_ascii=False) + "\n"
+
+
+RENDERERS = {"csv": render_csv, "jsonl": render_jsonl}
+
+
+def export(entity_name, user, params, export_format="csv", columns=None, chunk_size=None):
+    """Генератор строк выгрузки; ошибки параметров — ExportError до начала потока."""
+    if export_format not in RENDERERS:
+        raise ExportError(f"Неизвестный формат: {export_format}")
+    columns, records = iter_records(entity_name, user, params, columns=columns, chunk_size=chunk_size)
+    return RENDERERS[export_format](columns, records)
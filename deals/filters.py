@@ -0,0 +1,81 @@
+"""
+Права видимости и фильтры из GET-параметров — общие для списков и выгрузок.
+user=None в visible_* — без ограничений (для management-команд).
+"""
+from decimal import Decimal, InvalidOperation
+
+from .models import Company, Contact, Deal
+
+
+def visible_deals(user):
+    if user is None or user.is_superuser:
+        return Deal.objects.all()
+    return Deal.objects.filter(owner=user)
+
+
+def visible_contacts(user):
+    if user is None or user.is_superuser:
+        return Contact.objects.all()
+    return Contact.objects.filter(owner=user)
+
+
+def visible_companies(user):
+    # Справочник компаний общий, как в company_contacts и поиске.
+    return Company.objects.all()
+
+
+def parse_decimal(value):
+    if value in ("", None):
+        return None
+    try:
+        return Decimal(str(value).replace(",", "."))
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def filter_deals(deals, params):
+    filters = {}
+    stage = params.get("stage")
+    if stage == "none":
+        deals = deals.filter(stage__isnull=True)
+        filters["stage"] = stage
+    elif stage and stage.isdigit():
+        deals = deals.filter(stage_id=int(stage))
+        filters["stage"] = stage
+
+    client = params.get("client")
+    if client and client.isdigit():
+        deals = deals.filter(client_id=int(client))
+        filters["client"] = client
+
+    cost_min = parse_decimal(params.get("cost_min"))
+    if cost_min is not None:
+        deals = deals.filter(cost__gte=cost_min)
+        filters["cost_min"] = str(cost_min)
+    cost_max = parse_decimal(params.get("cost_max"))
+    if cost_max is not None:
+        deals = deals.filter(cost__lte=cost_max)
+        filters["cost_max"] = str(cost_max)
+    return deals, filters
+
+
+def filter_companies(companies, params):
+    filters = {}
+    company_type = params.get("type")
+    if company_type in {value for value, _ in Company.TYPE_CHOICES}:
+        companies = companies.filter(type=company_type)
+        filters["type"] = company_type
+    inn = params.get("inn")
+    if inn:
+        companies = companies.filter(inn=inn)
+        filters["inn"] = inn
+    return companies, filters
+
+
+def filter_contacts(contacts, params):
+    filters = {}
+    company = params.get("company")
+    if company and company.isdigit():
+        contacts = contacts.filter(company_id=int(company))
+        filters["company"] = company
+    return contacts, filters
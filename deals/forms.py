@@ -7,6 +7,10 @@ class DocumentUploadForm(forms.Form):
     file = forms.FileField()
 
 
+class ImportForm(forms.Form):
+    file = forms.FileField(label="Файл CSV или XLSX")
+
+
 class DealForm(forms.ModelForm):
     companies = forms.ModelMultipleChoiceField(
         queryset=Company.objects.all(),
@@ -62,3 +66,9 @@ class DealActionForm(forms.ModelForm):
             cleaned_data["custom_interval_days"] = None
 
         return cleaned_data
+
+    def save(self, commit=True):
+        # Новое время или периодичность — повторения считаются заново от remind_at.
+        if {"remind_at", "recurrence", "custom_interval_days"} & set(self.changed_data):
+            self.instance.remind_anchor = self.instance.remind_at
+        return super().save(commit)
@@ -0,0 +1,183 @@
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+
+
+TABLE = "deals_search_index"
+
+# rowid = id * ENTITY_SLOTS + код сущности: upsert и удаление идут по rowid, без просмотра таблицы.
+ENTITY_SLOTS = 8
+ENTITY_CODES = {"deal": 1, "company": 2, "contact": 3, "action": 4}
+ENTITY_BY_CODE = {code: entity for entity, code in ENTITY_CODES.items()}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+MAX_QUERY_TOKENS = 10
+
+
+def is_enabled():
+    return connection.vendor == "sqlite" and getattr(settings, "FULLTEXT_SEARCH_ENABLED", True)
+
+
+def _rowid(entity, pk):
+    return pk * ENTITY_SLOTS + ENTITY_CODES[entity]
+
+
+def _join(*parts):
+    return "\n".join(part for part in parts if part)
+
+
+def entity_of(instance):
+    from .models import Company, Contact, Deal, DealAction
+
+    return {
+        Deal: "deal",
+        Company: "company",
+        Contact: "contact",
+        DealAction: "action",
+    }[type(instance)]
+
+
+def _row(entity, instance, deal_owners):
+    if entity == "deal":
+        return instance.title, "", instance.owner_id, None
+    if entity == "company":
+        return instance.name, _join(instance.address, instance.inn), None, None
+    if entity == "contact":
+        body = _join(instance.position, instance.email, instance.messengers)
+        return instance.name, body, instance.owner_id, instance.company_id
+    # У действий нет своего владельца — права берём по сделке.
+    return "", instance.description, deal_owners.get(instance.deal_id), instance.deal_id
+
+
+def _deal_owners(actions):
+    from .models import Deal, DealAction
+
+    owners = {}
+    missing = set()
+    for action in actions:
+        if DealAction.deal.is_cached(action):
+            owners[action.deal_id] = action.deal.owner_id
+        else:
+            missing.add(action.deal_id)
+    if missing:
+        owners.update(Deal.objects.filter(pk__in=missing).values_list("pk", "owner_id"))
+    return owners
+
+
+def index_objects(instances):
+    if not is_enabled():
+        return
+    instances = list(instances)
+    if not instances:
+        return
+    entities = [entity_of(instance) for instance in instances]
+    deal_owners = _deal_owners(
+        [instance for instance, entity in zip(instances, entities) if entity == "action"]
+    )
+    rows = []
+    for instance, entity in zip(instances, entities):
+        title, body, owner_id, parent_id = _row(entity, instance, deal_owners)
+        rows.append((_rowid(entity, instance.pk), title or "", body or "", owner_id, parent_id))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, title, body, owner_id, parent_id) VALUES (%s, %s, %s, %s, %s)",
+            rows,
+        )
+
+
+def remove_objects(entity, pks):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {TABLE} WHERE rowid = %s", [(_rowid(entity, pk),) for pk in pks])
+
+
+def build_match_query(query):
+    tokens = TOKEN_RE.findall(query or "")[:MAX_QUERY_TOKENS]
+    # Каждое слово — в кавычках (без операторов FTS5), последнее — как префикс.
+    return " ".join(f'"{token}"' + ("*" if i == len(tokens) - 1 else "") for i, token in enumerate(tokens))
+
+
+def _url(entity, object_id, parent_id):
+    if entity == "deal":
+        return reverse("deal_edit", args=[object_id])
+    if entity == "action":
+        return reverse("deal_edit", args=[parent_id])
+    if entity == "company":
+        return f"{reverse('deals_list')}?client={object_id}"
+    return f"{reverse('deals_list')}?client={parent_id}"
+
+
+def search(user, query, limit=20):
+    match = build_match_query(query)
+    if not match or not is_enabled():
+        return []
+
+    sql = (
+        f"SELECT rowid, title, snippet({TABLE}, 1, '[', ']', '…', 12), parent_id "
+        f"FROM {TABLE} WHERE {TABLE} MATCH %s"
+    )
+    params = [match]
+    if not user.is_superuser:
+        # Компании общие для всех пользователей, как и в остальных представлениях.
+        sql += " AND (owner_id IS NULL OR owner_id = %s)"
+        params.append(user.pk)
+    sql += f" ORDER BY bm25({TABLE}, 10.0, 1.0) LIMIT %s"
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    results = []
+    for rowid, title, snippet, parent_id in rows:
+        entity = ENTITY_BY_CODE[rowid % ENTITY_SLOTS]
+        object_id = rowid // ENTITY_SLOTS
+        results.append(
+            {
+                "entity": entity,
+                "id": object_id,
+                "title": title,
+                "snippet": snippet,
+                "url": _url(entity, object_id, parent_id),
+            }
+        )
+    return results
+
+
+def rebuild(batch_size=1000, log=None):
+    from .models import Company, Contact, Deal, DealAction
+
+    if not is_enabled():
+        return 0
+    querysets = [
+        Deal.objects.only("id", "title", "owner_id"),
+        Company.objects.only("id", "name", "address", "inn"),
+        Contact.objects.only("id", "name", "position", "email", "messengers", "owner_id", "company_id"),
+        DealAction.objects.select_related("deal").only("id", "description", "deal_id", "deal__owner_id"),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+
+    total = 0
+    for queryset in querysets:
+        batch = []
+        for instance in queryset.order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) >= batch_size:
+                index_objects(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            index_objects(batch)
+            total += len(batch)
+        if log:
+            log(f"{queryset.model.__name__}: indexed, {total} rows so far")
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+    return total
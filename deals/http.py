@@ -0,0 +1,72 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def conditional_json_response(request, etag, build_payload, last_modified=None, use_last_modified=True):
+    """
+    Отвечает 304 Not Modified, если ETag/Last-Modified клиента совпадают, и
+    только иначе вызывает build_payload() для сборки JSON.
+
+    use_last_modified=False — Last-Modified только отдаётся клиенту, а 304
+    решается по ETag: для списков удаление записи не сдвигает max(updated_at).
+    """
+    response, last_modified_ts = _not_modified(request, etag, last_modified, use_last_modified)
+    if response is None:
+        response = JsonResponse(build_payload())
+    return _with_validators(response, etag, last_modified_ts)
+
+
+async def aconditional_json_response(request, etag, build_payload, last_modified=None, use_last_modified=True):
+    """То же для async-представлений: build_payload — корутина."""
+    response, last_modified_ts = _not_modified(request, etag, last_modified, use_last_modified)
+    if response is None:
+        response = JsonResponse(await build_payload())
+    return _with_validators(response, etag, last_modified_ts)
+
+
+def _not_modified(request, etag, last_modified, use_last_modified):
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified_ts if use_last_modified else None
+    )
+    return response, last_modified_ts
+
+
+def _with_validators(response, etag, last_modified_ts):
+    response["ETag"] = etag
+    if last_modified_ts is not None:
+        response["Last-Modified"] = http_date(last_modified_ts)
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def version_state(queryset, field="updated_at"):
+    """
+    Версия набора записей одним агрегатным запросом: добавление меняет max(id),
+    удаление — count, изменение — max(field).
+    """
+    return queryset.order_by().aggregate(count=Count("pk"), last_id=Max("pk"), last_modified=Max(field))
+
+
+async def aversion_state(queryset, field="updated_at"):
+    return await queryset.order_by().aaggregate(count=Count("pk"), last_id=Max("pk"), last_modified=Max(field))
+
+
+def version_etag(prefix, *parts):
+    """ETag из частей версии; datetime берутся с точностью до микросекунд."""
+    values = []
+    for part in parts:
+        if hasattr(part, "timestamp"):
+            part = int(part.timestamp() * 1_000_000)
+        values.append("" if part is None else str(part))
+    digest = hashlib.sha1("|".join(values).encode("utf-8")).hexdigest()[:20]
+    return f'"{prefix}-{digest}"'
+
+
+def latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
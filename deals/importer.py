@@ -0,0 +1,324 @@
+"""
+Потоковый импорт компаний и контактов из CSV/XLSX.
+
+Файл читается построчно, строки копятся пачками по chunk_size. Каждая пачка
+проверяется целиком (поля — валидаторами модели, без full_clean на строку),
+компании сопоставляются по ИНН одним запросом и пишутся через
+bulk_create/bulk_update в одной транзакции. Ошибочные строки попадают в отчёт
+и не прерывают загрузку.
+"""
+import csv
+import io
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import fulltext
+from .models import Company, Contact
+
+try:
+    import openpyxl
+except ImportError:  # XLSX — опционально, CSV работает без зависимостей
+    openpyxl = None
+
+
+logger = logging.getLogger("deals.importer")
+
+COMPANY_FIELDS = ("name", "type", "phone", "email", "address", "inn", "website")
+CONTACT_FIELDS = ("name", "position", "phone", "email", "messengers")
+
+# Заголовок в файле → (сущность, поле). Регистр и пробелы по краям не важны.
+HEADER_ALIASES = {
+    "company": ("company", "name"),
+    "name": ("company", "name"),
+    "название": ("company", "name"),
+    "компания": ("company", "name"),
+    "type": ("company", "type"),
+    "тип": ("company", "type"),
+    "phone": ("company", "phone"),
+    "телефон": ("company", "phone"),
+    "email": ("company", "email"),
+    "e-mail": ("company", "email"),
+    "address": ("company", "address"),
+    "адрес": ("company", "address"),
+    "inn": ("company", "inn"),
+    "инн": ("company", "inn"),
+    "website": ("company", "website"),
+    "сайт": ("company", "website"),
+    "contact_name": ("contact", "name"),
+    "контакт": ("contact", "name"),
+    "contact_position": ("contact", "position"),
+    "должность": ("contact", "position"),
+    "contact_phone": ("contact", "phone"),
+    "телефон контакта": ("contact", "phone"),
+    "contact_email": ("contact", "email"),
+    "email контакта": ("contact", "email"),
+    "contact_messengers": ("contact", "messengers"),
+    "мессенджеры": ("contact", "messengers"),
+}
+
+
+class ImportFileError(Exception):
+    """Файл нельзя прочитать целиком (формат, заголовок) — в отличие от ошибок строк."""
+
+
+def get_chunk_size():
+    return getattr(settings, "IMPORT_CHUNK_SIZE", 1000)
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.companies_created = 0
+        self.companies_updated = 0
+        self.contacts_created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self, max_errors=None):
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        return {
+            "rows": self.rows,
+            "companies_created": self.companies_created,
+            "companies_updated": self.companies_updated,
+            "contacts_created": self.contacts_created,
+            "error_count": len(self.errors),
+            "errors": [{"line": line, "error": message} for line, message in errors],
+        }
+
+    def write_error_report(self, stream):
+        writer = csv.writer(stream)
+        writer.writerow(["line", "error"])
+        writer.writerows(self.errors)
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # Excel хранит ИНН и телефоны числами: 7701234567.0 → "7701234567"
+        value = int(value)
+    return str(value).strip()
+
+
+def _iter_csv(fileobj, encoding):
+    if isinstance(fileobj, io.TextIOBase):
+        text = fileobj
+    else:
+        text = io.TextIOWrapper(fileobj, encoding=encoding, newline="")
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    for row in csv.reader(text, dialect):
+        yield [_cell(value) for value in row]
+
+
+def _iter_xlsx(fileobj):
+    if openpyxl is None:
+        raise ImportFileError("Для импорта XLSX установите пакет openpyxl.")
+    try:
+        workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as exc:  # openpyxl бросает разнородные исключения на битых файлах
+        raise ImportFileError(f"Не удалось открыть XLSX: {exc}") from exc
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [_cell(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename, encoding="utf-8-sig"):
+    """Строки файла как списки строк; формат определяется по расширению."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _iter_xlsx(fileobj)
+    if filename.lower().endswith((".csv", ".txt")):
+        return _iter_csv(fileobj, encoding)
+    raise ImportFileError("Поддерживаются файлы CSV и XLSX.")
+
+
+def _map_header(header):
+    columns = []
+    for title in header:
+        columns.append(HEADER_ALIASES.get(title.strip().lower()))
+    if ("company", "name") not in columns:
+        raise ImportFileError("В заголовке нет колонки с названием компании (name / Название).")
+    return columns
+
+
+class _FieldCleaner:
+    """Проверка значений валидаторами полей модели — то же, что full_clean, но без лишних шагов."""
+
+    def __init__(self, model, names):
+        self.fields = {name: model._meta.get_field(name) for name in names}
+
+    def clean(self, values, errors):
+        cleaned = {}
+        for name, field in self.fields.items():
+            value = values.get(name, "")
+            if value == "":
+                cleaned[name] = "" if not field.null else None
+                continue
+            try:
+                cleaned[name] = field.clean(value, None)
+            except ValidationError as exc:
+                errors.append(f"{field.verbose_name}: {'; '.join(exc.messages)}")
+        return cleaned
+
+
+class Importer:
+    def __init__(self, owner, chunk_size=None):
+        self.owner = owner
+        self.chunk_size = chunk_size or get_chunk_size()
+        self.company_cleaner = _FieldCleaner(Company, COMPANY_FIELDS)
+        self.contact_cleaner = _FieldCleaner(Contact, CONTACT_FIELDS)
+        self.company_types = {value for value, _ in Company.TYPE_CHOICES}
+        self.result = ImportResult()
+
+    def run(self, rows):
+        started = time.monotonic()
+        rows = iter(rows)
+        header = next(rows, None)
+        if header is None:
+            raise ImportFileError("Файл пуст.")
+        columns = _map_header(header)
+
+        chunk = []
+        for line, row in enumerate(rows, start=2):
+            if not any(row):
+                continue
+            self.result.rows += 1
+            parsed = self._parse(line, columns, row)
+            if parsed is not None:
+                chunk.append(parsed)
+            if len(chunk) >= self.chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk)
+        self.result.elapsed = time.monotonic() - started
+        logger.info(
+            "import finished: rows=%s created=%s updated=%s contacts=%s errors=%s %.0f rows/s",
+            self.result.rows, self.result.companies_created, self.result.companies_updated,
+            self.result.contacts_created, len(self.result.errors), self.result.rows_per_second,
+        )
+        return self.result
+
+    def _parse(self, line, columns, row):
+        raw = {"company": {}, "contact": {}}
+        for column, value in zip(columns, row):
+            if column is not None:
+                entity, field = column
+                raw[entity][field] = value
+
+        errors = []
+        company = self.company_cleaner.clean(raw["company"], errors)
+        if not company.get("name"):
+            errors.append("Не указано название компании")
+        if company.get("inn") and not (company["inn"].isdigit() and len(company["inn"]) in (10, 12)):
+            errors.append("ИНН должен состоять из 10 или 12 цифр")
+        if company.get("type") in ("", None):
+            company["type"] = "client"
+        elif company["type"] not in self.company_types:
+            errors.append(f"Неизвестный тип компании: {company['type']}")
+
+        contact = None
+        if any(raw["contact"].values()):
+            contact = self.contact_cleaner.clean(raw["contact"], errors)
+            if not contact.get("name"):
+                errors.append("Укажите имя контакта")
+
+        if errors:
+            self.result.add_error(line, "; ".join(errors))
+            return None
+        return line, company, contact
+
+    def _write_chunk(self, chunk):
+        try:
+            with transaction.atomic():
+                self._save(chunk)
+        except DatabaseError:
+            # Пачка не записалась — повторяем построчно, чтобы найти виновные строки.
+            logger.warning("import chunk failed, retrying row by row", exc_info=True)
+            for item in chunk:
+                try:
+                    with transaction.atomic():
+                        self._save([item])
+                except DatabaseError as exc:
+                    self.result.add_error(item[0], f"Ошибка записи: {exc}")
+
+    def _save(self, chunk):
+        inns = {company["inn"] for _, company, _ in chunk if company["inn"]}
+        existing = {}
+        if inns:
+            # Сравниваем с нормализованным ИНН: в CRM он мог быть введён с пробелами.
+            for company in Company.objects.filter(inn_normalized__in=inns).order_by("pk"):
+                existing.setdefault(company.inn_normalized, company)
+
+        to_create, to_update, updated_fields = [], {}, set()
+        row_companies = []
+        for _, values, _ in chunk:
+            company = existing.get(values["inn"]) if values["inn"] else None
+            if company is None:
+                company = Company(**values).normalize()
+                to_create.append(company)
+                if values["inn"]:
+                    # Повтор ИНН ниже в этом же файле обновит только что созданную компанию.
+                    existing[values["inn"]] = company
+            else:
+                for field, value in values.items():
+                    # Пустые ячейки не затирают данные в CRM.
+                    if value not in ("", None) and getattr(company, field) != value:
+                        setattr(company, field, value)
+                        updated_fields.add(field)
+                        if company.pk is not None:
+                            to_update[company.pk] = company
+                company.normalize()
+            row_companies.append(company)
+
+        Company.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        if to_update:
+            normalized = {
+                Company.NORMALIZED_FIELDS[field][0] for field in updated_fields if field in Company.NORMALIZED_FIELDS
+            }
+            # bulk_update не трогает auto_now — версию для ETag выставляем сами.
+            now = timezone.now()
+            for company in to_update.values():
+                company.updated_at = now
+            Company.objects.bulk_update(
+                list(to_update.values()),
+                sorted(updated_fields | normalized | {"updated_at"}),
+                batch_size=self.chunk_size,
+            )
+
+        contacts = [
+            Contact(company=company, owner=self.owner, **values).normalize()
+            for company, (_, _, values) in zip(row_companies, chunk)
+            if values is not None
+        ]
+        Contact.objects.bulk_create(contacts, batch_size=self.chunk_size)
+
+        # bulk-операции не вызывают save() и сигналы — нормализованные поля
+        # заполнены выше, поисковый индекс обновляем сами.
+        fulltext.index_objects([*to_create, *to_update.values(), *contacts])
+
+        self.result.companies_created += len(to_create)
+        self.result.companies_updated += len(to_update)
+        self.result.contacts_created += len(contacts)
+
+
+def import_file(fileobj, filename, owner, chunk_size=None, encoding="utf-8-sig"):
+    return Importer(owner, chunk_size=chunk_size).run(iter_rows(fileobj, filename, encoding=encoding))
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from deals import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare WSGI (a pool of sync workers) with ASGI (one event loop) serving slow clients "
+        "that download a document, in-process on a temporary database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=50, help="Concurrent slow clients")
+        parser.add_argument("--workers", type=int, default=4, help="WSGI worker threads (gunicorn sync workers)")
+        parser.add_argument("--size-kb", type=int, default=1024, help="Document size")
+        parser.add_argument("--chunk-kb", type=int, default=64, help="Download chunk size")
+        parser.add_argument("--chunk-delay-ms", type=float, default=20, help="Client pause after each chunk")
+        parser.add_argument("--output", help="Write results as JSON to this file")
+
+    def handle(self, *args, **options):
+        results = benchmarks.run_concurrency(
+            clients=options["clients"],
+            workers=options["workers"],
+            size=options["size_kb"] * 1024,
+            chunk_size=options["chunk_kb"] * 1024,
+            chunk_delay=options["chunk_delay_ms"] / 1000,
+        )
+        for mode in ("wsgi", "asgi"):
+            metrics = results[mode]
+            self.stdout.write(
+                f"{mode}: {results['clients']} clients in {metrics['seconds']:.2f}s "
+                f"({metrics['throughput_rps']:.1f} req/s)  p50={metrics['p50_ms']:.0f} "
+                f"p95={metrics['p95_ms']:.0f} max={metrics['max_ms']:.0f} ms"
+            )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from deals.db import apply_pragmas
+
+
+# Django 4.2 по умолчанию: новое соединение на запрос (CONN_MAX_AGE=0), журнал
+# отката, BEGIN DEFERRED, ожидание блокировки 5 секунд.
+DEFAULT_PROFILE = {"pragmas": {}, "begin": "BEGIN", "persistent": False, "timeout": 5.0}
+
+
+def _tuned_profile():
+    return {
+        "pragmas": dict(settings.SQLITE_PRAGMAS),
+        "begin": f"BEGIN {settings.DATABASES['default']['OPTIONS'].get('transaction_mode', 'DEFERRED')}",
+        "persistent": True,
+        "timeout": 5.0,
+    }
+
+
+def _connect(path, profile):
+    connection = sqlite3.connect(path, timeout=profile["timeout"], isolation_level=None)
+    apply_pragmas(connection.cursor(), profile["pragmas"])
+    return connection
+
+
+def _worker(path, profile, transactions, start, results):
+    committed = locked = 0
+    connection = _connect(path, profile) if profile["persistent"] else None
+    start.wait()
+    for i in range(transactions):
+        if not profile["persistent"]:
+            connection = _connect(path, profile)
+        try:
+            # Как типичный запрос ORM: сначала чтение, потом запись в той же транзакции.
+            connection.execute(profile["begin"])
+            connection.execute("SELECT value FROM bench_counter WHERE id = 1").fetchone()
+            connection.execute("INSERT INTO bench_row (worker, payload) VALUES (?, ?)", (os.getpid(), "x" * 200))
+            connection.execute("UPDATE bench_counter SET value = value + 1 WHERE id = 1")
+            connection.execute("COMMIT")
+            committed += 1
+        except sqlite3.OperationalError:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            locked += 1
+        if not profile["persistent"]:
+            connection.close()
+    results.put((committed, locked))
+
+
+def run_profile(profile, workers, transactions):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.sqlite3")
+        setup = _connect(path, profile)
+        setup.execute("CREATE TABLE bench_counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)")
+        setup.execute("CREATE TABLE bench_row (id INTEGER PRIMARY KEY, worker INTEGER, payload TEXT)")
+        setup.execute("INSERT INTO bench_counter (id, value) VALUES (1, 0)")
+        setup.close()
+
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=_worker, args=(path, profile, transactions, start, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        started = time.perf_counter()
+        start.set()
+        totals = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - started
+        for process in processes:
+            process.join()
+    committed = sum(item[0] for item in totals)
+    locked = sum(item[1] for item in totals)
+    return {"committed": committed, "locked": locked, "seconds": elapsed, "per_second": committed / elapsed}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent SQLite write throughput with Django's default connection settings "
+        "and with the configured profile (SQLITE_PRAGMAS, transaction_mode, persistent connections)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent writer processes")
+        parser.add_argument("--transactions", type=int, default=200, help="Write transactions per worker")
+
+    def handle(self, *args, **options):
+        for name, profile in (("default", DEFAULT_PROFILE), ("tuned", _tuned_profile())):
+            result = run_profile(profile, options["workers"], options["transactions"])
+            self.stdout.write(
+                f"{name:8} committed={result['committed']:6} locked={result['locked']:6} "
+                f"time={result['seconds']:.2f}s throughput={result['per_second']:.0f} tx/s"
+            )
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deals import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark deals views through the test client on temporary synthetic datasets: "
+        "latency percentiles, queries per request, throughput and peak Python memory, optionally against a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="0.1,1", help="Comma-separated dataset scales (1 = 5000 deals)")
+        parser.add_argument("--scenario", action="append", choices=sorted(benchmarks.SCENARIOS), dest="scenarios")
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write results as JSON to this file")
+        parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+        parser.add_argument("--threshold", type=float, default=0.25, help="Allowed p95 growth, 0.25 = 25%%")
+
+    def handle(self, *args, **options):
+        try:
+            scales = [float(value) for value in options["scales"].split(",") if value.strip()]
+        except ValueError:
+            raise CommandError("--scales: ожидаются числа через запятую")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+
+        results = benchmarks.run_benchmarks(
+            scales,
+            scenarios=options["scenarios"],
+            iterations=options["iterations"],
+            warmup=options["warmup"],
+            seed=options["seed"],
+            progress=self.stdout.write if options["verbosity"] > 1 else None,
+        )
+
+        for size, result in results["sizes"].items():
+            self.stdout.write(f"scale {size}: peak Python memory {result['peak_alloc_mb']} MB")
+            for view, metrics in result["views"].items():
+                self.stdout.write(
+                    f"  {view:18} p50={metrics['p50_ms']:8.2f} p95={metrics['p95_ms']:8.2f} "
+                    f"p99={metrics['p99_ms']:8.2f} ms  queries={metrics['queries']:6.2f}  "
+                    f"{metrics['throughput_rps']:8.1f} req/s"
+                )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+
+        if baseline is not None:
+            regressions = benchmarks.compare(results, baseline, threshold=options["threshold"])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f"{len(regressions)} regressions against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline."))
@@ -0,0 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from deals import exports
+
+
+class Command(BaseCommand):
+    help = "Stream deals, companies or contacts to CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("entity", choices=sorted(exports.ENTITIES))
+        parser.add_argument("--format", default="csv", choices=sorted(exports.RENDERERS))
+        parser.add_argument("--columns", default=None, help="Comma-separated column list (default: all)")
+        parser.add_argument("--owner", default=None, help="Export only what this user can see")
+        parser.add_argument(
+            "--filter", action="append", default=[], metavar="KEY=VALUE",
+            help="Same filters as the export endpoint, e.g. stage=3 or cost_min=1000",
+        )
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--output", default=None, help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["owner"]:
+            User = get_user_model()
+            try:
+                user = User.objects.get(username=options["owner"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['owner']!r} does not exist")
+
+        params = {}
+        for item in options["filter"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Filter must look like KEY=VALUE: {item!r}")
+            params[key] = value
+
+        try:
+            lines = exports.export(
+                options["entity"], user, params, options["format"],
+                columns=options["columns"], chunk_size=options["chunk_size"],
+            )
+        except exports.ExportError as exc:
+            raise CommandError(str(exc))
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from deals import dedup
+from deals.models import Company, Contact
+
+
+class Command(BaseCommand):
+    help = "List groups of duplicate companies or contacts found by normalized INN, phone, email and name"
+
+    def add_arguments(self, parser):
+        parser.add_argument("entity", choices=["companies", "contacts"])
+
+    def handle(self, *args, **options):
+        if options["entity"] == "companies":
+            groups, model = dedup.find_company_duplicates(), Company
+        else:
+            groups, model = dedup.find_contact_duplicates(), Contact
+        for group in groups:
+            names = dict(model.objects.filter(pk__in=group.ids).values_list("pk", "name"))
+            members = ", ".join(f"#{pk} {names.get(pk, '')}" for pk in group.ids)
+            reasons = "; ".join(f"{key}={','.join(values)}" for key, values in group.reasons.items())
+            self.stdout.write(f"{members}  [{reasons}]")
+        self.stdout.write(self.style.SUCCESS(f"{len(groups)} duplicate groups."))
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from deals.datagen import DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a reproducible synthetic dataset (users, companies, contacts, deals with links, "
+        "recurring actions, documents) for load testing. --scale multiplies users, companies and deals"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for users, companies and deals")
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument("--companies", type=int, default=1000)
+        parser.add_argument("--deals", type=int, default=5000)
+        parser.add_argument("--contacts-per-company", type=float, default=2.0)
+        parser.add_argument("--actions-per-deal", type=float, default=2.0)
+        parser.add_argument("--documents-per-deal", type=float, default=0.5)
+        parser.add_argument("--blob-pool", type=int, default=32, help="Distinct document files written to storage")
+        parser.add_argument("--days", type=int, default=730, help="Spread creation dates over this many days")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        scale = options["scale"]
+        generator = DatasetGenerator(
+            users=max(1, round(options["users"] * scale)),
+            companies=round(options["companies"] * scale),
+            deals=round(options["deals"] * scale),
+            contacts_per_company=options["contacts_per_company"],
+            actions_per_deal=options["actions_per_deal"],
+            documents_per_deal=options["documents_per_deal"],
+            blob_pool=max(1, options["blob_pool"]),
+            days=options["days"],
+            seed=options["seed"],
+            batch_size=options["batch_size"],
+            progress=lambda message: self.stdout.write(message) if options["verbosity"] > 1 else None,
+        )
+        started = time.monotonic()
+        counts = generator.run()
+        elapsed = time.monotonic() - started
+        total = sum(counts.values())
+        for name, count in counts.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(self.style.SUCCESS(f"Created {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)."))
@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from deals.importer import ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = "Import companies (upserted on INN) and their contacts from a CSV or XLSX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--owner", required=True, help="Username that will own imported contacts")
+        parser.add_argument("--chunk-size", type=int, default=None)
+        parser.add_argument("--encoding", default="utf-8-sig", help="CSV encoding, e.g. cp1251")
+        parser.add_argument("--errors", default=None, help="Write the per-row error report to this CSV file")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['owner']!r} does not exist")
+
+        path = options["path"]
+        try:
+            with open(path, "rb") as fileobj:
+                result = import_file(
+                    fileobj, path, owner, chunk_size=options["chunk_size"], encoding=options["encoding"]
+                )
+        except (ImportFileError, OSError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        if options["errors"]:
+            with open(options["errors"], "w", newline="", encoding="utf-8") as report:
+                result.write_error_report(report)
+        else:
+            for line, message in result.errors:
+                self.stderr.write(f"line {line}: {message}")
+
+        self.stdout.write(
+            f"{result.rows} rows in {result.elapsed:.2f}s ({result.rows_per_second:.0f} rows/s): "
+            f"{result.companies_created} companies created, {result.companies_updated} updated, "
+            f"{result.contacts_created} contacts created, {len(result.errors)} errors."
+        )
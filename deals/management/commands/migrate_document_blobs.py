@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Length
+
+from deals.downloads import iter_database_blob
+from deals.models import Blob, Document
+from deals.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = "Move inline Document.data blobs to the external blob storage in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--limit", type=int, default=None, help="Stop after this many documents")
+        parser.add_argument("--sleep", type=float, default=0.0, help="Pause between batches, seconds")
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        batch_size = options["batch_size"]
+        limit = options["limit"]
+        moved = skipped = 0
+        last_pk = 0
+
+        while limit is None or moved + skipped < limit:
+            batch = list(
+                Document.objects.filter(pk__gt=last_pk, blob__isnull=True, data__isnull=False)
+                .annotate(data_length=Length("data"))
+                .order_by("pk")
+                .values_list("pk", "data_length")[:batch_size]
+            )
+            if not batch:
+                break
+
+            for pk, data_length in batch:
+                with storage.writer() as writer:
+                    for chunk in iter_database_blob(pk, 0, data_length or 0):
+                        writer.write(chunk)
+                    # Каждая строка переносится в своей короткой транзакции, чтобы не
+                    # блокировать запись; загрузки и скачивания продолжают работать.
+                    with transaction.atomic(), Blob.objects.acquiring(writer) as blob:
+                        updated = Document.objects.filter(pk=pk, blob__isnull=True).update(
+                            blob=blob, data=None, size=writer.size
+                        )
+                        if not updated:
+                            Blob.objects.release(blob.pk)
+                if updated:
+                    moved += 1
+                else:
+                    skipped += 1
+                if limit is not None and moved + skipped >= limit:
+                    break
+
+            last_pk = batch[-1][0]
+            self.stdout.write(f"Moved {moved} documents (last id {last_pk})")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        self.stdout.write(self.style.SUCCESS(f"Done: moved {moved}, skipped {skipped}."))
+        if moved:
+            self.stdout.write("Run VACUUM on the database to reclaim the freed space.")
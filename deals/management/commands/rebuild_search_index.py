@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from deals import fulltext
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite FTS5 search index over deals, companies, contacts and actions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not fulltext.is_enabled():
+            self.stdout.write("Full-text search is only available on SQLite; nothing to do.")
+            return
+        total = fulltext.rebuild(batch_size=options["batch_size"], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} rows."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from deals import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pipeline rollup table from deals and report any drift found"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--dry-run", action="store_true", help="Only report drift, do not rewrite the table")
+
+    def handle(self, *args, **options):
+        found = rollups.rebuild(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        for (owner_id, stage_id, month), expected, actual in found:
+            self.stdout.write(
+                f"owner={owner_id} stage={stage_id} month={month:%Y-%m}: "
+                f"expected {expected[0]} / {expected[1]}, stored {actual[0]} / {actual[1]}"
+            )
+        if not found:
+            self.stdout.write(self.style.SUCCESS("No drift."))
+        elif options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"{len(found)} rollup rows drifted."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(found)} drifted rollup rows."))
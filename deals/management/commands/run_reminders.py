@@ -0,0 +1,37 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from deals import metrics
+from deals.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = "Run the reminder worker: fire due DealAction reminders and roll recurring ones over"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horizon", type=int, default=300, help="Seconds ahead to keep in memory")
+        parser.add_argument("--batch-size", type=int, default=10000, help="Max reminders held in the heap")
+        parser.add_argument("--refresh", type=int, default=15, help="Seconds between reloads from the DB")
+        parser.add_argument("--once", action="store_true", help="Fire what is due now and exit")
+
+    def handle(self, *args, **options):
+        metrics.flush_at_exit()
+        scheduler = ReminderScheduler(
+            horizon=options["horizon"],
+            batch_size=options["batch_size"],
+            refresh_interval=options["refresh"],
+        )
+        if options["once"]:
+            fired = scheduler.run_once()
+            self.stdout.write(f"Fired {fired} reminders.")
+            return
+
+        def _shutdown(signum, frame):
+            scheduler.stop()
+
+        signal.signal(signal.SIGTERM, _shutdown)
+        signal.signal(signal.SIGINT, _shutdown)
+        self.stdout.write("Reminder worker started.")
+        scheduler.run_forever()
+        self.stdout.write(f"Reminder worker stopped, fired {scheduler.fired} reminders.")
@@ -0,0 +1,400 @@
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+Каждый процесс (воркер gunicorn, run_reminders) копит значения в памяти, а
+фоновый поток не чаще раза в METRICS_FLUSH_INTERVAL секунд сбрасывает их
+целиком в файл METRICS_DIR/<pid>-<время старта>.json (атомарно, через
+os.replace) — запросы, в том числе на event loop под ASGI, на диск не ходят.
+Время старта в имени не даёт процессу с повторно выданным pid затереть файл
+завершившегося. /metrics читает файлы всех процессов и складывает: счётчики и
+гистограммы суммируются, для gauge берётся самое свежее значение. Файлы
+процессов, которых уже нет, сливаются в archive.json: их счётчики остаются в
+сумме, gauge отбрасываются. При потере процесса пропадает не больше
+последнего интервала; остаток сбрасывается при выходе — только в процессах,
+которые обслуживают запросы или напоминания (flush_at_exit), а не в
+manage.py shell/migrate. Пустой реестр файла не создаёт. Без METRICS_DIR
+отдаются только метрики текущего процесса.
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: файлы завершившихся процессов не сливаются
+    fcntl = None
+
+
+logger = logging.getLogger("deals.metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE_NAME = "archive.json"
+LOCK_NAME = ".lock"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.file_name = f"{self.pid}-{time.time_ns()}.json"
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.dirty = False
+        self._flusher = None
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _check_fork(self):
+        # После fork (gunicorn --preload) в памяти копия значений родителя, а потока сброса нет.
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def _changed(self):
+        # Вызывается под self._lock.
+        self.dirty = True
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="deals-metrics-flush", daemon=True)
+            self._flusher.start()
+
+    def inc(self, name, labels, amount):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+            self._changed()
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._check_fork()
+            self.gauges[(name, labels)] = (value, time.time())
+            self._changed()
+
+    def observe(self, name, labels, buckets, value):
+        with self._lock:
+            self._check_fork()
+            key = (name, labels)
+            state = self.histograms.get(key)
+            if state is None:
+                state = self.histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+            self._changed()
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            self.dirty = False
+            return {
+                "counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, list(labels), value, ts] for (name, labels), (value, ts) in self.gauges.items()],
+                "histograms": [
+                    [name, list(labels), list(state[0]), state[1], state[2]]
+                    for (name, labels), state in self.histograms.items()
+                ],
+            }
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0))
+            if not self.dirty or os.getpid() != self.pid:
+                continue
+            try:
+                self.flush()
+            except OSError:
+                # Значения останутся в памяти до следующей попытки.
+                logger.exception("Не удалось сохранить метрики процесса")
+
+    def flush(self):
+        directory = getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return
+        data = self.snapshot()
+        if not any(data.values()):
+            return
+        os.makedirs(directory, exist_ok=True)
+        _write_json(directory, self.file_name, data)
+
+    def collect(self):
+        """Сумма по всем процессам: {name: {labels: value}}, для гистограмм value — [buckets, sum, count]."""
+        directory = getattr(settings, "METRICS_DIR", None)
+        snapshots = []
+        if directory:
+            self.flush()
+            os.makedirs(directory, exist_ok=True)
+            # Под блокировкой: два одновременных /metrics не сольют один файл дважды
+            # и не прочитают его вместе с архивом, куда он уже слит.
+            with _directory_lock(directory):
+                _archive_dead(directory)
+                for entry in sorted(os.listdir(directory)):
+                    if not entry.endswith(".json") or entry.startswith("."):
+                        continue
+                    snapshot = _read_json(os.path.join(directory, entry))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+        else:
+            snapshots.append(self.snapshot())
+
+        values = {name: {} for name in self.metrics}
+        gauge_times = {}
+        for snapshot in snapshots:
+            _add_sums(values, snapshot)
+            for name, labels, value, ts in snapshot["gauges"]:
+                key = (name, tuple(labels))
+                if ts >= gauge_times.get(key, -math.inf):
+                    gauge_times[key] = ts
+                    values.setdefault(name, {})[tuple(labels)] = value
+        return values
+
+    def render(self):
+        values = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            for labels, value in sorted(values.get(name, {}).items()):
+                lines.extend(metric.render(labels, value))
+        return "\n".join(lines) + "\n"
+
+
+def _add_sums(values, snapshot):
+    """Добавляет счётчики и гистограммы snapshot к values ({name: {labels: value}})."""
+    for name, labels, value in snapshot["counters"]:
+        series = values.setdefault(name, {})
+        series[tuple(labels)] = series.get(tuple(labels), 0.0) + value
+    for name, labels, buckets, total, count in snapshot["histograms"]:
+        series = values.setdefault(name, {})
+        state = series.get(tuple(labels))
+        if state is None:
+            series[tuple(labels)] = [list(buckets), total, count]
+        else:
+            state[0] = [a + b for a, b in zip(state[0], buckets)]
+            state[1] += total
+            state[2] += count
+
+
+def _write_json(directory, name, data):
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, os.path.join(directory, name))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Файл удалили или он повреждён — пропускаем процесс, а не весь ответ.
+        return None
+
+
+@contextmanager
+def _directory_lock(directory):
+    # flock снимается вместе с закрытием файла, в том числе если процесс упал.
+    with open(os.path.join(directory, LOCK_NAME), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+def _archive_dead(directory):
+    """Сливает файлы завершившихся процессов в archive.json. Вызывается под _directory_lock."""
+    if fcntl is None:
+        return
+    dead = []
+    for entry in os.listdir(directory):
+        pid, _, rest = entry.partition("-")
+        if rest.endswith(".json") and pid.isdigit() and not _pid_alive(int(pid)):
+            dead.append(entry)
+    if not dead:
+        return
+    archive_path = os.path.join(directory, ARCHIVE_NAME)
+    archive = {}
+    if os.path.exists(archive_path):
+        stored = _read_json(archive_path)
+        if stored is None:
+            # Повреждённый архив не перезаписываем: сливать некуда, файлы процессов остаются.
+            return
+        _add_sums(archive, stored)
+    for entry in dead:
+        snapshot = _read_json(os.path.join(directory, entry))
+        if snapshot is not None:
+            _add_sums(archive, snapshot)
+    _write_json(directory, ARCHIVE_NAME, {
+        "counters": [[name, list(labels), value] for name, series in archive.items()
+                     for labels, value in series.items() if not isinstance(value, list)],
+        "gauges": [],
+        "histograms": [[name, list(labels), *value] for name, series in archive.items()
+                       for labels, value in series.items() if isinstance(value, list)],
+    })
+    for entry in dead:
+        try:
+            os.remove(os.path.join(directory, entry))
+        except FileNotFoundError:
+            pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Счётчик не может уменьшаться")
+        self.registry.inc(self.name, self._labels(labels), amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        self.registry.set(self.name, self._labels(labels), value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        # Последняя корзина +Inf хранится неявно: count минус сумма остальных.
+        self.registry.observe(self.name, self._labels(labels), self.buckets, value)
+
+    def render(self, labels, value):
+        buckets, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, observed in zip(self.buckets, buckets):
+            cumulative += observed
+            le = _format_labels(self.labelnames, labels, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        le = _format_labels(self.labelnames, labels, [("le", "+Inf")])
+        lines.append(f"{self.name}_bucket{le} {count}")
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+        lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+REGISTRY = Registry()
+
+
+def flush_at_exit():
+    """Сбросить метрики при выходе процесса; вызывают wsgi.py, asgi.py и run_reminders."""
+    # unregister — чтобы повторный вызов не добавил второй обработчик.
+    atexit.unregister(REGISTRY.flush)
+    atexit.register(REGISTRY.flush)
+
+
+http_requests = Counter(
+    "deals_http_requests_total", "HTTP requests by URL name, method and status.", ("view", "method", "status")
+)
+http_request_duration = Histogram(
+    "deals_http_request_duration_seconds",
+    "Time until the view returned a response (streamed bodies excluded), by URL name and status.",
+    ("view", "status"),
+)
+db_queries = Counter("deals_db_queries_total", "SQL queries executed by requests, by URL name.", ("view",))
+db_query_duration = Histogram(
+    "deals_db_query_duration_seconds", "Total SQL time per request, by URL name.", ("view",)
+)
+document_bytes = Counter(
+    "deals_document_bytes_total", "Document bytes received by uploads and sent by downloads.", ("direction",)
+)
+reminders_fired = Counter("deals_reminders_fired_total", "Reminders fired by the reminder worker.")
+reminder_lag = Gauge(
+    "deals_reminder_lag_seconds", "How late the reminder worker fired the most overdue reminder of its last pass."
+)
+reminder_last_run = Gauge(
+    "deals_reminder_last_run_timestamp_seconds", "Unix time of the reminder worker's last pass."
+)
+
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+def observe_request(view, method, status, duration, query_stats):
+    method = method if method in HTTP_METHODS else "other"
+    http_requests.inc(view=view, method=method, status=status)
+    http_request_duration.observe(duration, view=view, status=status)
+    db_queries.inc(query_stats.count, view=view)
+    db_query_duration.observe(query_stats.duration, view=view)
+
+
+def count_bytes(chunks, direction):
+    """Пропускает куски потока, добавляя их размер к document_bytes."""
+    for chunk in chunks:
+        document_bytes.inc(len(chunk), direction=direction)
+        yield chunk
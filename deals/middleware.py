@@ -0,0 +1,191 @@
+"""
+Метрики обращений к БД для каждого запроса.
+
+QueryMetricsMiddleware оборачивает выполнение SQL (connection.execute_wrapper —
+работает и без DEBUG) и считает число запросов, их суммарное время и самый
+медленный. Итог уходит в заголовок Server-Timing (виден во вкладке Network
+браузера), в строку лога "deals.queries" и в deals.metrics. Запросы,
+выполненные при отдаче StreamingHttpResponse, уже после выхода из
+представления, не учитываются.
+
+ProfilingMiddleware профилирует выбранные запросы (см. deals.profiling): долю
+PROFILE_SAMPLE_RATE, запросы с заголовком "X-Profile: <PROFILE_SECRET>" и, при
+PROFILE_STAFF, запросы сотрудников. Если ничего из этого не настроено,
+middleware отключается при старте и на запросы не влияет.
+"""
+import cProfile
+import hmac
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+from .profiling import PROFILE_MODES, StackSampler, profile_name, write_profile
+
+
+logger = logging.getLogger("deals.queries")
+profiling_logger = logging.getLogger("deals.profiling")
+
+SLOWEST_SQL_MAX_LENGTH = 500
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_duration = 0.0
+        self.slowest_sql = ""
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed >= self.slowest_duration:
+                self.slowest_duration = elapsed
+                self.slowest_sql = sql
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_duration * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+def _wrap_connections(stack, stats):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(stats))
+
+
+class QueryMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _wrap_connections(stack, stats)
+            response = self.get_response(request)
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        # Соединения привязаны к потоку, а ORM из async-кода работает в потоке
+        # запроса (sync_to_async, thread_sensitive) — обёртку ставим там же.
+        stats = QueryStats()
+        started = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(_wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def _record(self, request, response, stats, total):
+        response.query_stats = stats
+        if getattr(settings, "SERVER_TIMING_HEADER", False):
+            response["Server-Timing"] = stats.server_timing(total)
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else request.path
+        # Для метрик — только имена URL: произвольные пути раздули бы число рядов.
+        metrics.observe_request(
+            match.view_name if match else "<unresolved>", request.method, response.status_code, total, stats
+        )
+        level = logging.WARNING if stats.count > getattr(settings, "QUERY_COUNT_WARNING", 50) else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                "view=%s method=%s status=%s queries=%d db_ms=%.1f total_ms=%.1f slowest_ms=%.1f slowest_sql=%r",
+                view, request.method, response.status_code, stats.count, stats.duration * 1000,
+                total * 1000, stats.slowest_duration * 1000, stats.slowest_sql[:SLOWEST_SQL_MAX_LENGTH],
+                extra={
+                    "view": view,
+                    "queries": stats.count,
+                    "db_ms": round(stats.duration * 1000, 1),
+                    "total_ms": round(total * 1000, 1),
+                },
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Ставится после AuthenticationMiddleware: для PROFILE_STAFF нужен request.user.
+    Только синхронный: cProfile и сэмплер следят за одним потоком. Под ASGI
+    включённое профилирование переводит запросы в поток, как под WSGI.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+        self.secret = getattr(settings, "PROFILE_SECRET", "")
+        self.staff = getattr(settings, "PROFILE_STAFF", False)
+        if not (self.sample_rate > 0 or self.secret or self.staff):
+            raise MiddlewareNotUsed
+        self.mode = getattr(settings, "PROFILE_MODE", "sample")
+        if self.mode not in PROFILE_MODES:
+            raise ImproperlyConfigured(f"PROFILE_MODE должен быть одним из {PROFILE_MODES}")
+        self.interval = getattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 5) / 1000
+        self.directory = str(settings.PROFILE_DIR)
+        self.keep = getattr(settings, "PROFILE_KEEP", 200)
+
+    def should_profile(self, request):
+        header = request.headers.get("X-Profile")
+        if header and self.secret and hmac.compare_digest(header, self.secret):
+            return True
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return True
+        return self.staff and getattr(request, "user", None) is not None and request.user.is_staff
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile() if self.mode in ("cprofile", "both") else None
+        sampler = StackSampler(self.interval) if self.mode in ("sample", "both") else None
+        if sampler is not None:
+            sampler.start()
+        if profiler is not None:
+            profiler.enable()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            if sampler is not None:
+                sampler.stop()
+
+        match = getattr(request, "resolver_match", None)
+        name = profile_name(match.view_name if match else request.path, duration)
+        try:
+            paths = write_profile(self.directory, name, profiler=profiler, sampler=sampler, keep=self.keep)
+        except OSError:
+            # Профиль — диагностика: ошибка записи не должна ломать ответ.
+            profiling_logger.exception("Не удалось сохранить профиль %s", name)
+            return response
+        response["X-Profile-Id"] = name
+        profiling_logger.info("profile=%s path=%s duration_ms=%.1f", name, request.path, duration * 1000,
+                              extra={"files": paths})
+        return response
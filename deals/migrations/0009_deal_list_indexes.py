@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0008_document_blob_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['owner', '-updated_at', '-id'], name='deal_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['-updated_at', '-id'], name='deal_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['owner', '-created_at', '-id'], name='deal_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['owner', 'title', 'id'], name='deal_owner_title_idx'),
+        ),
+    ]
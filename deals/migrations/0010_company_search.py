@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+from deals.normalization import normalize_company_name
+
+
+def fill_search_name(apps, schema_editor):
+    Company = apps.get_model("deals", "Company")
+    batch = []
+    for company in Company.objects.only("id", "name").iterator(chunk_size=1000):
+        company.search_name = normalize_company_name(company.name)
+        batch.append(company)
+        if len(batch) >= 1000:
+            Company.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    if batch:
+        Company.objects.bulk_update(batch, ["search_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0009_deal_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='search_name',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['search_name'], name='company_search_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['inn'], name='company_inn_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+# DDL зафиксирован здесь, а не импортируется из deals.fulltext: правки модуля
+# не должны менять то, что делает уже применённая миграция.
+CREATE_TABLE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS deals_search_index USING fts5(
+    title,
+    body,
+    owner_id UNINDEXED,
+    parent_id UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+DROP_TABLE_SQL = "DROP TABLE IF EXISTS deals_search_index"
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 есть только в SQLite; на других СУБД поиск отключается (fulltext.is_enabled).
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(CREATE_TABLE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(DROP_TABLE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0010_company_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealaction',
+            name='last_reminded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Последнее напоминание'),
+        ),
+        migrations.AlterField(
+            model_name='dealaction',
+            name='remind_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Напомнить'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('deals', '0012_dealaction_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OwnerSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='ownersequence',
+            constraint=models.UniqueConstraint(fields=('owner', 'kind'), name='owner_sequence_unique'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:59
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def fill_rollups(apps, schema_editor):
+    Deal = apps.get_model("deals", "Deal")
+    PipelineRollup = apps.get_model("deals", "PipelineRollup")
+    totals = defaultdict(lambda: [0, Decimal("0.00")])
+    rows = Deal.objects.order_by().values_list("owner_id", "stage_id", "created_at", "cost")
+    for owner_id, stage_id, created_at, cost in rows.iterator(chunk_size=2000):
+        key = (owner_id, stage_id, timezone.localtime(created_at).date().replace(day=1))
+        totals[key][0] += 1
+        totals[key][1] += cost or 0
+    PipelineRollup.objects.bulk_create(
+        [
+            PipelineRollup(owner_id=owner_id, stage_id=stage_id, month=month, deal_count=count, total_cost=total)
+            for (owner_id, stage_id, month), (count, total) in totals.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('deals', '0013_owner_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('deal_count', models.IntegerField(default=0)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('stage', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='deals.stage')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month'], name='pipeline_rollup_month_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pipelinerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('stage__isnull', False)), fields=('owner', 'stage', 'month'), name='pipeline_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='pipelinerollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('stage__isnull', True)), fields=('owner', 'month'), name='pipeline_rollup_no_stage_unique'),
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+from deals.normalization import normalize_email, normalize_inn, normalize_phone
+
+
+def _fill(model, fields):
+    batch = []
+    sources = [source for source, _, _ in fields]
+    for obj in model.objects.only("id", *sources).iterator(chunk_size=1000):
+        for source, target, normalize in fields:
+            setattr(obj, target, normalize(getattr(obj, source)))
+        batch.append(obj)
+        if len(batch) >= 1000:
+            model.objects.bulk_update(batch, [target for _, target, _ in fields])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, [target for _, target, _ in fields])
+
+
+def fill_normalized(apps, schema_editor):
+    _fill(apps.get_model("deals", "Company"), [
+        ("inn", "inn_normalized", normalize_inn),
+        ("phone", "phone_normalized", normalize_phone),
+        ("email", "email_normalized", normalize_email),
+    ])
+    _fill(apps.get_model("deals", "Contact"), [
+        ("phone", "phone_normalized", normalize_phone),
+        ("email", "email_normalized", normalize_email),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0014_pipeline_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='email_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='inn_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='email_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='contact',
+            name='phone_normalized',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_normalized, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['inn_normalized'], name='company_inn_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['phone_normalized'], name='company_phone_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=models.Index(fields=['email_normalized'], name='company_email_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['phone_normalized'], name='contact_phone_norm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['email_normalized'], name='contact_email_norm_idx'),
+        ),
+    ]
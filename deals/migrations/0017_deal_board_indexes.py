@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0016_updated_at_versions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['owner', 'stage', '-updated_at', '-id'], name='deal_owner_stage_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deal',
+            index=models.Index(fields=['stage', '-updated_at', '-id'], name='deal_stage_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deals', '0017_deal_board_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dealaction',
+            name='remind_anchor',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Начало напоминаний'),
+        ),
+    ]
@@ -1,20 +1,145 @@
-from django.db import models
+from contextlib import contextmanager
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, Q
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from . import refdata
+from .normalization import (
+    normalize_company_name,
+    normalize_email,
+    normalize_inn,
+    normalize_phone,
+    normalize_phone_prefix,
+)
+
 
 
 User = get_user_model()
 
+DEFAULT_STAGE_NAME = "Заявка"
+
+
+class StageManager(models.Manager):
+    def get_default_id(self):
+        # Из кэша справочников (deals.refdata); сбрасывается сигналами при изменении Stage.
+        return refdata.default_stage_id()
+
+
 class Stage(models.Model):
     name = models.CharField(max_length=120)
     order_index = models.PositiveIntegerField(default=0)
 
+    objects = StageManager()
+
     def __str__(self):
         return self.name
 
+
+class OwnerSequenceManager(models.Manager):
+    def next_value(self, owner_id, kind, seed=None):
+        """
+        Следующий номер в последовательности владельца. Инкремент атомарный,
+        так что параллельные создания не получат одинаковый номер. seed()
+        вызывается один раз — при первом обращении — чтобы продолжить
+        нумерацию уже существующих записей.
+        """
+        sequence = self.filter(owner_id=owner_id, kind=kind)
+        with transaction.atomic():
+            if not sequence.update(value=F("value") + 1):
+                start = seed() if seed else 0
+                try:
+                    with transaction.atomic():
+                        self.create(owner_id=owner_id, kind=kind, value=start + 1)
+                except IntegrityError:
+                    sequence.update(value=F("value") + 1)
+            return sequence.values_list("value", flat=True).get()
+
+
+class OwnerSequence(models.Model):
+    DEAL = "deal"
+    CONTACT = "contact"
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    kind = models.CharField(max_length=20)
+    value = models.PositiveBigIntegerField(default=0)
+
+    objects = OwnerSequenceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "kind"], name="owner_sequence_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}/{self.kind}: {self.value}"
+
+
+def _normalize_fields(instance):
+    for source, (target, normalize) in instance.NORMALIZED_FIELDS.items():
+        setattr(instance, target, normalize(getattr(instance, source)))
+    return instance
+
+
+def _save_kwargs_with_normalized(instance, kwargs):
+    _normalize_fields(instance)
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None:
+        extra = {target for source, (target, _) in instance.NORMALIZED_FIELDS.items() if source in update_fields}
+        kwargs["update_fields"] = {*update_fields, *extra}
+
+
+def _prefix_range(field, prefix):
+    # Диапазон вместо LIKE 'x%': его использует обычный B-tree индекс в любой СУБД.
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + chr(0x10FFFF)})
+
+
+class CompanyManager(models.Manager):
+    SUBSTRING_MIN_LENGTH = 3
+    PHONE_MIN_DIGITS = 5
+
+    def search(self, query, limit=10):
+        """
+        Поиск клиента по названию, ИНН, телефону и email. Сначала идут дешёвые
+        индексные запросы по префиксу; подстрочный поиск (полный просмотр)
+        выполняется, только если их результатов не хватило до limit.
+        """
+        query = (query or "").strip()
+        name_key = normalize_company_name(query)
+        digits = "".join(ch for ch in query if ch.isdigit())
+        if not name_key and not digits:
+            return []
+
+        tiers = []
+        if name_key:
+            tiers.append(Q(search_name=name_key))
+            tiers.append(_prefix_range("search_name", name_key))
+        if digits and digits == query.replace(" ", ""):
+            tiers.append(_prefix_range("inn", digits))
+        if "@" in query:
+            tiers.append(_prefix_range("email_normalized", normalize_email(query)))
+        if len(digits) >= self.PHONE_MIN_DIGITS:
+            tiers.append(_prefix_range("phone_normalized", normalize_phone_prefix(digits)))
+        if len(query) >= self.SUBSTRING_MIN_LENGTH:
+            tiers.append(Q(phone__icontains=query) | Q(email__icontains=query))
+            if name_key:
+                tiers.append(Q(search_name__contains=name_key))
+
+        results = []
+        seen = set()
+        for condition in tiers:
+            remaining = limit - len(results)
+            if remaining <= 0:
+                break
+            for company in self.filter(condition).exclude(pk__in=seen).order_by("search_name", "id")[:remaining]:
+                seen.add(company.pk)
+                results.append(company)
+        return results
+
+
 class Company(models.Model):
     TYPE_CHOICES = [
         ("client", "Клиент"),
@@ -29,6 +154,41 @@ class Company(models.Model):
     inn = models.CharField(max_length=12, blank=True, null=True, verbose_name="ИНН")
     website = models.URLField(blank=True, null=True, verbose_name="Сайт")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Версия записи для ETag/Last-Modified; массовые UPDATE должны выставлять её сами.
+    updated_at = models.DateTimeField(auto_now=True)
+    # Нормализованные копии полей: поиск по префиксу и поиск дубликатов по индексу
+    search_name = models.CharField(max_length=255, blank=True, default="", editable=False)
+    inn_normalized = models.CharField(max_length=12, blank=True, default="", editable=False)
+    phone_normalized = models.CharField(max_length=50, blank=True, default="", editable=False)
+    email_normalized = models.CharField(max_length=254, blank=True, default="", editable=False)
+
+    objects = CompanyManager()
+
+    # исходное поле -> (нормализованное поле, функция)
+    NORMALIZED_FIELDS = {
+        "name": ("search_name", normalize_company_name),
+        "inn": ("inn_normalized", normalize_inn),
+        "phone": ("phone_normalized", normalize_phone),
+        "email": ("email_normalized", normalize_email),
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["search_name"], name="company_search_name_idx"),
+            models.Index(fields=["inn"], name="company_inn_idx"),
+            models.Index(fields=["inn_normalized"], name="company_inn_norm_idx"),
+            models.Index(fields=["phone_normalized"], name="company_phone_norm_idx"),
+            models.Index(fields=["email_normalized"], name="company_email_norm_idx"),
+            models.Index(fields=["updated_at"], name="company_updated_idx"),
+        ]
+
+    def normalize(self):
+        """Заполняет нормализованные поля; bulk_create/bulk_update должны вызывать это сами."""
+        return _normalize_fields(self)
+
+    def save(self, *args, **kwargs):
+        _save_kwargs_with_normalized(self, kwargs)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -41,13 +201,35 @@ class Contact(models.Model):
     email = models.EmailField(blank=True)
     messengers = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    phone_normalized = models.CharField(max_length=64, blank=True, default="", editable=False)
+    email_normalized = models.CharField(max_length=254, blank=True, default="", editable=False)
+
+    NORMALIZED_FIELDS = {
+        "phone": ("phone_normalized", normalize_phone),
+        "email": ("email_normalized", normalize_email),
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["phone_normalized"], name="contact_phone_norm_idx"),
+            models.Index(fields=["email_normalized"], name="contact_email_norm_idx"),
+            models.Index(fields=["company", "updated_at"], name="contact_company_updated_idx"),
+        ]
+
+    def normalize(self):
+        return _normalize_fields(self)
 
     def save(self, *args, **kwargs):
-        if not self.name:  
-            # Считаем количество сделок
-            count = Deal.objects.filter(owner=self.owner).count() + 1
-            self.name = f"Сделка {count}"
+        _save_kwargs_with_normalized(self, kwargs)
+        if not self.name:
+            number = OwnerSequence.objects.next_value(
+                self.owner_id,
+                OwnerSequence.CONTACT,
+                seed=lambda: Contact.objects.filter(owner_id=self.owner_id).count(),
+            )
+            self.name = f"Контакт {number}"
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -69,21 +251,81 @@ class Deal(models.Model):
         verbose_name="Стоимость сделки",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "-updated_at", "-id"], name="deal_owner_updated_idx"),
+            models.Index(fields=["-updated_at", "-id"], name="deal_updated_idx"),
+            models.Index(fields=["owner", "-created_at", "-id"], name="deal_owner_created_idx"),
+            models.Index(fields=["owner", "title", "id"], name="deal_owner_title_idx"),
+            # Колонки канбан-доски: сделки этапа по дате изменения.
+            models.Index(fields=["owner", "stage", "-updated_at", "-id"], name="deal_owner_stage_updated_idx"),
+            models.Index(fields=["stage", "-updated_at", "-id"], name="deal_stage_updated_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД: обработчики сигналов сравнивают с ними, что изменилось.
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def save(self, *args, **kwargs):
         # Автогенерация имени сделки
         if not self.title:
-            count = Deal.objects.filter(owner=self.owner).count() + 1
-            self.title = f"Сделка {count}"
+            number = OwnerSequence.objects.next_value(
+                self.owner_id,
+                OwnerSequence.DEAL,
+                seed=lambda: Deal.objects.filter(owner_id=self.owner_id).count(),
+            )
+            self.title = f"Сделка {number}"
         # Автоматический этап для новых сделок
-        if not self.stage:
-            # Получаем объект Stage с названием "Заявка"
-            stage_obj = Stage.objects.filter(name="Заявка").first()
-            self.stage = stage_obj
+        if not self.stage_id:
+            self.stage_id = Stage.objects.get_default_id()
         super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in self.get_deferred_fields()
+        }
 
     def __str__(self):
         return self.title
 
+
+class PipelineRollup(models.Model):
+    """
+    Сводка воронки: число сделок и сумма стоимости по (владелец, этап, месяц создания).
+    Поддерживается сигналами Deal по дельтам; пересобирается командой
+    reconcile_pipeline_rollups.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    stage = models.ForeignKey(Stage, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    month = models.DateField()
+    deal_count = models.IntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "stage", "month"],
+                condition=Q(stage__isnull=False),
+                name="pipeline_rollup_unique",
+            ),
+            # NULL в уникальном индексе не равен NULL — сделки без этапа ограничиваем отдельно.
+            models.UniqueConstraint(
+                fields=["owner", "month"],
+                condition=Q(stage__isnull=True),
+                name="pipeline_rollup_no_stage_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["month"], name="pipeline_rollup_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id}/{self.stage_id}/{self.month:%Y-%m}: {self.deal_count}"
+
+
 class DealCompany(models.Model):
     ROLE_CHOICES = [
         ("client", "Клиент"),
@@ -125,7 +367,11 @@ class DealAction(models.Model):
     deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name="actions")
     description = models.TextField(verbose_name="Описание")
     starts_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Начало")
-    remind_at = models.DateTimeField(blank=True, null=True, verbose_name="Напомнить")
+    remind_at = models.DateTimeField(blank=True, null=True, db_index=True, verbose_name="Напомнить")
+    last_reminded_at = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="Последнее напоминание")
+    # remind_at, заданное пользователем: от него считаются повторения, чтобы 31-е не съезжало на 28-е.
+    remind_anchor = models.DateTimeField(blank=True, null=True, editable=False, verbose_name="Начало напоминаний")
+    updated_at = models.DateTimeField(auto_now=True)
     recurrence = models.CharField(
         max_length=20,
         choices=Recurrence.choices,
@@ -141,6 +387,9 @@ class DealAction(models.Model):
 
     class Meta:
         ordering = ["starts_at"]
+        indexes = [
+            models.Index(fields=["deal", "updated_at"], name="action_deal_updated_idx"),
+        ]
         verbose_name = "Действие"
         verbose_name_plural = "Действия"
 
@@ -148,14 +397,94 @@ class DealAction(models.Model):
         return f"{self.deal} — {self.description[:50]}"
 
 
+class BlobManager(models.Manager):
+    def acquire(self, writer):
+        """
+        Кладёт файл writer в хранилище и добавляет ссылку на блоб. put идёт под
+        блокировкой строки — той же, под которой release удаляет осиротевший
+        блоб, поэтому файл, стёртый удалением, put запишет заново.
+        """
+        return self._acquire(writer)[0]
+
+    @contextmanager
+    def acquiring(self, writer):
+        """
+        acquire() для блока, который в той же транзакции ссылается на блоб
+        (создаёт Document и т. п.). Если блок падает, откат уберёт и только что
+        созданную строку блоба, а файл остался бы в хранилище без ссылок —
+        такой файл удаляем. Пока транзакция не откатилась, строка держит
+        блокировку, и параллельная загрузка того же содержимого ждёт её.
+        """
+        blob, created = self._acquire(writer)
+        try:
+            yield blob
+        except BaseException:
+            if created:
+                writer.storage.delete(blob.sha256)
+            raise
+
+    def _acquire(self, writer):
+        sha256 = writer.finish()
+        with transaction.atomic():
+            blob, created = self.select_for_update().get_or_create(sha256=sha256, defaults={"size": writer.size})
+            writer.commit()
+            self.filter(pk=blob.pk).update(ref_count=F("ref_count") + 1)
+        return blob, created
+
+    def release(self, blob_id):
+        with transaction.atomic():
+            self.filter(pk=blob_id).update(ref_count=F("ref_count") - 1)
+            if self.filter(pk=blob_id, ref_count__lte=0).exists():
+                # Файл удаляем только после коммита: откат не должен терять содержимое.
+                transaction.on_commit(lambda: self._remove_orphan(blob_id))
+
+    def _remove_orphan(self, blob_id):
+        from .storage import get_storage
+
+        with transaction.atomic():
+            # Пока транзакция коммитилась, тот же файл мог загрузить кто-то ещё.
+            orphan = self.select_for_update().filter(pk=blob_id, ref_count__lte=0).first()
+            if orphan is None:
+                return
+            orphan.delete()
+            get_storage().delete(orphan.sha256)
+
+
+class Blob(models.Model):
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return f"{self.sha256} ({self.ref_count} refs)"
+
+
+class DocumentQuerySet(models.QuerySet):
+    def with_data(self):
+        return self.defer(None)
+
+
+class DocumentManager(models.Manager.from_queryset(DocumentQuerySet)):
+    # Байты файла не нужны нигде, кроме скачивания, поэтому по умолчанию не читаем их.
+    def get_queryset(self):
+        return super().get_queryset().defer("data")
+
+
 class Document(models.Model):
     deal = models.ForeignKey(Deal, on_delete=models.CASCADE, related_name="documents")
     filename = models.CharField(max_length=512)
     content_type = models.CharField(max_length=255, blank=True)
     size = models.BigIntegerField(default=0)
-    data = models.BinaryField()
+    # Устаревшее хранение байтов в строке; новые файлы лежат во внешнем хранилище (blob).
+    data = models.BinaryField(null=True, blank=True)
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name="documents")
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploader = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    objects = DocumentManager()
+
     def __str__(self):
         return f"{self.filename} ({self.size} bytes)"
@@ -0,0 +1,48 @@
+import re
+
+
+LEGAL_FORMS = {"ооо", "оао", "зао", "пао", "ао", "нко", "ип", "llc", "ltd", "inc"}
+QUOTES_RE = re.compile(r"[\"'«»„“”`]")
+
+
+def normalize_company_name(name):
+    """
+    Ключ для поиска по названию: регистр и кавычки не важны, организационно-
+    правовая форма в начале отбрасывается ('ООО «Ромашка»' -> 'ромашка').
+    """
+    words = QUOTES_RE.sub(" ", name or "").casefold().split()
+    while len(words) > 1 and words[0].rstrip(".") in LEGAL_FORMS:
+        words = words[1:]
+    return " ".join(words)
+
+
+def normalize_phone(phone):
+    """
+    Только цифры; российские номера приводятся к виду 7XXXXXXXXXX:
+    '+7 (900) 111-22-33', '8-900-111-22-33' и '9001112233' дают один ключ.
+    """
+    digits = "".join(ch for ch in phone or "" if ch.isdigit())
+    if len(digits) == 11 and digits[0] == "8":
+        return "7" + digits[1:]
+    if len(digits) == 10 and digits[0] == "9":
+        return "7" + digits
+    return digits
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def normalize_inn(inn):
+    return "".join(ch for ch in inn or "" if ch.isdigit())
+
+
+def normalize_phone_prefix(digits):
+    """Начало номера, набранное в поиске, в том же виде, что и normalize_phone."""
+    if len(digits) >= 10:
+        return normalize_phone(digits)
+    if digits[:1] == "8":
+        return "7" + digits[1:]
+    if digits[:1] == "9":
+        return "7" + digits
+    return digits
@@ -0,0 +1,79 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+    ordering: tuple = field(default_factory=tuple)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, model, ordering):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor("Некорректный курсор") from exc
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("Некорректный курсор")
+
+    parsed = []
+    for name, value in zip(ordering, values):
+        model_field = model._meta.get_field(name.lstrip("-"))
+        try:
+            parsed.append(model_field.to_python(value))
+        except ValidationError as exc:
+            raise InvalidCursor("Некорректный курсор") from exc
+    return parsed
+
+
+def _after(ordering, values):
+    # (a, b, c) > (x, y, z) в лексикографическом порядке с учётом направления сортировки
+    condition = Q()
+    for i, name in enumerate(ordering):
+        field_name = name.lstrip("-")
+        lookup = "lt" if name.startswith("-") else "gt"
+        step = Q(**{f"{field_name}__{lookup}": values[i]})
+        for prev_name, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_name.lstrip("-"): prev_value})
+        condition |= step
+    return condition
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=50):
+    """
+    Страница по ключу (курсору) вместо OFFSET: стоимость не зависит от того,
+    насколько далеко пользователь пролистал. Последний столбец ordering должен
+    быть уникальным (обычно id).
+    """
+    ordering = tuple(ordering)
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_after(ordering, decode_cursor(cursor, queryset.model, ordering)))
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor([getattr(last, name.lstrip("-")) for name in ordering])
+    return KeysetPage(items=items, next_cursor=next_cursor, ordering=ordering)
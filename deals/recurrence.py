@@ -0,0 +1,101 @@
+import calendar
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import DealAction
+
+
+Recurrence = DealAction.Recurrence
+
+
+def add_months(value, months):
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    # 31 января + 1 месяц = последний день февраля
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def _step(recurrence, interval_days):
+    """Шаг повторения: ("days", n) или ("months", n); None — не повторяется."""
+    if recurrence == Recurrence.DAILY:
+        return "days", 1
+    if recurrence == Recurrence.WEEKLY:
+        return "days", 7
+    if recurrence == Recurrence.MONTHLY:
+        return "months", 1
+    if recurrence == Recurrence.YEARLY:
+        return "months", 12
+    if recurrence == Recurrence.CUSTOM and interval_days:
+        return "days", interval_days
+    return None
+
+
+def occurrence(anchor, recurrence, interval_days, n):
+    """n-е повторение (n=0 — само anchor). Считается от anchor, а не цепочкой, чтобы не копить сдвиг."""
+    step = _step(recurrence, interval_days)
+    if step is None:
+        return anchor if n == 0 else None
+    # Арифметика в локальном времени: «каждый день в 9:00» остаётся в 9:00.
+    local = timezone.localtime(anchor)
+    unit, size = step
+    if unit == "days":
+        return local + timedelta(days=size * n)
+    return add_months(local, size * n)
+
+
+def first_index_after(anchor, recurrence, interval_days, after, inclusive=False):
+    """
+    Номер первого повторения позже after (или не раньше, если inclusive).
+    Номер вычисляется арифметически, без перебора всех повторений от anchor.
+    """
+    def is_after(value):
+        return value >= after if inclusive else value > after
+
+    if is_after(anchor):
+        return 0
+    step = _step(recurrence, interval_days)
+    if step is None:
+        return None
+
+    unit, size = step
+    local_anchor = timezone.localtime(anchor)
+    local_after = timezone.localtime(after)
+    if unit == "days":
+        n = (local_after - local_anchor) // timedelta(days=size)
+    else:
+        months = (local_after.year - local_anchor.year) * 12 + local_after.month - local_anchor.month
+        n = months // size
+    n = max(n, 0)
+    # Оценка может ошибиться на шаг из-за перехода на летнее время или длины месяца.
+    while n > 0 and is_after(occurrence(anchor, recurrence, interval_days, n - 1)):
+        n -= 1
+    while not is_after(occurrence(anchor, recurrence, interval_days, n)):
+        n += 1
+    return n
+
+
+def next_occurrence(anchor, recurrence, interval_days, after, inclusive=False):
+    n = first_index_after(anchor, recurrence, interval_days, after, inclusive=inclusive)
+    if n is None:
+        return None
+    return occurrence(anchor, recurrence, interval_days, n)
+
+
+def expand(anchor, recurrence, interval_days, start, end, limit=None):
+    """Повторения в окне [start, end): первое находится арифметически, дальше — по шагу."""
+    n = first_index_after(anchor, recurrence, interval_days, start, inclusive=True)
+    if n is None:
+        return
+    count = 0
+    while limit is None or count < limit:
+        value = occurrence(anchor, recurrence, interval_days, n)
+        if value is None or value >= end:
+            return
+        yield value
+        count += 1
+        if _step(recurrence, interval_days) is None:
+            return
+        n += 1
@@ -0,0 +1,103 @@
+"""
+Кэш справочников (этапы, списки выбора) в памяти процесса.
+
+Каждый воркер держит свою копию, а в общем кэше Django лежит ключ версии.
+При изменении Stage версия меняется после коммита; воркер сверяет её при
+каждом обращении (один cache.get вместо запросов в БД) и перечитывает
+справочники, если версия не совпала. Чтобы сброс доходил до всех воркеров
+gunicorn, кэш REFDATA_CACHE должен быть общим (file/redis/memcached).
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+VERSION_KEY = "deals:refdata:version"
+
+_lock = threading.Lock()
+_local = {"version": None, "values": {}}
+
+
+def _cache():
+    return caches[getattr(settings, "REFDATA_CACHE", "default")]
+
+
+def _shared_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _store(version, name, value):
+    with _lock:
+        if _local["version"] == version:
+            _local["values"][name] = value
+
+
+def get(name, loader):
+    """Значение справочника name; loader() вызывается, только если его нет в кэше версии."""
+    version = _shared_version()
+    with _lock:
+        if _local["version"] != version:
+            _local["version"] = version
+            _local["values"] = {}
+        elif name in _local["values"]:
+            return _local["values"][name]
+    value = loader()
+    # Внутри транзакции могли прочитать незакоммиченные данные — кэшируем только после коммита.
+    transaction.on_commit(lambda: _store(version, name, value))
+    return value
+
+
+def clear_local():
+    with _lock:
+        _local["version"] = None
+        _local["values"] = {}
+
+
+def bump_version():
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+    clear_local()
+
+
+def invalidate():
+    """Сбросить справочники во всех процессах. Общая версия меняется после коммита."""
+    clear_local()
+    transaction.on_commit(bump_version)
+
+
+def _load_stages():
+    from .models import Stage
+
+    return list(Stage.objects.order_by("order_index", "pk"))
+
+
+def stages():
+    """Этапы в порядке воронки. Объекты общие для запросов — не изменяйте их."""
+    return list(get("stages", _load_stages))
+
+
+def stage_by_id():
+    return {stage.pk: stage for stage in stages()}
+
+
+def default_stage_id():
+    from .models import DEFAULT_STAGE_NAME
+
+    matching = [stage.pk for stage in stages() if stage.name == DEFAULT_STAGE_NAME]
+    return min(matching) if matching else None
+
+
+def recurrence_options():
+    from .models import DealAction
+
+    return get(
+        "recurrence_options",
+        lambda: [{"value": value, "label": str(label)} for value, label in DealAction.Recurrence.choices],
+    )
@@ -0,0 +1,131 @@
+import heapq
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from . import metrics, recurrence
+from .models import DealAction
+from .signals import reminder_due
+
+
+logger = logging.getLogger("deals.reminders")
+
+
+def next_remind_at(action, fired_at, now):
+    """
+    Следующее напоминание для повторяющегося действия; None — напоминаний больше нет.
+    Считается от remind_anchor, а не от fired_at: add_months прижимает день к концу
+    месяца, и цепочка 31.01 → 29.02 → 29.03 сдвинулась бы навсегда. У записей без
+    якоря (созданных до него) якорем становится первое сработавшее напоминание.
+    """
+    anchor = action.remind_anchor or fired_at
+    return recurrence.next_occurrence(anchor, action.recurrence, action.custom_interval_days, now)
+
+
+def claim(action, due_at, now):
+    """
+    Атомарно забирает напоминание: UPDATE сработает только у того воркера,
+    который первым увидел remind_at == due_at. Остальные получат 0 строк.
+    """
+    next_at = next_remind_at(action, due_at, now)
+    updated = DealAction.objects.filter(pk=action.pk, remind_at=due_at).update(
+        remind_at=next_at, remind_anchor=action.remind_anchor or due_at, last_reminded_at=now, updated_at=now
+    )
+    return bool(updated), next_at
+
+
+class ReminderScheduler:
+    def __init__(self, horizon=300, batch_size=10000, refresh_interval=30):
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self.heap = []
+        self.loaded_until = None
+        self.next_refresh = None
+        self.fired = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def refresh(self, now):
+        # Только ближайшее окно по индексу remind_at — таблица целиком не читается.
+        until = now + timedelta(seconds=self.horizon)
+        rows = list(
+            DealAction.objects.filter(remind_at__isnull=False, remind_at__lte=until)
+            .order_by("remind_at", "pk")
+            .values_list("remind_at", "pk")[:self.batch_size]
+        )
+        self.heap = rows
+        heapq.heapify(self.heap)
+        self.loaded_until = until if len(rows) < self.batch_size else rows[-1][0]
+        self.next_refresh = now + timedelta(seconds=self.refresh_interval)
+
+    def fire_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap))
+        metrics.reminder_last_run.set(now.timestamp())
+        # Куча отсортирована: первое напоминание — самое просроченное.
+        metrics.reminder_lag.set((now - due[0][0]).total_seconds() if due else 0)
+        if not due:
+            return 0
+
+        actions = DealAction.objects.select_related("deal").in_bulk([pk for _, pk in due])
+        fired = 0
+        for due_at, pk in due:
+            action = actions.get(pk)
+            if action is None or action.remind_at != due_at:
+                # Действие удалено или напоминание перенесли — запись в куче устарела.
+                continue
+            claimed, next_at = claim(action, due_at, now)
+            if not claimed:
+                continue
+            fired += 1
+            logger.info(
+                "reminder fired: action=%s deal=%s due_at=%s lag=%.1fs next=%s",
+                action.pk, action.deal_id, due_at.isoformat(), (now - due_at).total_seconds(),
+                next_at.isoformat() if next_at else None,
+            )
+            # Напоминание уже забрано: упавший получатель не должен отменить остальных.
+            responses = reminder_due.send_robust(sender=DealAction, action=action, due_at=due_at, next_at=next_at)
+            for receiver, response in responses:
+                if isinstance(response, Exception):
+                    logger.error(
+                        "reminder receiver %r failed: action=%s", receiver, action.pk,
+                        exc_info=(type(response), response, response.__traceback__),
+                    )
+            if next_at is not None and next_at <= self.loaded_until:
+                heapq.heappush(self.heap, (next_at, pk))
+        self.fired += fired
+        if fired:
+            metrics.reminders_fired.inc(fired)
+        return fired
+
+    def run_once(self, now=None):
+        now = now or timezone.now()
+        if self.next_refresh is None or now >= self.next_refresh:
+            self.refresh(now)
+        return self.fire_due(now)
+
+    def seconds_until_next(self, now):
+        wake_at = self.next_refresh
+        if self.heap and self.heap[0][0] < wake_at:
+            wake_at = self.heap[0][0]
+        return max((wake_at - now).total_seconds(), 0)
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                self.run_once()
+            except Exception:
+                # БД недоступна и т. п.: воркер не падает, а перечитывает окно на следующем проходе.
+                logger.exception("reminder pass failed, retrying in %ss", self.refresh_interval)
+                self.next_refresh = None
+                self._stop.wait(self.refresh_interval)
+                continue
+            self._stop.wait(self.seconds_until_next(timezone.now()))
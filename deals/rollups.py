@@ -0,0 +1,147 @@
+"""
+Сводка воронки в PipelineRollup: (владелец, этап, месяц создания) → число сделок и сумма.
+
+Сигналы Deal применяют дельты при создании, удалении, смене этапа, владельца
+и стоимости. Массовые операции (QuerySet.update, bulk_create) сигналы не
+вызывают — такие места передают изменения в record_change сами. Расхождения
+находит и исправляет rebuild() (команда reconcile_pipeline_rollups).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Deal, PipelineRollup
+
+
+FIELDS = ("owner_id", "stage_id", "created_at", "cost")
+ZERO = Decimal("0.00")
+
+
+def month_of(value):
+    return timezone.localtime(value).date().replace(day=1)
+
+
+def snapshot(deal):
+    """Значения сделки, от которых зависит сводка."""
+    return {field: getattr(deal, field) for field in FIELDS}
+
+
+def _contribution(values):
+    key = (values["owner_id"], values["stage_id"], month_of(values["created_at"]))
+    # До refresh_from_db в экземпляре лежит то, что присвоили: строка, float.
+    return key, Deal._meta.get_field("cost").to_python(values["cost"]) or ZERO
+
+
+def _apply(key, count, total):
+    owner_id, stage_id, month = key
+    rows = PipelineRollup.objects.filter(owner_id=owner_id, stage_id=stage_id, month=month)
+    if rows.update(deal_count=F("deal_count") + count, total_cost=F("total_cost") + total):
+        return
+    if count < 0 or (count == 0 and total < 0):
+        # Строки нет, а вычитать нечего: сводка уже разошлась (или владелец удаляется
+        # каскадом вместе со строками) — поправит reconcile.
+        return
+    try:
+        with transaction.atomic():
+            PipelineRollup.objects.create(
+                owner_id=owner_id, stage_id=stage_id, month=month, deal_count=count, total_cost=total
+            )
+    except IntegrityError:
+        # Строку параллельно создал другой запрос.
+        rows.update(deal_count=F("deal_count") + count, total_cost=F("total_cost") + total)
+
+
+def record_change(before, after):
+    """
+    Применяет переход сделки из состояния before в after (словари snapshot();
+    None — сделки не было / больше нет).
+    """
+    record_changes([(before, after)])
+
+
+def record_changes(transitions):
+    """Как record_change для многих сделок сразу: дельты суммируются по ключам сводки."""
+    deltas = defaultdict(lambda: [0, ZERO])
+    for before, after in transitions:
+        if before is not None:
+            key, cost = _contribution(before)
+            deltas[key][0] -= 1
+            deltas[key][1] -= cost
+        if after is not None:
+            key, cost = _contribution(after)
+            deltas[key][0] += 1
+            deltas[key][1] += cost
+
+    changes = [(key, count, total) for key, (count, total) in deltas.items() if count or total]
+    if not changes:
+        return
+    with transaction.atomic():
+        for key, count, total in sorted(changes, key=lambda item: (item[0][0], item[0][1] or 0, item[0][2])):
+            _apply(key, count, total)
+
+
+def previous_state(deal):
+    """Состояние сделки в БД до сохранения: из from_db, при неполных данных — запросом."""
+    loaded = getattr(deal, "_loaded_values", None) or {}
+    if all(field in loaded for field in FIELDS):
+        return {field: loaded[field] for field in FIELDS}
+    return Deal.objects.filter(pk=deal.pk).values(*FIELDS).first()
+
+
+def detach_stage(stage_id):
+    """Этап удаляется, сделки уходят в stage=NULL (SET_NULL) — переносим туда и их сводку."""
+    with transaction.atomic():
+        rows = list(PipelineRollup.objects.filter(stage_id=stage_id))
+        for row in rows:
+            _apply((row.owner_id, None, row.month), row.deal_count, row.total_cost)
+        PipelineRollup.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+
+def compute(batch_size=2000):
+    """Сводка, посчитанная заново по таблице сделок."""
+    totals = defaultdict(lambda: [0, ZERO])
+    for values in Deal.objects.order_by().values(*FIELDS).iterator(chunk_size=batch_size):
+        key, cost = _contribution(values)
+        totals[key][0] += 1
+        totals[key][1] += cost
+    return {key: tuple(value) for key, value in totals.items()}
+
+
+def stored():
+    rows = PipelineRollup.objects.values_list("owner_id", "stage_id", "month", "deal_count", "total_cost")
+    return {
+        (owner_id, stage_id, month): (count, total)
+        for owner_id, stage_id, month, count, total in rows
+        if count or total
+    }
+
+
+def drift(expected, actual):
+    """Ключи, где сводка расходится со сделками: [(key, ожидалось, в таблице)]."""
+    empty = (0, ZERO)
+    keys = sorted(set(expected) | set(actual), key=lambda key: (key[0], key[1] or 0, key[2]))
+    return [
+        (key, expected.get(key, empty), actual.get(key, empty))
+        for key in keys
+        if expected.get(key, empty) != actual.get(key, empty)
+    ]
+
+
+def rebuild(batch_size=2000, dry_run=False):
+    """Пересобирает сводку с нуля и возвращает найденные расхождения."""
+    with transaction.atomic():
+        expected = compute(batch_size=batch_size)
+        found = drift(expected, stored())
+        if not dry_run:
+            PipelineRollup.objects.all().delete()
+            PipelineRollup.objects.bulk_create(
+                [
+                    PipelineRollup(owner_id=owner_id, stage_id=stage_id, month=month, deal_count=count, total_cost=total)
+                    for (owner_id, stage_id, month), (count, total) in expected.items()
+                ],
+                batch_size=batch_size,
+            )
+    return found
@@ -0,0 +1,69 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import fulltext, refdata, rollups
+from .models import Blob, Company, Contact, Deal, DealAction, Document, Stage
+
+
+# Отправляется воркером run_reminders, когда у действия наступило время напоминания.
+# Аргументы: action, due_at, next_at (следующее напоминание или None).
+reminder_due = Signal()
+
+@receiver(post_delete, sender=Document)
+def release_document_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        Blob.objects.release(instance.blob_id)
+
+
+@receiver(post_save, sender=Stage)
+@receiver(post_delete, sender=Stage)
+def invalidate_reference_data(sender, **kwargs):
+    refdata.invalidate()
+
+
+@receiver(pre_delete, sender=Stage)
+def detach_stage_rollups(sender, instance, **kwargs):
+    rollups.detach_stage(instance.pk)
+
+
+@receiver(pre_save, sender=Deal)
+def remember_deal_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._rollup_before = None
+    else:
+        instance._rollup_before = rollups.previous_state(instance)
+
+
+@receiver(post_save, sender=Deal)
+def update_pipeline_rollups(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.record_change(getattr(instance, "_rollup_before", None), rollups.snapshot(instance))
+
+
+@receiver(post_delete, sender=Deal)
+def remove_from_pipeline_rollups(sender, instance, **kwargs):
+    rollups.record_change(rollups.snapshot(instance), None)
+
+
+@receiver(post_save, sender=Deal)
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Contact)
+@receiver(post_save, sender=DealAction)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    fulltext.index_objects([instance])
+    if sender is Deal:
+        loaded = getattr(instance, "_loaded_values", None) or {}
+        if "owner_id" in loaded and loaded["owner_id"] != instance.owner_id:
+            # Права на действия берутся из сделки — переиндексируем их с новым владельцем.
+            fulltext.index_objects(instance.actions.select_related("deal"))
+
+
+@receiver(post_delete, sender=Deal)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Contact)
+@receiver(post_delete, sender=DealAction)
+def remove_from_search_index(sender, instance, **kwargs):
+    fulltext.remove_objects(fulltext.entity_of(instance), [instance.pk])
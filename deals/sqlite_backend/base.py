@@ -0,0 +1,33 @@
+"""
+Бэкенд django.db.backends.sqlite3 с выбором режима BEGIN.
+
+Django 4.2 открывает транзакции atomic() через "BEGIN" (DEFERRED): блокировка
+на запись берётся только на первом INSERT/UPDATE. Если к этому моменту её уже
+держит другой процесс, SQLite не ждёт busy_timeout, а сразу возвращает
+"database is locked" — ожидание привело бы к взаимной блокировке. С
+BEGIN IMMEDIATE блокировка берётся в начале транзакции, и конкуренты честно
+ждут busy_timeout. Режим задаётся в OPTIONS["transaction_mode"], как в Django 5.1.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = {"DEFERRED", "IMMEDIATE", "EXCLUSIVE"}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def transaction_mode(self):
+        mode = (self.settings_dict["OPTIONS"].get("transaction_mode") or "DEFERRED").upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"transaction_mode должен быть одним из {sorted(TRANSACTION_MODES)}")
+        return mode
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        # sqlite3.connect() не знает этого параметра.
+        kwargs.pop("transaction_mode", None)
+        return kwargs
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f"BEGIN {self.transaction_mode}")
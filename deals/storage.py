@@ -0,0 +1,143 @@
+import hashlib
+import os
+import uuid
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+DEFAULT_STORAGE = {
+    "BACKEND": "deals.storage.LocalBlobStorage",
+    "OPTIONS": {},
+}
+
+
+class BlobWriter:
+    """Пишет блоб во временный файл, на лету считая размер и SHA-256."""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.size = 0
+        self.committed = False
+        self._hash = hashlib.sha256()
+        self._path = storage.temp_path()
+        self._file = open(self._path, "wb")
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        """Дописывает временный файл на диск и возвращает SHA-256; в хранилище его кладёт commit()."""
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        return self._hash.hexdigest()
+
+    def commit(self):
+        sha256 = self.finish()
+        self.storage.put(self._path, sha256)
+        self.committed = True
+        return sha256
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+
+
+class BlobStorage(ABC):
+    def writer(self):
+        return BlobWriter(self)
+
+    def save(self, chunks):
+        with self.writer() as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+            sha256 = writer.commit()
+        return sha256, writer.size
+
+    @abstractmethod
+    def temp_path(self):
+        pass
+
+    @abstractmethod
+    def put(self, temp_path, sha256):
+        pass
+
+    @abstractmethod
+    def open(self, sha256):
+        pass
+
+    @abstractmethod
+    def exists(self, sha256):
+        pass
+
+    @abstractmethod
+    def delete(self, sha256):
+        pass
+
+
+class LocalBlobStorage(BlobStorage):
+    """Блобы на локальном диске: <location>/ab/cd/abcd…, адрес — SHA-256 содержимого."""
+
+    def __init__(self, location=None):
+        self.location = Path(location or Path(settings.BASE_DIR) / "blobs")
+
+    def path(self, sha256):
+        return self.location / sha256[:2] / sha256[2:4] / sha256
+
+    def temp_path(self):
+        tmp_dir = self.location / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return tmp_dir / uuid.uuid4().hex
+
+    def put(self, temp_path, sha256):
+        target = self.path(sha256)
+        if target.exists():
+            # Такое содержимое уже лежит в хранилище — копия не нужна.
+            os.remove(temp_path)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, target)
+
+    def open(self, sha256):
+        return open(self.path(sha256), "rb")
+
+    def exists(self, sha256):
+        return self.path(sha256).exists()
+
+    def delete(self, sha256):
+        try:
+            os.remove(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    config = getattr(settings, "DOCUMENT_STORAGE", DEFAULT_STORAGE)
+    backend = import_string(config.get("BACKEND", DEFAULT_STORAGE["BACKEND"]))
+    return backend(**config.get("OPTIONS", {}))
+
+
+@receiver(setting_changed)
+def _reset_storage(sender, setting, **kwargs):
+    if setting == "DOCUMENT_STORAGE":
+        get_storage.cache_clear()
@@ -0,0 +1,19 @@
+class QueryBudgetMixin:
+    """
+    Бюджет запросов к БД для представления. Число запросов берётся у
+    QueryMetricsMiddleware (response.query_stats) и проверяется дважды: до и
+    после grow(), добавляющего данные. Так ловятся и превышение бюджета, и
+    N+1 — рост числа запросов вместе с числом строк.
+    """
+
+    def _query_count(self, make_request):
+        response = make_request()
+        self.assertLess(response.status_code, 400, getattr(response, "content", b"")[:500])
+        return response.query_stats.count
+
+    def assertQueryBudget(self, budget, make_request, grow):
+        before = self._query_count(make_request)
+        grow()
+        after = self._query_count(make_request)
+        self.assertEqual(before, after, "число запросов растёт вместе с объёмом данных")
+        self.assertLessEqual(after, budget, f"{after} запросов при бюджете {budget}")
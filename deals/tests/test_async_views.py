@@ -0,0 +1,147 @@
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from deals.models import Blob, Company, Contact, Deal, DealAction, Document
+from deals.storage import get_storage
+
+
+User = get_user_model()
+
+
+class AsyncJsonEndpointTests(TestCase):
+    """Async-представления через AsyncClient — тот же путь, что под ASGI."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.company = Company.objects.create(name="Ромашка")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner, client=self.company)
+        self.async_client.force_login(self.owner)
+
+    async def _post_json(self, url, payload):
+        return await self.async_client.post(url, json.dumps(payload), content_type="application/json")
+
+    async def test_company_contacts_and_not_modified(self):
+        await Contact.objects.acreate(company=self.company, name="Иван", owner=self.owner)
+        url = reverse("company_contacts", args=[self.company.pk])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["name"] for c in response.json()["contacts"]], ["Иван"])
+        self.assertGreater(response.query_stats.count, 0)
+
+        response = await self.async_client.get(url, headers={"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_action_create_update_delete(self):
+        response = await self._post_json(
+            reverse("deal_action_create", args=[self.deal.pk]), {"description": "Позвонить"}
+        )
+        self.assertEqual(response.status_code, 201)
+        action_id = response.json()["action"]["id"]
+
+        response = await self._post_json(
+            reverse("deal_action_update", args=[self.deal.pk, action_id]), {"description": "Перезвонить"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((await DealAction.objects.aget(pk=action_id)).description, "Перезвонить")
+
+        response = await self._post_json(
+            reverse("deal_action_update", args=[self.deal.pk, action_id]), {"recurrence": "custom"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = await self.async_client.post(reverse("deal_action_delete", args=[self.deal.pk, action_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await DealAction.objects.filter(pk=action_id).aexists())
+
+    async def test_action_batch(self):
+        response = await self._post_json(
+            reverse("deal_actions_batch", args=[self.deal.pk]),
+            {"operations": [{"op": "create", "data": {"description": "Один"}}]},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await DealAction.objects.filter(deal=self.deal).acount(), 1)
+
+    async def test_contact_create_update_delete(self):
+        response = await self._post_json(
+            reverse("deal_contact_create", args=[self.deal.pk]), {"name": "Пётр", "phone": "+7 900 000-00-00"}
+        )
+        self.assertEqual(response.status_code, 201)
+        contact_id = response.json()["contact"]["id"]
+        contact = await Contact.objects.aget(pk=contact_id)
+        self.assertEqual((contact.company_id, contact.owner_id), (self.company.pk, self.owner.pk))
+
+        url = reverse("deal_contact_update", args=[self.deal.pk, contact_id])
+        self.assertEqual((await self._post_json(url, {"name": ""})).status_code, 400)
+        response = await self._post_json(url, {"name": "Пётр Петров"})
+        self.assertEqual(response.json()["contact"]["name"], "Пётр Петров")
+
+        response = await self.async_client.post(reverse("deal_contact_delete", args=[self.deal.pk, contact_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(await Contact.objects.filter(pk=contact_id).aexists())
+
+    async def test_access_checks(self):
+        other = await User.objects.acreate(username="other")
+        foreign = await Deal.objects.acreate(title="Чужая", owner=other)
+        response = await self._post_json(reverse("deal_action_create", args=[foreign.pk]), {"description": "x"})
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get(reverse("deal_action_create", args=[self.deal.pk]))
+        self.assertEqual(response.status_code, 405)
+        response = await self.async_client.get(reverse("company_contacts", args=[10**6]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_anonymous_is_redirected_to_login(self):
+        response = await AsyncClient().get(reverse("company_contacts", args=[self.company.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response["Location"].startswith("/accounts/login/?next="))
+
+
+class AsyncDownloadTests(TestCase):
+    def setUp(self):
+        storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_dir, ignore_errors=True)
+        storage_settings = override_settings(
+            DOCUMENT_STORAGE={"BACKEND": "deals.storage.LocalBlobStorage", "OPTIONS": {"location": storage_dir}},
+            DOCUMENT_DOWNLOAD_CHUNK_SIZE=100,
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.payload = bytes(range(256)) * 4
+        writer = get_storage().writer()
+        writer.write(self.payload)
+        self.stored = Document.objects.create(
+            deal=deal, filename="a.bin", size=len(self.payload), blob=Blob.objects.acquire(writer)
+        )
+        self.legacy = Document.objects.create(deal=deal, filename="b.bin", size=len(self.payload), data=self.payload)
+        self.async_client.force_login(self.owner)
+        # В 4.2 у AsyncClient нет aforce_login — входим заранее, в синхронном setUp.
+        self.other_client = AsyncClient()
+        self.other_client.force_login(User.objects.create_user(username="other"))
+
+    async def _download(self, document, headers=None):
+        response = await self.async_client.get(reverse("download_document", args=[document.pk]), headers=headers)
+        # Под ASGI тело — асинхронный поток, а не список в памяти.
+        self.assertTrue(response.is_async)
+        return response, b"".join([chunk async for chunk in response.streaming_content])
+
+    async def test_streams_from_storage_and_database(self):
+        for document in (self.stored, self.legacy):
+            with self.subTest(document.filename):
+                response, body = await self._download(document)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, self.payload)
+
+    async def test_range_request(self):
+        response, body = await self._download(self.stored, headers={"Range": "bytes=250-549"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.payload[250:550])
+
+    async def test_foreign_document_is_forbidden(self):
+        response = await self.other_client.get(reverse("download_document", args=[self.stored.pk]))
+        self.assertEqual(response.status_code, 403)
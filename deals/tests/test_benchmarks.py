@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from deals import benchmarks, refdata
+from deals.datagen import DatasetGenerator
+
+
+class BenchmarkStatsTests(TestCase):
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 95), 95)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([7], 99), 7)
+        self.assertEqual(benchmarks.percentile([3, 1, 2], 50), 2)
+
+    def test_compare_reports_latency_and_query_regressions(self):
+        def result(p95, queries):
+            return {"sizes": {"1": {"views": {"deals_list": {"p95_ms": p95, "queries": queries}}}}}
+
+        baseline = result(10.0, 3)
+        self.assertEqual(benchmarks.compare(result(12.0, 3), baseline, threshold=0.25), [])
+        regressions = benchmarks.compare(result(13.0, 4), baseline, threshold=0.25)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("1/deals_list: p95", regressions[0])
+        self.assertIn("queries 3 -> 4", regressions[1])
+        # Размеры и сценарии, которых нет в базовой линии, не сравниваются.
+        self.assertEqual(benchmarks.compare(result(99.0, 9), {"sizes": {"0.1": {"views": {}}}}), [])
+
+
+class BenchmarkScenarioTests(TestCase):
+    def setUp(self):
+        storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, storage_dir, ignore_errors=True)
+        storage_settings = override_settings(
+            DOCUMENT_STORAGE={"BACKEND": "deals.storage.LocalBlobStorage", "OPTIONS": {"location": storage_dir}}
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.addCleanup(refdata.bump_version)
+        DatasetGenerator(users=1, companies=10, deals=20, documents_per_deal=1.0, blob_pool=2, seed=7).run()
+        self.ctx = benchmarks.BenchmarkContext(get_user_model().objects.get(username="load7_0"), seed=7)
+
+    def test_peak_memory_is_measured_per_pass(self):
+        def allocate(ctx):
+            bytearray(32 * 1024 * 1024)
+
+        with mock.patch.dict(benchmarks.SCENARIOS, {"allocate": allocate}):
+            self.assertGreaterEqual(benchmarks.peak_alloc_mb(self.ctx, ["allocate"]), 32)
+        # В отличие от ru_maxrss, пик прошлого прохода в следующий не переходит.
+        self.assertLess(benchmarks.peak_alloc_mb(self.ctx, ["deals_list"]), 32)
+
+    def test_every_scenario_runs(self):
+        for name, scenario in benchmarks.SCENARIOS.items():
+            with self.subTest(name):
+                metrics = benchmarks.run_scenario(self.ctx, scenario, iterations=3, warmup=1)
+                self.assertEqual(set(metrics), {"p50_ms", "p95_ms", "p99_ms", "queries", "throughput_rps"})
+                self.assertLessEqual(metrics["p50_ms"], metrics["p99_ms"])
+                self.assertGreater(metrics["queries"], 0)
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from deals.models import Company, Contact, Deal
+
+
+User = get_user_model()
+
+
+class CompanySearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="owner", password="test-pass-123")
+        self.romashka = Company.objects.create(name='ООО «Ромашка»', inn="7701234567", email="info@romashka.ru")
+        self.romashka_plus = Company.objects.create(name="Ромашка Плюс", phone="+7 900 111-22-33")
+        self.vasilek = Company.objects.create(name="АО Василёк", inn="5001112223", email="sales@vasilek.ru")
+        self.url = reverse("company_search")
+        self.client.force_login(self.user)
+
+    def _search(self, query, **params):
+        response = self.client.get(self.url, {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.json()["results"]]
+
+    def test_search_name_is_normalized_on_save(self):
+        self.assertEqual(self.romashka.search_name, "ромашка")
+        self.romashka.name = 'ЗАО "Лютик"'
+        self.romashka.save(update_fields=["name"])
+        self.romashka.refresh_from_db()
+        self.assertEqual(self.romashka.search_name, "лютик")
+
+    def test_exact_match_ranks_before_prefix(self):
+        self.assertEqual(self._search("ромашка"), ['ООО «Ромашка»', "Ромашка Плюс"])
+        self.assertEqual(self._search("РОМ"), ['ООО «Ромашка»', "Ромашка Плюс"])
+
+    def test_search_by_inn_phone_and_email(self):
+        self.assertEqual(self._search("7701"), ['ООО «Ромашка»'])
+        self.assertEqual(self._search("111-22"), ["Ромашка Плюс"])
+        self.assertEqual(self._search("sales@"), ["АО Василёк"])
+        # номер в другом формате находится по нормализованному индексу
+        self.assertEqual(self._search("8 (900) 111"), ["Ромашка Плюс"])
+        self.assertEqual(self._search("SALES@VASILEK"), ["АО Василёк"])
+
+    def test_substring_fallback_and_limit(self):
+        self.assertEqual(self._search("силё"), ["АО Василёк"])
+        self.assertEqual(len(self._search("ром", limit=1)), 1)
+        self.assertEqual(self._search(" "), [])
+
+    def test_search_answers_not_modified(self):
+        response = self.client.get(self.url, {"q": "ром"})
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(self.url, {"q": "ром"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.romashka.phone = "+7 495 000-00-00"
+        self.romashka.save()
+        response = self.client.get(self.url, {"q": "ром"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_deal_edit_embeds_only_selected_client(self):
+        deal = Deal.objects.create(title="Сделка", owner=self.user, client=self.vasilek)
+        response = self.client.get(reverse("deal_edit", args=[deal.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([company["id"] for company in response.context["companies_data"]], [self.vasilek.pk])
+        self.assertNotContains(response, "Ромашка")
+
+
+class CompanyContactsConditionalTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="owner", password="test-pass-123")
+        self.company = Company.objects.create(name="Ромашка")
+        self.ivan = Contact.objects.create(company=self.company, name="Иван", owner=self.user)
+        self.petr = Contact.objects.create(company=self.company, name="Пётр", owner=self.user)
+        self.url = reverse("company_contacts", args=[self.company.pk])
+        self.client.force_login(self.user)
+
+    def _etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        return response["ETag"]
+
+    def test_not_modified_skips_loading_contacts(self):
+        etag = self._etag()
+        # сессия, пользователь, компания и один агрегат — сами контакты не читаются
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_etag_changes_on_edit_add_and_delete(self):
+        etag = self._etag()
+        self.ivan.position = "Директор"
+        self.ivan.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self._etag()
+        self.petr.delete()
+        Contact.objects.create(company=self.company, name="Сергей", owner=self.user)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([contact["name"] for contact in response.json()["contacts"]], ["Иван", "Сергей"])
+
+        etag = response["ETag"]
+        Contact.objects.filter(name="Сергей").delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deletion_is_not_hidden_by_if_modified_since(self):
+        response = self.client.get(self.url)
+        self.petr.delete()
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["contacts"]), 1)
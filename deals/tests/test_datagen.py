@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from deals import refdata, rollups
+from deals.datagen import DatasetGenerator
+from deals.models import Blob, Company, Contact, Deal, DealAction, DealCompany, Document
+
+
+class DatasetGeneratorTests(TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        storage_settings = override_settings(
+            DOCUMENT_STORAGE={
+                "BACKEND": "deals.storage.LocalBlobStorage",
+                "OPTIONS": {"location": self.storage_dir},
+            }
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+        self.addCleanup(refdata.bump_version)
+
+    def _generate(self, **kwargs):
+        options = {"users": 3, "companies": 40, "deals": 120, "blob_pool": 3, "batch_size": 25, **kwargs}
+        return DatasetGenerator(**options).run()
+
+    def _snapshot(self):
+        return list(Deal.objects.order_by("pk").values_list("title", "cost", "stage__name", "client__name"))
+
+    def test_generates_consistent_dataset(self):
+        counts = self._generate()
+        self.assertEqual(counts["deals"], 120)
+        self.assertEqual(Company.objects.count(), 40)
+        self.assertEqual(Contact.objects.count(), counts["contacts"])
+        self.assertEqual(DealAction.objects.count(), counts["actions"])
+        self.assertEqual(DealCompany.objects.filter(role="client").count(), 120)
+        # даты созданий разнесены по времени, а не совпадают с моментом генерации
+        self.assertGreater(Deal.objects.dates("created_at", "month").count(), 1)
+        self.assertFalse(Company.objects.filter(search_name="").exists())
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+        for blob in Blob.objects.all():
+            self.assertEqual(blob.ref_count, Document.objects.filter(blob=blob).count())
+
+    def test_same_seed_reproduces_data(self):
+        self._generate(seed=7)
+        first = self._snapshot()
+        Deal.objects.all().delete()
+        Company.objects.all().delete()
+        self._generate(seed=7)
+        self.assertEqual(self._snapshot(), first)
+        Deal.objects.all().delete()
+        self._generate(seed=8)
+        self.assertNotEqual(self._snapshot(), first)
+
+    def test_command_scales_counts(self):
+        out = StringIO()
+        call_command("generate_dataset", "--scale", "0.01", "--documents-per-deal", "0", stdout=out)
+        self.assertEqual(Deal.objects.count(), 50)
+        self.assertEqual(Company.objects.count(), 10)
+        self.assertIn("Created", out.getvalue())
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from deals.db import apply_pragmas
+from deals.management.commands.benchmark_sqlite import _tuned_profile, run_profile
+from deals.sqlite_backend.base import DatabaseWrapper
+
+
+class SQLiteConnectionTests(TestCase):
+    def _pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def test_new_connections_get_configured_pragmas(self):
+        self.assertEqual(self._pragma("busy_timeout"), settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(self._pragma("cache_size"), settings.SQLITE_PRAGMAS["cache_size"])
+        self.assertEqual(self._pragma("temp_store"), 2)  # MEMORY
+
+    def test_pragma_names_and_values_are_checked(self):
+        with connection.cursor() as cursor:
+            with self.assertRaises(ValueError):
+                apply_pragmas(cursor, {"writable_schema": "ON"})
+            with self.assertRaises(ValueError):
+                apply_pragmas(cursor, {"cache_size": "1; DROP TABLE deals_deal"})
+
+
+class TransactionModeTests(SimpleTestCase):
+    def _wrapper(self, mode):
+        options = {"transaction_mode": mode} if mode else {}
+        wrapper = DatabaseWrapper({**connection.settings_dict, "NAME": ":memory:", "OPTIONS": options}, "mode_test")
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def _begin_sql(self, wrapper):
+        with CaptureQueriesContext(wrapper) as queries:
+            wrapper._start_transaction_under_autocommit()
+        self.assertTrue(wrapper.connection.in_transaction)
+        return queries.captured_queries[0]["sql"]
+
+    def test_begin_uses_configured_mode(self):
+        self.assertEqual(self._begin_sql(self._wrapper("immediate")), "BEGIN IMMEDIATE")
+        self.assertEqual(self._begin_sql(self._wrapper(None)), "BEGIN DEFERRED")
+
+    def test_unknown_mode_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self._wrapper("later").transaction_mode
+
+    def test_benchmark_profile_commits_every_write(self):
+        result = run_profile(_tuned_profile(), workers=2, transactions=10)
+        self.assertEqual((result["committed"], result["locked"]), (20, 0))
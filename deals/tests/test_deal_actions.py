@@ -1,10 +1,14 @@
 import json
+from datetime import datetime, timedelta
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from deals import fulltext
 from deals.models import Deal, DealAction, Stage
 
 
@@ -124,3 +128,170 @@ class DealActionViewTests(TestCase):
         response = self.client.post(delete_url, data=json.dumps({}), content_type="application/json")
         self.assertEqual(response.status_code, 403)
         self.assertTrue(DealAction.objects.filter(pk=action.pk).exists())
+
+
+
+class DealActionsBatchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.first = DealAction.objects.create(deal=self.deal, description="Первое")
+        self.second = DealAction.objects.create(deal=self.deal, description="Второе")
+        self.url = reverse("deal_actions_batch", args=[self.deal.pk])
+
+    def _post(self, operations, user=None):
+        self.client.force_login(user or self.owner)
+        return self.client.post(self.url, data=json.dumps({"operations": operations}), content_type="application/json")
+
+    def test_applies_all_operations(self):
+        operations = [
+            {"op": "create", "data": {"description": "Позвонить"}},
+            {"op": "create", "data": {"description": "Написать", "recurrence": "custom", "custom_interval_days": 2}},
+            {"op": "update", "id": self.first.pk, "data": {"description": "Первое, исправленное"}},
+            {"op": "delete", "id": self.second.pk},
+        ]
+        response = self._post(operations)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["ok"] * 4)
+        created = DealAction.objects.get(pk=results[1]["id"])
+        self.assertEqual(created.custom_interval_days, 2)
+        self.assertEqual(results[1]["action"]["description"], "Написать")
+        self.assertEqual(
+            sorted(self.deal.actions.values_list("description", flat=True)),
+            ["Написать", "Первое, исправленное", "Позвонить"],
+        )
+        self.first.refresh_from_db()
+        self.assertGreater(self.first.updated_at, self.second.updated_at)
+        if fulltext.is_enabled():
+            hits = [hit["title"] for hit in fulltext.search(self.owner, "исправленное")]
+            self.assertTrue(hits)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def cost(count):
+            operations = [{"op": "create", "data": {"description": f"Задача {i}"}} for i in range(count)]
+            operations.append({"op": "update", "id": self.first.pk, "data": {"description": f"Версия {count}"}})
+            self.client.force_login(self.owner)
+            with CaptureQueriesContext(connection) as queries:
+                response = self._post(operations)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self.assertEqual(cost(2), cost(30))
+
+    def test_invalid_operation_rolls_back_everything(self):
+        response = self._post(
+            [
+                {"op": "create", "data": {"description": "Позвонить"}},
+                {"op": "update", "id": self.first.pk, "data": {"description": "", "recurrence": "daily"}},
+                {"op": "delete", "id": 999999},
+                {"op": "rename"},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["ok", "error", "error", "error"])
+        self.assertIn("description", results[1]["errors"])
+        self.assertIn("id", results[2]["errors"])
+        self.assertEqual(self.deal.actions.count(), 2)
+
+    def test_foreign_actions_and_deals_are_rejected(self):
+        other_deal = Deal.objects.create(title="Чужая", owner=self.other_user)
+        foreign = DealAction.objects.create(deal=other_deal, description="Чужое")
+        response = self._post([{"op": "delete", "id": foreign.pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(DealAction.objects.filter(pk=foreign.pk).exists())
+
+        response = self._post([{"op": "delete", "id": self.first.pk}], user=self.other_user)
+        self.assertEqual(response.status_code, 403)
+
+    def test_same_action_cannot_be_changed_twice(self):
+        response = self._post(
+            [{"op": "update", "id": self.first.pk, "data": {"description": "A"}}, {"op": "delete", "id": self.first.pk}]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(DealAction.objects.filter(pk=self.first.pk, description="Первое").exists())
+
+    def test_malformed_operations_are_rejected_per_operation(self):
+        operations = [
+            {"op": "update", "id": [self.first.pk], "data": {}},
+            {"op": "delete", "id": True},
+            {"op": "create", "data": {"description": "Позвонить", "remind_at": {"a": 1}}},
+            {"op": "create", "data": {"description": ["x"]}},
+        ]
+        response = self._post(operations)
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["error"] * 4)
+        self.assertIn("id", results[0]["errors"])
+        self.assertIn("id", results[1]["errors"])
+        self.assertIn("remind_at", results[2]["errors"])
+        self.assertIn("description", results[3]["errors"])
+        self.assertEqual(self.deal.actions.count(), 2)
+
+
+class ActionsAgendaTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.url = reverse("actions_agenda")
+
+    def _action(self, starts_at, **kwargs):
+        action = DealAction.objects.create(deal=self.deal, description="Действие", **kwargs)
+        # starts_at не редактируется через форму, выставляем напрямую
+        DealAction.objects.filter(pk=action.pk).update(starts_at=starts_at)
+        return action
+
+    def test_recurring_actions_are_expanded_in_window(self):
+        window_start = timezone.make_aware(datetime(2024, 6, 10))
+        daily = self._action(window_start - timedelta(days=3 * 365, hours=-9), recurrence=DealAction.Recurrence.DAILY)
+        once = self._action(window_start + timedelta(days=1, hours=15))
+        self._action(window_start - timedelta(days=1))  # разовое до окна
+        weekly = self._action(window_start - timedelta(days=28), recurrence=DealAction.Recurrence.WEEKLY)
+        other_deal = Deal.objects.create(title="Чужая", owner=self.other_user)
+        DealAction.objects.create(deal=other_deal, description="Чужое", recurrence=DealAction.Recurrence.DAILY)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            self.url, {"start": window_start.isoformat(), "end": (window_start + timedelta(days=3)).isoformat()}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data["truncated"])
+        ids = [item["id"] for item in data["occurrences"]]
+        self.assertEqual(ids.count(daily.pk), 3)
+        self.assertEqual(ids.count(once.pk), 1)
+        self.assertEqual(ids.count(weekly.pk), 1)
+        self.assertEqual(len(ids), 5)
+        times = [item["occurs_at"] for item in data["occurrences"]]
+        self.assertEqual(times, sorted(times))
+        first = data["occurrences"][0]
+        self.assertEqual(first["deal"]["title"], "Сделка")
+        self.assertIn("recurrence_display", first)
+
+    def test_invalid_window(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.url, {"start": "вчера"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2024-06-10", "end": "2024-06-01"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"start": "2024-01-01", "end": "2025-01-01"}).status_code, 400)
+
+    def test_agenda_answers_not_modified(self):
+        self._action(timezone.now() + timedelta(days=1))
+        window = {"start": timezone.localdate().isoformat()}
+        self.client.force_login(self.owner)
+        etag = self.client.get(self.url, window)["ETag"]
+        response = self.client.get(self.url, window, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # другое окно — другая версия
+        other_window = {"start": (timezone.localdate() + timedelta(days=1)).isoformat()}
+        self.assertEqual(self.client.get(self.url, other_window, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # название сделки входит в ленту
+        self.deal.title = "Переименованная"
+        self.deal.save()
+        response = self.client.get(self.url, window, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["occurrences"][0]["deal"]["title"], "Переименованная")
@@ -0,0 +1,77 @@
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from deals.models import Company, Deal, Stage
+
+
+User = get_user_model()
+
+
+class DealsListTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.stage = Stage.objects.create(name="Заявка", order_index=1)
+        self.won = Stage.objects.create(name="Договор", order_index=2)
+        self.company = Company.objects.create(name="ООО Ромашка")
+        for index in range(7):
+            Deal.objects.create(
+                title=f"Сделка {index}",
+                owner=self.owner,
+                stage=self.won if index % 2 else self.stage,
+                client=self.company if index < 3 else None,
+                cost=Decimal(index * 100),
+            )
+        Deal.objects.create(title="Чужая сделка", owner=self.other_user, stage=self.stage)
+        self.url = reverse("deals_list")
+
+    def _walk(self, **params):
+        seen = []
+        params = {"per_page": 3, **params}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(deal.title for deal in response.context["deals"])
+            next_query = response.context["next_page_query"]
+            if not next_query:
+                return seen
+            params = {key: values[0] for key, values in parse_qs(urlparse("?" + next_query).query).items()}
+
+    def test_cursor_pages_cover_all_owned_deals_once(self):
+        self.client.force_login(self.owner)
+        titles = self._walk()
+        self.assertEqual(len(titles), 7)
+        self.assertEqual(titles, [f"Сделка {index}" for index in reversed(range(7))])
+
+    def test_sort_by_title(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(self._walk(sort="title"), [f"Сделка {index}" for index in range(7)])
+
+    def test_filters(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(len(self._walk(stage=self.won.pk)), 3)
+        self.assertEqual(len(self._walk(client=self.company.pk)), 3)
+        self.assertEqual(self._walk(cost_min="200", cost_max="400,00", sort="title"),
+                         ["Сделка 2", "Сделка 3", "Сделка 4"])
+
+    def test_superuser_sees_all_deals(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        self.assertEqual(len(self._walk()), 8)
+
+    def test_invalid_cursor_redirects_to_first_page(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 302)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        self.client.force_login(self.owner)
+        # сессия, пользователь, этапы для фильтра, сама страница
+        with self.assertNumQueries(4):
+            self.client.get(self.url, {"per_page": 2})
+        with self.assertNumQueries(4):
+            self.client.get(self.url, {"per_page": 50})
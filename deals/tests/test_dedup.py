@@ -0,0 +1,92 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from deals import dedup, fulltext
+from deals.models import Company, Contact, Deal, DealCompany
+from deals.normalization import normalize_email, normalize_phone
+
+
+User = get_user_model()
+
+
+class NormalizationTests(SimpleTestCase):
+    def test_phone_formats_share_one_key(self):
+        keys = {normalize_phone(value) for value in ("+7-900-111-22-33", "89001112233", "900 111 22 33", "7 (900) 111-2233")}
+        self.assertEqual(keys, {"79001112233"})
+        self.assertEqual(normalize_phone(None), "")
+        self.assertEqual(normalize_email("  Info@Romashka.RU "), "info@romashka.ru")
+
+
+class DuplicateTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.a = Company.objects.create(name="ООО Ромашка", inn="7701234567")
+        self.b = Company.objects.create(name="Ромашка-М", inn="7701 234567", phone="+7-900-111-22-33")
+        self.c = Company.objects.create(name="Цветы", phone="89001112233", email="Info@Flowers.ru")
+        self.d = Company.objects.create(name="Цветы и Ко", email="info@flowers.ru ")
+        self.e = Company.objects.create(name="Лютик", inn="5001112223")
+
+    def test_groups_are_joined_across_keys(self):
+        groups = dedup.find_company_duplicates()
+        self.assertEqual([group.ids for group in groups], [[self.a.pk, self.b.pk, self.c.pk, self.d.pk]])
+        self.assertEqual(
+            groups[0].reasons,
+            {
+                "inn_normalized": ["7701234567"],
+                "phone_normalized": ["79001112233"],
+                "email_normalized": ["info@flowers.ru"],
+            },
+        )
+
+    def test_contact_duplicates(self):
+        Contact.objects.create(company=self.a, owner=self.owner, name="Пётр", phone="8 900 000-00-01")
+        Contact.objects.create(company=self.b, owner=self.owner, name="Петр", phone="+79000000001")
+        Contact.objects.create(company=self.b, owner=self.owner, name="Иван", phone="+79000000002")
+        self.assertEqual(len(dedup.find_contact_duplicates()), 1)
+
+    def test_merge_moves_references_in_one_transaction(self):
+        contact = Contact.objects.create(company=self.b, owner=self.owner, name="Пётр", position="Снабженец")
+        deal = Deal.objects.create(title="Поставка", owner=self.owner, client=self.b)
+        DealCompany.objects.create(deal=deal, company=self.a, role="client")
+        DealCompany.objects.create(deal=deal, company=self.b, role="client")
+        DealCompany.objects.create(deal=deal, company=self.c, role="partner")
+
+        updated_at = self.a.updated_at
+        moved = dedup.merge_companies(self.a, [self.b, self.c])
+        self.assertEqual(moved, {"contacts": 1, "deal_companies": 1, "deals": 1, "deleted": 2})
+        self.assertFalse(Company.objects.filter(pk__in=[self.b.pk, self.c.pk]).exists())
+        contact.refresh_from_db()
+        deal.refresh_from_db()
+        self.assertEqual(contact.company_id, self.a.pk)
+        self.assertEqual(deal.client_id, self.a.pk)
+        self.assertEqual(
+            sorted(DealCompany.objects.filter(deal=deal).values_list("company_id", "role")),
+            [(self.a.pk, "client"), (self.a.pk, "partner")],
+        )
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.phone_normalized, "79001112233")
+        # Заполненные пустые поля — изменение карточки: updated_at двигается.
+        self.assertGreater(self.a.updated_at, updated_at)
+        hits = fulltext.search(self.owner, "снабженец")
+        self.assertEqual(hits[0]["id"], contact.pk)
+
+    def test_merge_view_and_command(self):
+        url = reverse("merge_companies", args=[self.a.pk])
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse("company_duplicates")).json()["total"], 1)
+        self.assertEqual(self.client.post(url, {"sources": [self.b.pk]}).status_code, 403)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        self.assertEqual(self.client.post(url, {"sources": [999999]}).status_code, 400)
+        response = self.client.post(url, {"sources": [self.b.pk]}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["moved"]["deleted"], 1)
+
+        out = StringIO()
+        call_command("find_duplicates", "companies", stdout=out)
+        self.assertIn("1 duplicate groups", out.getvalue())
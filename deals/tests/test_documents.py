@@ -0,0 +1,272 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from deals.models import Blob, Deal, Document, Stage
+from deals.storage import BlobStorage, get_storage
+
+
+User = get_user_model()
+
+
+@override_settings(DOCUMENT_DOWNLOAD_CHUNK_SIZE=7)
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.stage = Stage.objects.create(name="Заявка", order_index=1)
+        self.deal = Deal.objects.create(title="Сделка с файлом", owner=self.owner, stage=self.stage)
+        self.payload = bytes(range(256)) * 4
+        self.document = Document.objects.create(
+            deal=self.deal,
+            filename="report.bin",
+            content_type="application/octet-stream",
+            size=len(self.payload),
+            data=self.payload,
+            uploader=self.owner,
+        )
+        self.url = reverse("download_document", args=[self.document.pk])
+
+    def test_full_download_is_streamed(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), self.payload)
+        self.assertEqual(response["Content-Length"], str(len(self.payload)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("ETag", response)
+
+    def test_range_request_returns_partial_content(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-29")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.payload[10:30])
+        self.assertEqual(response["Content-Range"], f"bytes 10-29/{len(self.payload)}")
+        self.assertEqual(response["Content-Length"], "20")
+
+    def test_suffix_and_open_ended_ranges(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.payload[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=1000-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.payload[1000:])
+
+    def test_unsatisfiable_range(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.payload)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.payload)}")
+
+    def test_if_range_mismatch_returns_full_body(self):
+        self.client.force_login(self.owner)
+        etag = self.client.get(self.url)["ETag"]
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.payload)
+
+    def test_non_owner_cannot_download(self):
+        self.client.force_login(self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+
+
+class BlobStorageTests(TestCase):
+    def setUp(self):
+        self.storage_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        storage_settings = override_settings(
+            DOCUMENT_STORAGE={
+                "BACKEND": "deals.storage.LocalBlobStorage",
+                "OPTIONS": {"location": self.storage_dir},
+            }
+        )
+        storage_settings.enable()
+        self.addCleanup(storage_settings.disable)
+
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def _upload(self, name, content):
+        url = reverse("upload_document", args=[self.deal.pk])
+        return self.client.post(url, {"file": SimpleUploadedFile(name, content)})
+
+    def test_identical_uploads_share_one_blob(self):
+        self._upload("a.txt", b"same bytes")
+        self._upload("b.txt", b"same bytes")
+
+        self.assertEqual(Document.objects.count(), 2)
+        blob = Blob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertTrue(get_storage().exists(blob.sha256))
+        self.assertFalse(Document.objects.filter(data__isnull=False).exists())
+
+        doc = Document.objects.first()
+        response = self.client.get(reverse("download_document", args=[doc.pk]))
+        self.assertEqual(b"".join(response.streaming_content), b"same bytes")
+
+    def test_upload_detects_content_type_and_hash(self):
+        self._upload("scan.dat", b"%PDF-1.4\n%test\n")
+
+        doc = Document.objects.select_related("blob").get()
+        self.assertEqual(doc.content_type, "application/pdf")
+        self.assertEqual(doc.size, 15)
+        self.assertEqual(doc.blob.sha256, hashlib.sha256(b"%PDF-1.4\n%test\n").hexdigest())
+
+    def test_oversized_upload_is_rejected_while_streaming(self):
+        with self.settings(MAX_UPLOAD_SIZE=10):
+            response = self._upload("big.bin", b"x" * 64)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Файл слишком большой")
+        self.assertFalse(Document.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.storage_dir, "tmp")), [])
+
+    def test_deleting_last_reference_frees_blob(self):
+        self._upload("a.txt", b"payload")
+        self._upload("b.txt", b"payload")
+        first, second = Document.objects.order_by("pk")
+        sha256 = first.blob.sha256
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("delete_document", args=[first.pk]))
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(get_storage().exists(sha256))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("delete_document", args=[second.pk]))
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(get_storage().exists(sha256))
+
+    def test_acquire_rewrites_file_removed_by_orphan_cleanup(self):
+        # Строка блоба уже осиротела, а файл успело стереть удаление: новая загрузка кладёт его снова.
+        storage = get_storage()
+        sha256, size = storage.save([b"payload"])
+        orphan = Blob.objects.create(sha256=sha256, size=size)
+        storage.delete(sha256)
+
+        writer = storage.writer()
+        writer.write(b"payload")
+        blob = Blob.objects.acquire(writer)
+
+        self.assertEqual(blob.pk, orphan.pk)
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        with storage.open(sha256) as f:
+            self.assertEqual(f.read(), b"payload")
+        self.assertEqual(os.listdir(os.path.join(self.storage_dir, "tmp")), [])
+
+    def test_orphan_cleanup_skips_blob_acquired_again(self):
+        self._upload("a.txt", b"payload")
+        doc = Document.objects.get()
+        sha256 = doc.blob.sha256
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.get(reverse("delete_document", args=[doc.pk]))
+        self._upload("b.txt", b"payload")
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(get_storage().exists(sha256))
+
+    def test_failed_upload_removes_file_of_new_blob(self):
+        sha256 = hashlib.sha256(b"payload").hexdigest()
+        with mock.patch.object(Document.objects, "create", side_effect=DatabaseError("disk I/O error")):
+            with self.assertRaises(DatabaseError):
+                self._upload("a.txt", b"payload")
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(get_storage().exists(sha256))
+
+        # Файл блоба, на который уже есть ссылки, при неудаче остаётся.
+        self._upload("a.txt", b"payload")
+        with mock.patch.object(Document.objects, "create", side_effect=DatabaseError("disk I/O error")):
+            with self.assertRaises(DatabaseError):
+                self._upload("b.txt", b"payload")
+        self.assertEqual(Blob.objects.get().ref_count, 1)
+        self.assertTrue(get_storage().exists(sha256))
+
+    def test_incomplete_backend_fails_at_instantiation(self):
+        class WriteOnlyStorage(BlobStorage):
+            def temp_path(self):
+                return os.path.join(self.location, "tmp")
+
+            def put(self, temp_path, sha256):
+                pass
+
+        with self.assertRaisesMessage(TypeError, "WriteOnlyStorage"):
+            WriteOnlyStorage()
+
+    def test_migrate_command_moves_inline_blobs(self):
+        inline = [b"first inline file", b"second inline file", b"first inline file"]
+        for index, payload in enumerate(inline):
+            Document.objects.create(
+                deal=self.deal, filename=f"{index}.bin", size=len(payload), data=payload
+            )
+
+        call_command("migrate_document_blobs", batch_size=2, stdout=StringIO())
+
+        self.assertFalse(Document.objects.filter(blob__isnull=True).exists())
+        self.assertFalse(Document.objects.filter(data__isnull=False).exists())
+        self.assertEqual(Blob.objects.count(), 2)
+        for doc in Document.objects.order_by("pk"):
+            response = self.client.get(reverse("download_document", args=[doc.pk]))
+            self.assertEqual(b"".join(response.streaming_content), inline[int(doc.filename[0])])
+
+
+class DocumentListTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        for name in ("a.pdf", "b.pdf"):
+            Document.objects.create(
+                deal=self.deal, filename=name, content_type="application/pdf",
+                size=3, data=b"abc", uploader=self.owner,
+            )
+        self.url = reverse("deal_documents", args=[self.deal.pk])
+
+    def test_default_queryset_never_loads_bytes(self):
+        for doc in self.deal.documents.all():
+            self.assertIn("data", doc.get_deferred_fields())
+        self.assertEqual(Document.objects.with_data().get(filename="a.pdf").data, b"abc")
+
+    def test_json_listing_with_etag(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        documents = response.json()["documents"]
+        self.assertEqual([doc["filename"] for doc in documents], ["a.pdf", "b.pdf"])
+        self.assertEqual(documents[0]["uploader"]["username"], "owner")
+        self.assertEqual(documents[0]["size"], 3)
+
+        etag = response["ETag"]
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Document.objects.filter(filename="a.pdf").delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["documents"]), 1)
+
+    def test_non_owner_cannot_list(self):
+        self.client.force_login(self.other_user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
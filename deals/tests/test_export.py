@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from io import StringIO
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from deals import exports
+from deals.models import Company, Contact, Deal, DealContact, Stage
+
+
+User = get_user_model()
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.stage = Stage.objects.create(name="Заявка", order_index=1)
+        self.company = Company.objects.create(name="Ромашка", inn="7701234567")
+        self.deal = Deal.objects.create(
+            title="Поставка", owner=self.owner, stage=self.stage, client=self.company, cost=Decimal("1500.50")
+        )
+        self.contact = Contact.objects.create(
+            company=self.company, owner=self.owner, name="Петров", email="petrov@example.com"
+        )
+        DealContact.objects.create(deal=self.deal, contact=self.contact)
+        Deal.objects.create(title="Ещё", owner=self.owner, cost=Decimal("10"))
+        Deal.objects.create(title="Чужая", owner=self.other_user)
+        self.url = reverse("export_data", args=["deals"])
+
+    def _csv(self, response):
+        content = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.DictReader(io.StringIO(content)))
+
+    def test_csv_export_respects_visibility(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment", response["Content-Disposition"])
+        rows = self._csv(response)
+        self.assertEqual([row["title"] for row in rows], ["Поставка", "Ещё"])
+        self.assertEqual(rows[0]["stage"], "Заявка")
+        self.assertEqual(rows[0]["client_inn"], "7701234567")
+        self.assertEqual(rows[0]["cost"], "1500.50")
+        self.assertEqual(rows[0]["contacts"], "Петров <petrov@example.com>")
+        self.assertEqual(rows[1]["client"], "")
+
+    def test_jsonl_with_columns_and_filters(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            self.url, {"format": "jsonl", "columns": "id,title,cost", "cost_min": "100"}
+        )
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{"id": self.deal.pk, "title": "Поставка", "cost": "1500.50"}])
+
+        self.assertEqual(self.client.get(self.url, {"columns": "title,secret"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("export_data", args=["users"])).status_code, 400)
+
+    async def test_asgi_export_streams_asynchronously(self):
+        # В 4.2 у AsyncClient нет aforce_login.
+        await sync_to_async(self.async_client.force_login)(self.owner)
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        # Под ASGI синхронный поток Django прочитал бы в память целиком.
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8-sig")
+        self.assertEqual([row["title"] for row in csv.DictReader(io.StringIO(content))], ["Поставка", "Ещё"])
+
+    def test_batches_add_one_query_per_chunk(self):
+        for index in range(9):
+            Deal.objects.create(title=f"Сделка {index}", owner=self.owner)
+        # values_list.iterator на SQLite читает курсор порциями, контакты — запрос на пачку
+        with self.assertNumQueries(1 + 4):
+            lines = list(exports.export("deals", self.owner, {}, "csv", chunk_size=3))
+        self.assertEqual(len(lines), 12)
+
+    def test_other_entities_and_command(self):
+        self.client.force_login(self.other_user)
+        rows = self._csv(self.client.get(reverse("export_data", args=["contacts"])))
+        self.assertEqual(rows, [])
+        rows = self._csv(self.client.get(reverse("export_data", args=["companies"]), {"inn": "7701234567"}))
+        self.assertEqual([row["name"] for row in rows], ["Ромашка"])
+
+        out = StringIO()
+        call_command("export_data", "deals", format="jsonl", columns="title", filter=["cost_max=100"], stdout=out)
+        self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()], [{"title": "Ещё"}])
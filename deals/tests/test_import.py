@@ -0,0 +1,111 @@
+import io
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from deals import fulltext
+from deals.importer import ImportFileError, Importer, import_file, iter_rows
+from deals.models import Company, Contact
+
+
+User = get_user_model()
+
+CSV_DATA = (
+    "Название;ИНН;Телефон;email;contact_name;contact_email\n"
+    "ООО Ромашка;7701234567;+7 495 000-00-00;info@romashka.ru;Петров Пётр;petrov@romashka.ru\n"
+    "Лютик;;;;;\n"
+    ";7700000000;;;;\n"
+    "Василёк;123;;not-an-email;;\n"
+    "ООО Ромашка (новая);7701234567;;;Иванов Иван;\n"
+)
+
+
+class CompanyImportTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+
+    def _import(self, data, chunk_size=None, filename="companies.csv"):
+        return import_file(io.BytesIO(data.encode("utf-8")), filename, self.owner, chunk_size=chunk_size)
+
+    def test_rows_are_upserted_on_inn_with_error_report(self):
+        existing = Company.objects.create(name="Ромашка", inn="7701234567", address="Москва")
+        result = self._import(CSV_DATA, chunk_size=2)
+
+        self.assertEqual(result.rows, 5)
+        self.assertEqual([line for line, _ in result.errors], [4, 5])
+        self.assertIn("ИНН", result.errors[1][1])
+        self.assertEqual(result.companies_created, 1)
+        self.assertEqual(Company.objects.count(), 2)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, "ООО Ромашка (новая)")
+        self.assertEqual(existing.address, "Москва")  # пустые ячейки не затирают данные
+        self.assertEqual(existing.search_name, "ромашка (новая)")
+        self.assertEqual(
+            sorted(Contact.objects.filter(company=existing).values_list("name", flat=True)),
+            ["Иванов Иван", "Петров Пётр"],
+        )
+        self.assertTrue(Contact.objects.filter(owner=self.owner, email="petrov@romashka.ru").exists())
+        self.assertEqual(
+            {hit["entity"] for hit in fulltext.search(self.owner, "петров")}, {"contact"}
+        )
+
+    def test_writes_are_batched(self):
+        data = "name,inn,contact_name\n" + "".join(
+            f"Компания {i},{7700000000 + i},Контакт {i}\n" for i in range(400)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            result = self._import(data, chunk_size=500)
+        self.assertEqual(result.companies_created, 400)
+        self.assertEqual(result.contacts_created, 400)
+        # Запросы — на пачку (bulk_create дробит её по лимиту параметров SQLite), а не на строку.
+        self.assertLess(len(queries.captured_queries), 40)
+
+    def test_file_errors(self):
+        with self.assertRaises(ImportFileError):
+            self._import("foo,bar\n1,2\n")
+        with self.assertRaises(ImportFileError):
+            iter_rows(io.BytesIO(b""), "companies.pdf")
+        with self.assertRaises(ImportFileError):
+            Importer(self.owner).run(iter([]))
+
+    def test_command_writes_error_report(self):
+        path = self._tmp_csv(CSV_DATA)
+        report = path + ".errors.csv"
+        out = StringIO()
+        call_command("import_companies", path, owner="owner", errors=report, stdout=out)
+        self.assertIn("2 errors", out.getvalue())
+        with open(report, encoding="utf-8") as f:
+            self.assertEqual(f.readline().strip(), "line,error")
+
+    def _tmp_csv(self, data):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "companies.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        return path
+
+    def test_upload_view(self):
+        self.client.force_login(self.owner)
+        url = reverse("import_companies")
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        upload = SimpleUploadedFile("companies.csv", CSV_DATA.encode("utf-8"), content_type="text/csv")
+        response = self.client.post(url + "?format=json", {"file": upload})
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload["companies_created"], 2)
+        self.assertEqual(payload["error_count"], 2)
+
+        upload = SimpleUploadedFile("companies.xls", b"junk")
+        response = self.client.post(url + "?format=json", {"file": upload})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,209 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from deals import metrics
+from deals.models import Deal, DealAction, Document
+from deals.reminders import ReminderScheduler
+
+
+User = get_user_model()
+
+
+def sample(text, series):
+    """Значение ряда из текста /metrics; 0, если ряда ещё нет."""
+    match = re.search(rf"^{re.escape(series)} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+class RegistryTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.registry = metrics.Registry()
+        self.requests = metrics.Counter("t_requests_total", "Requests.", ("view",), registry=self.registry)
+        self.latency = metrics.Histogram(
+            "t_latency_seconds", "Latency.", ("view",), buckets=(0.1, 1.0), registry=self.registry
+        )
+        self.lag = metrics.Gauge("t_lag_seconds", "Lag.", registry=self.registry)
+
+    def test_renders_text_format(self):
+        with self.settings(METRICS_DIR=""):
+            self.requests.inc(view='a"b')
+            self.latency.observe(0.05, view="x")
+            self.latency.observe(0.5, view="x")
+            self.latency.observe(5, view="x")
+            text = self.registry.render()
+        self.assertIn("# TYPE t_requests_total counter\n", text)
+        self.assertIn('t_requests_total{view="a\\"b"} 1.0\n', text)
+        self.assertIn("# TYPE t_latency_seconds histogram\n", text)
+        self.assertIn('t_latency_seconds_bucket{view="x",le="0.1"} 1\n', text)
+        self.assertIn('t_latency_seconds_bucket{view="x",le="1.0"} 2\n', text)
+        self.assertIn('t_latency_seconds_bucket{view="x",le="+Inf"} 3\n', text)
+        self.assertIn('t_latency_seconds_sum{view="x"} 5.55\n', text)
+        self.assertIn('t_latency_seconds_count{view="x"} 3\n', text)
+        with self.assertRaises(ValueError):
+            self.requests.inc(status=200)
+
+    def test_empty_registry_writes_no_file(self):
+        with self.settings(METRICS_DIR=self.directory):
+            self.registry.flush()
+            self.assertEqual(os.listdir(self.directory), [])
+            self.lag.set(1)
+            self.registry.flush()
+        self.assertEqual(os.listdir(self.directory), [self.registry.file_name])
+        self.assertTrue(self.registry.file_name.startswith(f"{os.getpid()}-"))
+
+    def test_values_are_flushed_in_background(self):
+        path = os.path.join(self.directory, self.registry.file_name)
+        with self.settings(METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0.01):
+            # Запись значения на диск не ходит — файл пишет фоновый поток.
+            self.requests.inc(view="a")
+            deadline = time.monotonic() + 5
+            while not os.path.exists(path) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        with open(path) as f:
+            self.assertEqual(json.load(f)["counters"], [["t_requests_total", ["a"], 1.0]])
+
+    def test_aggregates_process_files(self):
+        # Файл «другого воркера»: счётчики и гистограммы складываются, gauge — самый свежий.
+        other = {
+            "counters": [["t_requests_total", ["a"], 2.0]],
+            "gauges": [["t_lag_seconds", [], 100.0, 0.0]],
+            "histograms": [["t_latency_seconds", ["a"], [1, 0], 0.05, 2]],
+        }
+        # Родительский процесс жив — файл читается как есть.
+        with open(os.path.join(self.directory, f"{os.getppid()}-1.json"), "w") as f:
+            json.dump(other, f)
+        with self.settings(METRICS_DIR=self.directory):
+            self.requests.inc(3, view="a")
+            self.latency.observe(0.5, view="a")
+            self.lag.set(7)
+            text = self.registry.render()
+        self.assertIn(self.registry.file_name, os.listdir(self.directory))
+        self.assertEqual(sample(text, 't_requests_total{view="a"}'), 5)
+        self.assertEqual(sample(text, "t_lag_seconds"), 7)
+        self.assertEqual(sample(text, 't_latency_seconds_bucket{view="a",le="0.1"}'), 1)
+        self.assertEqual(sample(text, 't_latency_seconds_bucket{view="a",le="1.0"}'), 2)
+        self.assertEqual(sample(text, 't_latency_seconds_count{view="a"}'), 3)
+
+    @skipIf(metrics.fcntl is None, "без fcntl файлы не сливаются")
+    def test_dead_process_files_are_archived(self):
+        process = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        dead_pid = int(process.stdout)
+        snapshot = {
+            "counters": [["t_requests_total", ["a"], 2.0]],
+            "gauges": [["t_lag_seconds", [], 100.0, 0.0]],
+            "histograms": [["t_latency_seconds", ["a"], [1, 0], 0.05, 1]],
+        }
+        # Два файла одного pid: процесс с повторно выданным pid не затирает файл предыдущего.
+        for started in (1, 2):
+            with open(os.path.join(self.directory, f"{dead_pid}-{started}.json"), "w") as f:
+                json.dump(snapshot, f)
+        with self.settings(METRICS_DIR=self.directory):
+            self.requests.inc(view="a")
+            first = self.registry.render()
+            second = self.registry.render()
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), sorted([".lock", metrics.ARCHIVE_NAME, self.registry.file_name])
+        )
+        for text in (first, second):
+            self.assertEqual(sample(text, 't_requests_total{view="a"}'), 5)
+            self.assertEqual(sample(text, 't_latency_seconds_count{view="a"}'), 2)
+            # gauge завершившегося процесса больше ничего не значит.
+            self.assertNotIn("\nt_lag_seconds ", text)
+
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        metrics_settings = override_settings(
+            METRICS_DIR=directory,
+            DOCUMENT_STORAGE={"BACKEND": "deals.storage.LocalBlobStorage", "OPTIONS": {"location": directory}},
+        )
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def _scrape(self):
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_request_latency_and_db_metrics_by_view(self):
+        series = 'deals_http_requests_total{view="deals_list",method="GET",status="200"}'
+        before = self._scrape()
+        self.client.get(reverse("deals_list"))
+        self.client.get(reverse("deals_list"))
+        self.client.get("/no-such-page/")
+        after = self._scrape()
+        self.assertEqual(sample(after, series) - sample(before, series), 2)
+        count = 'deals_http_request_duration_seconds_count{view="deals_list",status="200"}'
+        self.assertEqual(sample(after, count) - sample(before, count), 2)
+        queries = 'deals_db_queries_total{view="deals_list"}'
+        self.assertGreater(sample(after, queries), sample(before, queries))
+        self.assertIn('deals_db_query_duration_seconds_count{view="deals_list"}', after)
+        self.assertIn('view="<unresolved>",method="GET",status="404"', after)
+        self.assertNotIn("no-such-page", after)
+
+    def test_document_bytes_for_upload_and_download(self):
+        upload = 'deals_document_bytes_total{direction="upload"}'
+        download = 'deals_document_bytes_total{direction="download"}'
+        before = self._scrape()
+        payload = b"%PDF-1.4 " + b"x" * 1000
+        self.client.post(
+            reverse("upload_document", args=[self.deal.pk]),
+            {"file": SimpleUploadedFile("a.pdf", payload, content_type="application/pdf")},
+        )
+        document = Document.objects.get(deal=self.deal)
+        response = self.client.get(reverse("download_document", args=[document.pk]))
+        b"".join(response.streaming_content)
+        after = self._scrape()
+        self.assertEqual(sample(after, upload) - sample(before, upload), len(payload))
+        self.assertEqual(sample(after, download) - sample(before, download), len(payload))
+
+    def test_reminder_worker_lag(self):
+        now = timezone.now()
+        DealAction.objects.create(deal=self.deal, description="Позвонить", remind_at=now - timedelta(seconds=90))
+        before = self._scrape()
+        ReminderScheduler().run_once(now)
+        after = self._scrape()
+        self.assertEqual(sample(after, "deals_reminder_lag_seconds"), 90)
+        self.assertEqual(sample(after, "deals_reminder_last_run_timestamp_seconds"), now.timestamp())
+        self.assertEqual(
+            sample(after, "deals_reminders_fired_total") - sample(before, "deals_reminders_fired_total"), 1
+        )
+
+    def test_access_is_limited(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.5").status_code, 403)
+        with self.settings(METRICS_TOKEN="t0ken"):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer t0ken")
+            self.assertEqual(response.status_code, 200)
+
+    def test_proxied_request_requires_token(self):
+        self.client.logout()
+        proxied = {"HTTP_X_FORWARDED_FOR": "203.0.113.7"}
+        self.assertEqual(self.client.get(reverse("metrics"), **proxied).status_code, 403)
+        self.assertEqual(self.client.get(reverse("metrics"), HTTP_FORWARDED="for=203.0.113.7").status_code, 403)
+        with self.settings(METRICS_TOKEN="t0ken"):
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer t0ken", **proxied)
+            self.assertEqual(response.status_code, 200)
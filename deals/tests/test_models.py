@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from deals import refdata
+from deals.models import Company, Contact, Deal, OwnerSequence, Stage
+
+
+User = get_user_model()
+
+
+class DealNumberingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+
+    def test_numbering_continues_existing_deals(self):
+        Deal.objects.bulk_create([Deal(title=f"Старая {i}", owner=self.owner) for i in range(3)])
+        self.assertEqual(Deal.objects.create(owner=self.owner).title, "Сделка 4")
+        self.assertEqual(Deal.objects.create(owner=self.owner).title, "Сделка 5")
+        self.assertEqual(Deal.objects.create(owner=self.other_user).title, "Сделка 1")
+
+    def test_numbers_are_not_reused_after_delete(self):
+        first = Deal.objects.create(owner=self.owner)
+        first.delete()
+        self.assertEqual(Deal.objects.create(owner=self.owner).title, "Сделка 2")
+
+    def _create_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            deal = Deal.objects.create(owner=self.owner)
+        sql = [query["sql"] for query in queries.captured_queries]
+        self.assertFalse([q for q in sql if "COUNT(" in q], sql)
+        return deal, len(sql)
+
+    def test_creation_cost_does_not_depend_on_deal_count(self):
+        Stage.objects.create(name="Заявка", order_index=1)
+        Deal.objects.create(owner=self.owner)
+        _, few = self._create_queries()
+        Deal.objects.bulk_create([Deal(title=f"#{i}", owner=self.owner) for i in range(50)])
+        deal, many = self._create_queries()
+        self.assertEqual(few, many)
+        self.assertEqual(deal.title, "Сделка 3")
+        self.assertEqual(OwnerSequence.objects.get(owner=self.owner, kind=OwnerSequence.DEAL).value, 3)
+
+    def test_contact_numbering(self):
+        company = Company.objects.create(name="Ромашка")
+        contact = Contact.objects.create(company=company, owner=self.owner)
+        self.assertEqual(contact.name, "Контакт 1")
+
+
+class DefaultStageTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        # Закэшированное внутри теста откатывается вместе с ним — сбрасываем кэш.
+        self.addCleanup(refdata.bump_version)
+
+    def test_default_stage_is_cached_until_stage_changes(self):
+        request_stage = Stage.objects.create(name="Заявка", order_index=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(Stage.objects.get_default_id(), request_stage.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(Stage.objects.get_default_id(), request_stage.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            request_stage.delete()
+        self.assertIsNone(Stage.objects.get_default_id())
+        self.assertIsNone(Deal.objects.create(owner=self.owner).stage_id)
+
+    def test_new_deal_gets_default_stage(self):
+        Stage.objects.create(name="Договор", order_index=2)
+        request_stage = Stage.objects.create(name="Заявка", order_index=1)
+        deal = Deal.objects.create(owner=self.owner)
+        self.assertEqual(deal.stage_id, request_stage.pk)
+
+
+class ReferenceDataCacheTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.stage = Stage.objects.create(name="Заявка", order_index=1)
+        Stage.objects.create(name="Договор", order_index=2)
+        self.addCleanup(refdata.bump_version)
+
+    def _warm(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            refdata.stages()
+
+    def test_hot_path_does_not_query_stages(self):
+        self._warm()
+        with self.assertNumQueries(0):
+            self.assertEqual([stage.name for stage in refdata.stages()], ["Заявка", "Договор"])
+            self.assertEqual(refdata.default_stage_id(), self.stage.pk)
+
+        deal = Deal.objects.create(owner=self.owner)
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("deal_edit", args=[deal.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q["sql"] for q in queries.captured_queries if '"deals_stage"' in q["sql"]])
+
+    def test_other_worker_invalidation_reloads(self):
+        self._warm()
+        # Другой воркер сменил версию после своего изменения Stage.
+        cache.set(refdata.VERSION_KEY, "changed-elsewhere", None)
+        with self.assertNumQueries(1):
+            refdata.stages()
+
+    def test_stage_change_bumps_shared_version(self):
+        self._warm()
+        version = cache.get(refdata.VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stage.name = "Новая заявка"
+            self.stage.save()
+        self.assertNotEqual(cache.get(refdata.VERSION_KEY), version)
+        self.assertEqual(refdata.stages()[0].name, "Новая заявка")
+        self.assertIsNone(refdata.default_stage_id())
@@ -0,0 +1,181 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from deals import refdata, rollups
+from deals.models import Deal, PipelineRollup, Stage
+
+
+User = get_user_model()
+
+
+class PipelineRollupTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.request = Stage.objects.create(name="Заявка", order_index=1)
+        self.contract = Stage.objects.create(name="Договор", order_index=2)
+
+    def _table(self):
+        return {
+            (row.owner_id, row.stage_id): (row.deal_count, row.total_cost)
+            for row in PipelineRollup.objects.all()
+            if row.deal_count
+        }
+
+    def test_cost_assigned_as_str_or_float(self):
+        text = Deal.objects.create(title="A", owner=self.owner, stage=self.request, cost="100.50")
+        number = Deal.objects.create(title="B", owner=self.owner, stage=self.request, cost=20.25)
+        self.assertEqual(self._table(), {(self.owner.pk, self.request.pk): (2, Decimal("120.75"))})
+
+        text.cost = "50"
+        text.save()
+        number.cost = 0.75
+        number.save()
+        self.assertEqual(self._table(), {(self.owner.pk, self.request.pk): (2, Decimal("50.75"))})
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+
+    def test_deltas_follow_creates_moves_and_deletes(self):
+        deal = Deal.objects.create(title="A", owner=self.owner, stage=self.request, cost=Decimal("100"))
+        Deal.objects.create(title="B", owner=self.owner, stage=self.request)
+        self.assertEqual(self._table(), {(self.owner.pk, self.request.pk): (2, Decimal("100"))})
+
+        deal = Deal.objects.get(pk=deal.pk)
+        deal.stage = self.contract
+        deal.cost = Decimal("250.50")
+        deal.save()
+        self.assertEqual(self._table(), {
+            (self.owner.pk, self.request.pk): (1, Decimal("0")),
+            (self.owner.pk, self.contract.pk): (1, Decimal("250.50")),
+        })
+
+        deal.owner = self.other_user
+        deal.save()
+        self.assertEqual(self._table()[(self.other_user.pk, self.contract.pk)], (1, Decimal("250.50")))
+        self.assertNotIn((self.owner.pk, self.contract.pk), self._table())
+
+        deal.delete()
+        self.assertEqual(self._table(), {(self.owner.pk, self.request.pk): (1, Decimal("0"))})
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+
+    def test_deleted_stage_moves_rollups_to_no_stage(self):
+        Deal.objects.create(title="A", owner=self.owner, stage=self.contract, cost=Decimal("10"))
+        self.contract.delete()
+        self.assertEqual(self._table(), {(self.owner.pk, None): (1, Decimal("10"))})
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Deal.objects.create(title="A", owner=self.owner, stage=self.request, cost=Decimal("10"))
+        # Массовое обновление обходит сигналы — сводка расходится.
+        Deal.objects.update(stage=self.contract)
+
+        out = StringIO()
+        call_command("reconcile_pipeline_rollups", "--dry-run", stdout=out)
+        self.assertIn("2 rollup rows drifted", out.getvalue())
+        self.assertIn((self.owner.pk, self.request.pk), self._table())
+
+        call_command("reconcile_pipeline_rollups", stdout=StringIO())
+        self.assertEqual(self._table(), {(self.owner.pk, self.contract.pk): (1, Decimal("10"))})
+        out = StringIO()
+        call_command("reconcile_pipeline_rollups", stdout=out)
+        self.assertIn("No drift", out.getvalue())
+
+    def test_dashboard_reads_only_rollups(self):
+        Deal.objects.create(title="A", owner=self.owner, stage=self.request, cost=Decimal("10"))
+        Deal.objects.create(title="B", owner=self.owner, stage=self.contract, cost=Decimal("5"))
+        Deal.objects.create(title="C", owner=self.other_user, stage=self.contract, cost=Decimal("7"))
+        url = reverse("pipeline_dashboard")
+
+        self.client.force_login(self.owner)
+        with self.assertNumQueries(4):  # сессия, пользователь, воронка, месяцы
+            response = self.client.get(url, {"format": "json"})
+        payload = response.json()
+        self.assertEqual(payload["total"], {"deal_count": 2, "total_cost": "15.00"})
+        self.assertEqual([stage["name"] for stage in payload["stages"]], ["Заявка", "Договор"])
+        self.assertEqual(len(payload["owners"]), 1)
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(admin)
+        payload = self.client.get(url, {"format": "json"}).json()
+        self.assertEqual(payload["total"], {"deal_count": 3, "total_cost": "22.00"})
+        self.assertEqual(payload["stages"][1], {"id": self.contract.pk, "name": "Договор", "deal_count": 2, "total_cost": "12.00"})
+
+        response = self.client.get(url)
+        self.assertContains(response, "Воронка продаж")
+        self.assertEqual(self.client.get(url, {"from": "2024-13"}).status_code, 400)
+
+
+class PipelineBoardTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.request = Stage.objects.create(name="Заявка", order_index=1)
+        self.contract = Stage.objects.create(name="Договор", order_index=2)
+        self.addCleanup(refdata.bump_version)
+        self.deals = [
+            Deal.objects.create(title=f"Сделка {i}", owner=self.owner, stage=self.request, cost=Decimal("10"))
+            for i in range(5)
+        ]
+        self.foreign = Deal.objects.create(title="Чужая", owner=self.other_user, stage=self.request)
+        self.client.force_login(self.owner)
+
+    def _column(self, stage, **params):
+        response = self.client.get(reverse("board_column"), {"stage": stage, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def _move(self, ids, stage):
+        return self.client.post(
+            reverse("board_move"), data=json.dumps({"deals": ids, "stage": stage}), content_type="application/json"
+        )
+
+    def test_board_shows_counts_from_rollups(self):
+        response = self.client.get(reverse("pipeline_board"))
+        self.assertEqual(response.status_code, 200)
+        columns = {column["name"]: column for column in response.context["columns"]}
+        self.assertEqual(list(columns), ["Заявка", "Договор", "Без этапа"])
+        self.assertEqual(columns["Заявка"]["deal_count"], 5)
+        self.assertEqual(Decimal(columns["Заявка"]["total_cost"]), Decimal("50"))
+        self.assertEqual(columns["Договор"]["deal_count"], 0)
+
+    def test_column_pages_with_cursor(self):
+        first = self._column(self.request.pk, per_page=3)
+        self.assertEqual(len(first["deals"]), 3)
+        second = self._column(self.request.pk, per_page=3, cursor=first["next_cursor"])
+        self.assertIsNone(second["next_cursor"])
+        titles = [deal["title"] for deal in first["deals"] + second["deals"]]
+        self.assertEqual(sorted(titles), sorted(deal.title for deal in self.deals))
+        self.assertEqual(self._column("none")["deals"], [])
+        self.assertEqual(self.client.get(reverse("board_column"), {"stage": "999"}).status_code, 400)
+
+    def test_move_is_single_update_and_keeps_rollups_consistent(self):
+        ids = [deal.pk for deal in self.deals[:3]] + [self.foreign.pk]
+        with CaptureQueriesContext(connection) as queries:
+            response = self._move(ids, self.contract.pk)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(sorted(data["moved"]), sorted(ids[:3]))
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "deals_deal"')]
+        self.assertEqual(len(updates), 1)
+
+        counts = {column["name"]: column["deal_count"] for column in data["columns"]}
+        self.assertEqual(counts, {"Заявка": 2, "Договор": 3, "Без этапа": 0})
+        self.assertEqual(Deal.objects.get(pk=self.foreign.pk).stage, self.request)
+        self.assertGreater(Deal.objects.get(pk=ids[0]).updated_at, self.deals[0].updated_at)
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+
+        # Перенос в «Без этапа» и повторный перенос на тот же этап.
+        self.assertEqual(self._move(ids[:1], None).json()["moved"], ids[:1])
+        self.assertEqual(self._move(ids[:1], None).json()["moved"], [])
+        self.assertEqual(rollups.drift(rollups.compute(), rollups.stored()), [])
+
+    def test_move_validates_payload(self):
+        self.assertEqual(self._move("1", self.contract.pk).status_code, 400)
+        self.assertEqual(self._move([self.deals[0].pk], 999).status_code, 400)
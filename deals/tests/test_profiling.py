@@ -0,0 +1,95 @@
+import os
+import pstats
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from deals.middleware import ProfilingMiddleware
+from deals.models import Deal
+from deals.profiling import StackSampler, rotate
+
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        Deal.objects.create(title="Сделка", owner=self.owner)
+        self.client.force_login(self.owner)
+
+    def _files(self):
+        return sorted(os.listdir(self.profile_dir))
+
+    @override_settings(PROFILE_SAMPLE_RATE=0, PROFILE_SECRET="", PROFILE_STAFF=False)
+    def test_disabled_without_triggers(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+        response = self.client.get(reverse("deals_list"))
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_secret_header_profiles_request(self):
+        with self.settings(PROFILE_SECRET="s3cret", PROFILE_DIR=self.profile_dir, PROFILE_MODE="both"):
+            response = self.client.get(reverse("deals_list"), HTTP_X_PROFILE="wrong")
+            self.assertNotIn("X-Profile-Id", response)
+            self.assertEqual(self._files(), [])
+
+            response = self.client.get(reverse("deals_list"), HTTP_X_PROFILE="s3cret")
+        name = response["X-Profile-Id"]
+        self.assertIn("deals_list", name)
+        self.assertEqual(self._files(), [f"{name}.collapsed", f"{name}.pstats"])
+        stats = pstats.Stats(os.path.join(self.profile_dir, f"{name}.pstats"))
+        self.assertTrue(any(func[2] == "deals_list" for func in stats.stats))
+
+    def test_staff_requests_are_profiled(self):
+        with self.settings(PROFILE_STAFF=True, PROFILE_DIR=self.profile_dir, PROFILE_MODE="cprofile"):
+            response = self.client.get(reverse("deals_list"))
+            self.assertNotIn("X-Profile-Id", response)
+            User.objects.filter(pk=self.owner.pk).update(is_staff=True)
+            response = self.client.get(reverse("deals_list"))
+        self.assertEqual(self._files(), [f"{response['X-Profile-Id']}.pstats"])
+
+    def test_sample_rate_and_rotation(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1.0, PROFILE_DIR=self.profile_dir, PROFILE_KEEP=2):
+            for _ in range(4):
+                response = self.client.get(reverse("deals_list"))
+        files = self._files()
+        self.assertEqual(len(files), 2)
+        self.assertTrue(all(name.endswith(".collapsed") for name in files))
+        self.assertIn(f"{response['X-Profile-Id']}.collapsed", files)
+
+
+class ProfilingHelpersTests(TestCase):
+    def test_stack_sampler_collects_collapsed_stacks(self):
+        def busy_wait():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        busy_wait()
+        sampler.stop()
+        lines = sampler.collapsed().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn("busy_wait (test_profiling.py:", stack.split(";")[-1])
+
+    def test_rotate_ignores_foreign_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for i, name in enumerate(["a.pstats", "b.collapsed", "c.pstats", "notes.txt"]):
+            path = os.path.join(directory, name)
+            open(path, "w").close()
+            os.utime(path, (i, i))
+        rotate(directory, keep=1)
+        self.assertEqual(sorted(os.listdir(directory)), ["c.pstats", "notes.txt"])
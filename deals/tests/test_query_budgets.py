@@ -0,0 +1,98 @@
+import json
+import logging
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from deals import refdata
+from deals.models import Company, Contact, Deal, DealAction, Document, Stage
+from deals.tests.helpers import QueryBudgetMixin
+
+
+User = get_user_model()
+
+
+class QueryMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.client.force_login(self.owner)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    def test_server_timing_header_and_log_line(self):
+        Deal.objects.create(title="Сделка", owner=self.owner)
+        with self.assertLogs("deals.queries", level="INFO") as logs:
+            response = self.client.get(reverse("deals_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.query_stats.count, 0)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", db-slowest;dur=[\d.]+, total')
+        self.assertIn("view=deals_list", logs.output[0])
+        self.assertIn(f"queries={response.query_stats.count}", logs.output[0])
+        self.assertEqual(logs.records[0].queries, response.query_stats.count)
+
+    @override_settings(SERVER_TIMING_HEADER=False, QUERY_COUNT_WARNING=1)
+    def test_header_is_optional_and_heavy_requests_warn(self):
+        with self.assertLogs("deals.queries", level="WARNING") as logs:
+            response = self.client.get(reverse("deals_list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(logs.records[0].levelno, logging.WARNING)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.stages = [Stage.objects.create(name=name, order_index=i) for i, name in enumerate(["Заявка", "Договор"])]
+        self.company = Company.objects.create(name="Ромашка")
+        self.deal = Deal.objects.create(title="Основная", owner=self.owner, client=self.company, cost=Decimal("10"))
+        self.action = DealAction.objects.create(deal=self.deal, description="Позвонить")
+        self.addCleanup(refdata.bump_version)
+        self.client.force_login(self.owner)
+        self.batch = 0
+
+    def _grow(self):
+        self.batch += 1
+        for i in range(15):
+            client = Company.objects.create(name=f"Клиент {self.batch}-{i}")
+            Deal.objects.create(
+                title=f"Сделка {self.batch}-{i}", owner=self.owner, client=client, stage=self.stages[i % 2]
+            )
+            Contact.objects.create(company=self.company, name=f"Контакт {self.batch}-{i}", owner=self.owner)
+            DealAction.objects.create(deal=self.deal, description=f"Действие {self.batch}-{i}")
+            Document.objects.create(deal=self.deal, filename=f"{self.batch}-{i}.pdf", size=1, uploader=self.owner)
+
+    def _post_json(self, url, payload):
+        return lambda: self.client.post(url, data=json.dumps(payload), content_type="application/json")
+
+    def test_deals_list(self):
+        self.assertQueryBudget(4, lambda: self.client.get(reverse("deals_list")), self._grow)
+
+    def test_deal_edit(self):
+        self.assertQueryBudget(7, lambda: self.client.get(reverse("deal_edit", args=[self.deal.pk])), self._grow)
+
+    def test_company_contacts(self):
+        url = reverse("company_contacts", args=[self.company.pk])
+        self.assertQueryBudget(5, lambda: self.client.get(url), self._grow)
+
+    def test_action_create_and_update(self):
+        create = self._post_json(reverse("deal_action_create", args=[self.deal.pk]), {"description": "Новое"})
+        self.assertQueryBudget(8, create, self._grow)
+        update = self._post_json(
+            reverse("deal_action_update", args=[self.deal.pk, self.action.pk]), {"description": "Изменённое"}
+        )
+        self.assertQueryBudget(9, update, self._grow)
+
+    def test_action_delete(self):
+        def delete():
+            action = DealAction.objects.create(deal=self.deal, description="Удалить")
+            return self.client.post(reverse("deal_action_delete", args=[self.deal.pk, action.pk]))
+
+        self.assertQueryBudget(6, delete, self._grow)
+
+    def test_action_batch(self):
+        def batch():
+            operations = [{"op": "create", "data": {"description": f"Пакет {i}"}} for i in range(5)]
+            operations.append({"op": "update", "id": self.action.pk, "data": {"description": "Пакет"}})
+            return self._post_json(reverse("deal_actions_batch", args=[self.deal.pk]), {"operations": operations})()
+
+        self.assertQueryBudget(12, batch, self._grow)
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from deals import recurrence
+from deals.forms import DealActionForm
+from deals.models import Deal, DealAction
+from deals.reminders import ReminderScheduler
+from deals.signals import reminder_due
+
+
+User = get_user_model()
+Recurrence = DealAction.Recurrence
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class RecurrenceTests(SimpleTestCase):
+    def test_month_end_is_clamped_without_drift(self):
+        anchor = local(2024, 1, 31, 9, 0)
+        self.assertEqual(recurrence.occurrence(anchor, Recurrence.MONTHLY, None, 1), local(2024, 2, 29, 9, 0))
+        self.assertEqual(recurrence.occurrence(anchor, Recurrence.MONTHLY, None, 2), local(2024, 3, 31, 9, 0))
+        self.assertEqual(recurrence.occurrence(anchor, Recurrence.YEARLY, None, 1), local(2025, 1, 31, 9, 0))
+
+    def test_next_occurrence_jumps_to_window(self):
+        anchor = local(2021, 3, 1, 10, 0)
+        after = local(2024, 6, 15, 12, 0)
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.DAILY, None, after), local(2024, 6, 16, 10, 0))
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.WEEKLY, None, after), local(2024, 6, 17, 10, 0))
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.MONTHLY, None, after), local(2024, 7, 1, 10, 0))
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.YEARLY, None, after), local(2025, 3, 1, 10, 0))
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.CUSTOM, 10, after), local(2024, 6, 23, 10, 0))
+        self.assertIsNone(recurrence.next_occurrence(anchor, Recurrence.NONE, None, after))
+
+    def test_inclusive_boundary(self):
+        anchor = local(2024, 1, 1, 9, 0)
+        at = local(2024, 1, 3, 9, 0)
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.DAILY, None, at), local(2024, 1, 4, 9, 0))
+        self.assertEqual(recurrence.next_occurrence(anchor, Recurrence.DAILY, None, at, inclusive=True), at)
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.deal = Deal.objects.create(title="Сделка", owner=self.owner)
+        self.now = timezone.now().replace(microsecond=0)
+        self.fired = []
+        reminder_due.connect(self._on_reminder)
+        self.addCleanup(reminder_due.disconnect, self._on_reminder)
+
+    def _on_reminder(self, sender, action, due_at, next_at, **kwargs):
+        self.fired.append((action.pk, due_at, next_at))
+
+    def test_one_shot_reminder_fires_once(self):
+        action = DealAction.objects.create(
+            deal=self.deal, description="Позвонить", remind_at=self.now - timedelta(minutes=1)
+        )
+        future = DealAction.objects.create(
+            deal=self.deal, description="Позже", remind_at=self.now + timedelta(hours=2)
+        )
+
+        self.assertEqual(ReminderScheduler().run_once(self.now), 1)
+        action.refresh_from_db()
+        self.assertIsNone(action.remind_at)
+        self.assertEqual(action.last_reminded_at, self.now)
+        self.assertEqual([pk for pk, _, _ in self.fired], [action.pk])
+        future.refresh_from_db()
+        self.assertIsNotNone(future.remind_at)
+
+    def test_recurring_reminder_rolls_over_past_missed_occurrences(self):
+        action = DealAction.objects.create(
+            deal=self.deal, description="Ежедневный отчёт", recurrence=Recurrence.DAILY,
+            remind_at=self.now - timedelta(days=3, minutes=5),
+        )
+        ReminderScheduler().run_once(self.now)
+        action.refresh_from_db()
+        self.assertEqual(action.remind_at, self.now + timedelta(days=1) - timedelta(minutes=5))
+        self.assertEqual(len(self.fired), 1)
+
+    def test_month_end_series_does_not_drift(self):
+        jan31 = local(2024, 1, 31, 10, 0)
+        # Без remind_anchor, как у записей до его появления: якорем станет первое срабатывание.
+        action = DealAction.objects.create(
+            deal=self.deal, description="Счёт", recurrence=Recurrence.MONTHLY, remind_at=jan31
+        )
+        fired_at = []
+        for _ in range(3):
+            action.refresh_from_db()
+            fired_at.append(action.remind_at)
+            ReminderScheduler().run_once(action.remind_at)
+        action.refresh_from_db()
+        self.assertEqual(fired_at, [jan31, local(2024, 2, 29, 10, 0), local(2024, 3, 31, 10, 0)])
+        self.assertEqual(action.remind_at, local(2024, 4, 30, 10, 0))
+        self.assertEqual(action.remind_anchor, jan31)
+
+    def test_form_sets_anchor_from_remind_at(self):
+        form = DealActionForm(
+            {"description": "Отчёт", "remind_at": "2024-01-31T10:00", "recurrence": Recurrence.MONTHLY}
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.deal = self.deal
+        action = form.save()
+        self.assertEqual(action.remind_anchor, local(2024, 1, 31, 10, 0))
+
+        # Воркер перенёс напоминание на 29.02; правка описания якорь не трогает.
+        action.remind_at = local(2024, 2, 29, 10, 0)
+        form = DealActionForm(
+            {"description": "Отчёт, исправленный", "remind_at": "2024-02-29T10:00", "recurrence": Recurrence.MONTHLY},
+            instance=action,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.save().remind_anchor, local(2024, 1, 31, 10, 0))
+
+    def test_two_workers_never_double_fire(self):
+        DealAction.objects.create(
+            deal=self.deal, description="Один раз", remind_at=self.now - timedelta(seconds=5)
+        )
+        first, second = ReminderScheduler(), ReminderScheduler()
+        first.refresh(self.now)
+        second.refresh(self.now)
+        self.assertEqual(first.fire_due(self.now) + second.fire_due(self.now), 1)
+        self.assertEqual(len(self.fired), 1)
+
+    def test_heap_only_holds_the_horizon(self):
+        for minutes in (1, 10, 120):
+            DealAction.objects.create(
+                deal=self.deal, description="x", remind_at=self.now + timedelta(minutes=minutes)
+            )
+        scheduler = ReminderScheduler(horizon=15 * 60, refresh_interval=600)
+        scheduler.refresh(self.now)
+        self.assertEqual(len(scheduler.heap), 2)
+        self.assertEqual(scheduler.seconds_until_next(self.now), 60)
+
+    def test_failing_receiver_does_not_stop_others(self):
+        def broken(sender, **kwargs):
+            raise RuntimeError("smtp down")
+
+        reminder_due.connect(broken)
+        self.addCleanup(reminder_due.disconnect, broken)
+        for minutes in (1, 2):
+            DealAction.objects.create(
+                deal=self.deal, description="x", remind_at=self.now - timedelta(minutes=minutes)
+            )
+        with self.assertLogs("deals.reminders", "ERROR") as logs:
+            self.assertEqual(ReminderScheduler().run_once(self.now), 2)
+        self.assertEqual(len(self.fired), 2)
+        self.assertIn("smtp down", "\n".join(logs.output))
+
+    def test_run_forever_survives_failed_pass(self):
+        DealAction.objects.create(deal=self.deal, description="x", remind_at=self.now - timedelta(minutes=1))
+        scheduler = ReminderScheduler(refresh_interval=0)
+        refresh = scheduler.refresh
+        passes = []
+
+        def flaky_refresh(now):
+            passes.append(now)
+            if len(passes) == 1:
+                raise RuntimeError("database is locked")
+            refresh(now)
+            scheduler.stop()
+
+        with mock.patch.object(scheduler, "refresh", flaky_refresh), self.assertLogs("deals.reminders", "ERROR"):
+            scheduler.run_forever()
+        self.assertEqual(len(passes), 2)
+        self.assertEqual(len(self.fired), 1)
@@ -0,0 +1,84 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from deals import fulltext
+from deals.models import Company, Contact, Deal, DealAction
+
+
+User = get_user_model()
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="test-pass-123")
+        self.other_user = User.objects.create_user(username="other", password="test-pass-456")
+        self.company = Company.objects.create(name="Ромашка", address="Москва, Тверская 1", inn="7701234567")
+        self.deal = Deal.objects.create(title="Поставка оборудования", owner=self.owner, client=self.company)
+        self.contact = Contact.objects.create(
+            company=self.company, owner=self.owner, name="Петров Пётр", position="Директор",
+            email="petrov@example.com",
+        )
+        self.action = DealAction.objects.create(deal=self.deal, description="Позвонить насчёт оборудования")
+        self.other_deal = Deal.objects.create(title="Поставка мебели", owner=self.other_user)
+
+    def _search(self, user, query):
+        return {(hit["entity"], hit["id"]) for hit in fulltext.search(user, query)}
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self._search(self.owner, "оборуд"), {("deal", self.deal.pk), ("action", self.action.pk)})
+
+        self.deal.title = "Монтаж"
+        self.deal.save()
+        self.assertEqual(self._search(self.owner, "оборудования"), {("action", self.action.pk)})
+
+        self.action.delete()
+        self.assertEqual(self._search(self.owner, "оборудования"), set())
+        self.assertEqual(self._search(self.owner, "тверская"), {("company", self.company.pk)})
+        self.assertEqual(self._search(self.owner, "директор"), {("contact", self.contact.pk)})
+
+    def test_results_are_permission_filtered(self):
+        self.assertEqual(self._search(self.other_user, "поставка"), {("deal", self.other_deal.pk)})
+        self.assertEqual(self._search(self.other_user, "позвонить"), set())
+        # компании видны всем, как в company_contacts
+        self.assertEqual(self._search(self.other_user, "ромашка"), {("company", self.company.pk)})
+
+        admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.assertEqual(
+            self._search(admin, "поставка"), {("deal", self.deal.pk), ("deal", self.other_deal.pk)}
+        )
+
+    def test_owner_change_moves_action_visibility(self):
+        self.deal.owner = self.other_user
+        self.deal.save()
+        self.assertEqual(self._search(self.owner, "позвонить"), set())
+        self.assertEqual(self._search(self.other_user, "позвонить"), {("action", self.action.pk)})
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self._search(self.owner, 'поставка"* (^'), {("deal", self.deal.pk)})
+        self.assertEqual(self._search(self.owner, "поставка OR мебели"), set())
+        self.assertEqual(fulltext.search(self.owner, "  "), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {fulltext.TABLE}")
+        self.assertEqual(self._search(self.owner, "поставка"), set())
+
+        call_command("rebuild_search_index", batch_size=2, stdout=StringIO())
+        self.assertEqual(self._search(self.owner, "поставка"), {("deal", self.deal.pk)})
+        self.assertEqual(self._search(self.owner, "позвонить"), {("action", self.action.pk)})
+
+    def test_search_view(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("search"), {"q": "петров", "format": "json"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["entity"], "contact")
+
+        response = self.client.get(reverse("search"), {"q": "поставка"})
+        self.assertContains(response, "Поставка оборудования")
+        self.assertNotContains(response, "Поставка мебели")
@@ -0,0 +1,119 @@
+import mimetypes
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+from . import metrics
+from .storage import get_storage
+
+
+SNIFF_SIZE = 512
+
+# Сигнатуры распространённых форматов: (префикс, смещение, content type)
+MAGIC_NUMBERS = [
+    (b"%PDF-", 0, "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png"),
+    (b"\xff\xd8\xff", 0, "image/jpeg"),
+    (b"GIF87a", 0, "image/gif"),
+    (b"GIF89a", 0, "image/gif"),
+    (b"WEBP", 8, "image/webp"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", 0, "application/x-ole-storage"),
+    (b"PK\x03\x04", 0, "application/zip"),
+    (b"Rar!\x1a\x07", 0, "application/vnd.rar"),
+    (b"7z\xbc\xaf\x27\x1c", 0, "application/x-7z-compressed"),
+    (b"\x1f\x8b", 0, "application/gzip"),
+]
+
+# Офисные форматы — это zip/OLE-контейнеры, точный тип берём по расширению.
+CONTAINER_TYPES = {"application/zip", "application/x-ole-storage"}
+
+
+def get_max_upload_size():
+    return getattr(settings, "MAX_UPLOAD_SIZE", 200 * 1024 * 1024)
+
+
+def detect_content_type(head, filename, declared=""):
+    guessed = mimetypes.guess_type(filename or "")[0]
+    for signature, offset, content_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            if content_type in CONTAINER_TYPES and guessed:
+                return guessed
+            return content_type
+    return guessed or declared or "application/octet-stream"
+
+
+class StoredBlobFile(UploadedFile):
+    """Загруженный файл, уже записанный во временный файл хранилища."""
+
+    def __init__(self, writer, name, content_type, charset=None, content_type_extra=None):
+        super().__init__(
+            file=None,
+            name=name,
+            content_type=content_type,
+            size=writer.size,
+            charset=charset,
+            content_type_extra=content_type_extra,
+        )
+        self.writer = writer
+
+    def open(self, mode=None):
+        raise ValueError("Stored upload has no local file object; read it from the blob storage.")
+
+    def close(self):
+        # Вызывается Django в конце запроса: файл, не попавший в хранилище, удаляем.
+        if not self.writer.committed:
+            self.writer.abort()
+
+
+class BlobUploadHandler(FileUploadHandler):
+    """
+    Пишет куски загрузки прямо в хранилище блобов, считая размер, SHA-256 и
+    тип содержимого за один проход. Превышение MAX_UPLOAD_SIZE обрывает запись
+    сразу, не дожидаясь конца файла.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = get_max_upload_size() if max_size is None else max_size
+        self.rejected = False
+        self.writer = None
+        self.head = b""
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.head = b""
+        if content_length is not None and content_length > self.max_size:
+            self.rejected = True
+            raise SkipFile()
+        self.writer = get_storage().writer()
+
+    def receive_data_chunk(self, raw_data, start):
+        metrics.document_bytes.inc(len(raw_data), direction="upload")
+        if self.writer.size + len(raw_data) > self.max_size:
+            self.writer.abort()
+            self.writer = None
+            self.rejected = True
+            raise SkipFile()
+        if len(self.head) < SNIFF_SIZE:
+            self.head += raw_data[:SNIFF_SIZE - len(self.head)]
+        self.writer.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        writer, self.writer = self.writer, None
+        if writer is None:
+            return None
+        return StoredBlobFile(
+            writer,
+            name=self.file_name,
+            content_type=detect_content_type(self.head, self.file_name, self.content_type),
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if self.writer is not None:
+            self.writer.abort()
+            self.writer = None
@@ -10,21 +10,35 @@ urlpatterns = [
 
     path('', deals_views.index, name='home'),  # главная страница
     path('deals/', deals_views.deals_list, name='deals_list'),
+    path('search/', deals_views.search, name='search'),
+    path('pipeline/', deals_views.pipeline_dashboard, name='pipeline_dashboard'),
+    path('board/', deals_views.pipeline_board, name='pipeline_board'),
+    path('board/column/', deals_views.board_column, name='board_column'),
+    path('board/move/', deals_views.board_move, name='board_move'),
+    path('export/<str:entity>/', deals_views.export_data, name='export_data'),
+    path('actions/agenda/', deals_views.actions_agenda, name='actions_agenda'),
     path('deals/<int:pk>/edit/', deals_views.deal_edit, name='deal_edit'),
     path('deals/<int:pk>/', deals_views.deal_edit, name='deal_edit'),
     path('deals/<int:pk>/upload/', deals_views.upload_document, name='upload_document'),
     path('deals/<int:pk>/actions/create/', views.deal_action_create, name='deal_action_create'),
     path('deals/<int:pk>/actions/<int:action_id>/update/', views.deal_action_update, name='deal_action_update'),
     path('deals/<int:pk>/actions/<int:action_id>/delete/', views.deal_action_delete, name='deal_action_delete'),
+    path('deals/<int:pk>/actions/batch/', views.deal_actions_batch, name='deal_actions_batch'),
+    path('deals/<int:pk>/documents/', deals_views.deal_documents, name='deal_documents'),
     path('document/<int:doc_id>/download/', deals_views.download_document, name='download_document'),
     path("deals/create/", views.create_deal, name="create_deal"),
     path("document/<int:doc_id>/delete/", views.delete_document, name="delete_document"),
+    path("companies/search/", views.company_search, name="company_search"),
     path("companies/create/", views.create_company, name="create_company"),
+    path("companies/import/", views.import_companies, name="import_companies"),
+    path("companies/duplicates/", views.company_duplicates, name="company_duplicates"),
+    path("companies/<int:pk>/merge/", views.merge_companies, name="merge_companies"),
     path("companies/<int:pk>/update/", views.update_company, name="update_company"),
     path("companies/<int:pk>/contacts/", views.company_contacts, name="company_contacts"),
     path("deals/<int:pk>/contacts/create/", views.deal_contact_create, name="deal_contact_create"),
     path("deals/<int:pk>/contacts/<int:contact_id>/update/", views.deal_contact_update, name="deal_contact_update"),
     path("deals/<int:pk>/contacts/<int:contact_id>/delete/", views.deal_contact_delete, name="deal_contact_delete"),
+    path("metrics", views.metrics_view, name="metrics"),
  
 
 ]
@@ -1,32 +1,74 @@
+import hmac
 import json
+from datetime import datetime, time, timedelta
 from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
-from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
-from django.utils.encoding import smart_str
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.decorators.http import require_http_methods, require_POST
 
-from .forms import DealActionForm, DealForm, DocumentUploadForm
-from .models import Company, Contact, Deal, DealAction, Document, Stage
+from . import dedup, exports, fulltext, metrics, recurrence, refdata, rollups
+from .async_support import aget_object_or_404, aiter_sync, async_login_required, async_require_http_methods
+from .downloads import document_response
+from .filters import filter_deals, visible_deals
+from .http import (
+    aconditional_json_response,
+    aversion_state,
+    conditional_json_response,
+    latest,
+    version_etag,
+    version_state,
+)
+from .forms import DealActionForm, DealForm, DocumentUploadForm, ImportForm
+from .importer import ImportFileError, import_file
+from .models import Blob, Company, Contact, Deal, DealAction, Document, PipelineRollup
+from .pagination import InvalidCursor, paginate_keyset
+from .uploads import BlobUploadHandler
 
 
 ACTION_FORM_FIELDS = {"description", "remind_at", "recurrence", "custom_interval_days"}
 
-
-def _get_action_form_data(request):
-    content_type = request.META.get("CONTENT_TYPE", "")
-    if "application/json" in content_type:
-        try:
-            payload = json.loads(request.body.decode("utf-8") or "{}")
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            payload = {}
-    else:
-        payload = request.POST.dict()
-
+DEALS_PAGE_SIZE = 50
+COMPANY_SEARCH_LIMIT = 10
+COMPANY_SEARCH_MAX_LIMIT = 50
+SEARCH_LIMIT = 50
+AGENDA_DEFAULT_DAYS = 7
+AGENDA_MAX_DAYS = 92
+AGENDA_MAX_OCCURRENCES = 2000
+AGENDA_BATCH_SIZE = 500
+ACTION_BATCH_MAX_OPERATIONS = 200
+PIPELINE_DEFAULT_MONTHS = 12
+BOARD_PAGE_SIZE = 20
+BOARD_MAX_PAGE_SIZE = 100
+BOARD_MAX_MOVE = 500
+BOARD_ORDERING = ("-updated_at", "-id")
+IMPORT_REPORT_MAX_ERRORS = 1000
+DUPLICATE_GROUPS_LIMIT = 200
+DEFAULT_DEALS_SORT = "-updated_at"
+# Каждой сортировке соответствует индекс в Deal.Meta.indexes; id делает ключ уникальным.
+DEALS_SORTS = {
+    "-updated_at": ("-updated_at", "-id"),
+    "updated_at": ("updated_at", "id"),
+    "-created_at": ("-created_at", "-id"),
+    "created_at": ("created_at", "id"),
+    "title": ("title", "id"),
+    "-title": ("-title", "-id"),
+}
+
+
+def _action_form_data(payload):
     data = {}
     for field in ACTION_FORM_FIELDS:
         if field in payload:
@@ -37,7 +79,20 @@ def _get_action_form_data(request):
                 data[field] = str(value)
             else:
                 data[field] = value
+    return data
+
 
+def _get_action_form_data(request):
+    content_type = request.META.get("CONTENT_TYPE", "")
+    if "application/json" in content_type:
+        try:
+            payload = json.loads(request.body.decode("utf-8") or "{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            payload = {}
+    else:
+        payload = request.POST.dict()
+
+    data = _action_form_data(payload)
     if "recurrence" not in data:
         data["recurrence"] = DealAction.Recurrence.NONE
 
@@ -68,6 +123,43 @@ def _serialize_action(action):
     return payload
 
 
+def _serialize_company(company):
+    return {
+        "id": company.id,
+        "name": company.name,
+        "phone": company.phone or "",
+        "email": company.email or "",
+        "address": company.address or "",
+        "inn": company.inn or "",
+        "website": company.website or "",
+        "type": company.type,
+        "type_display": company.get_type_display(),
+    }
+
+
+def _serialize_occurrence(action, occurs_at):
+    payload = _serialize_action(action)
+    occurs_at_local = timezone.localtime(occurs_at)
+    payload["occurs_at"] = occurs_at_local.isoformat()
+    payload["occurs_at_display"] = occurs_at_local.strftime("%d.%m.%Y %H:%M")
+    payload["deal"] = {"id": action.deal_id, "title": action.deal.title}
+    return payload
+
+
+def _parse_agenda_bound(value):
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
 def _serialize_contact(contact):
     return {
         "id": contact.id,
@@ -89,7 +181,6 @@ def index(request):
 def create_deal(request):
     if request.method == "POST":
         deal = Deal.objects.create(owner=request.user)
-        deal.save()
         return JsonResponse({
             "id": deal.id,
             "name": deal.title,
@@ -99,18 +190,16 @@ def create_deal(request):
 
 @login_required
 def deal_edit(request, pk):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+    deal = get_object_or_404(Deal.objects.select_related("client"), pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return HttpResponseForbidden("Нет доступа")
-    stages = Stage.objects.all()
-    companies = Company.objects.all()  # 👈 добавляем список клиентов
-    contacts = Contact.objects.filter(company=deal.client).order_by("name") if deal.client else Contact.objects.none()
+    stages = refdata.stages()
+    # list(): контакты нужны и шаблону, и contacts_data — один запрос вместо двух.
+    contacts = list(Contact.objects.filter(company=deal.client).order_by("name")) if deal.client else []
     actions = deal.actions.all()
     action_form = DealActionForm()
     recurrence_choices = DealAction.Recurrence.choices
-    recurrence_options = [
-        {"value": value, "label": label} for value, label in recurrence_choices
-    ]
+    recurrence_options = refdata.recurrence_options()
 
     if request.method == "POST":
         deal.title = request.POST.get("title")
@@ -130,20 +219,8 @@ def deal_edit(request, pk):
             return redirect("deals_list")
         return redirect("deal_edit", pk=deal.pk)
 
-    companies_data = [
-        {
-            "id": company.id,
-            "name": company.name,
-            "phone": company.phone or "",
-            "email": company.email or "",
-            "address": company.address or "",
-            "inn": company.inn or "",
-            "website": company.website or "",
-            "type": company.type,
-            "type_display": company.get_type_display(),
-        }
-        for company in companies
-    ]
+    # Встраиваем только выбранного клиента; остальных ищет поиск по мере ввода.
+    companies_data = [_serialize_company(deal.client)] if deal.client else []
 
     contacts_data = [_serialize_contact(contact) for contact in contacts]
 
@@ -153,11 +230,11 @@ def deal_edit(request, pk):
         {
             "deal": deal,
             "stages": stages,
-            "companies": companies,  # 👈 передаём в шаблон
             "contacts": contacts,
             "companies_data": companies_data,
             "contacts_data": contacts_data,
             "actions": actions,
+            "documents": deal.documents.defer("data"),
             "action_form": action_form,
             "recurrence_choices": recurrence_choices,
             "recurrence_options": recurrence_options,
@@ -165,6 +242,35 @@ def deal_edit(request, pk):
     )
 
 
+@login_required
+@require_http_methods(["GET"])
+def search(request):
+    query = request.GET.get("q", "").strip()
+    results = fulltext.search(request.user, query, limit=SEARCH_LIMIT) if query else []
+    if request.GET.get("format") == "json" or "application/json" in request.META.get("HTTP_ACCEPT", ""):
+        return JsonResponse({"query": query, "results": results})
+    return render(request, "deals/search.html", {"query": query, "results": results})
+
+
+@login_required
+@require_http_methods(["GET"])
+def company_search(request):
+    try:
+        limit = min(max(int(request.GET.get("limit", COMPANY_SEARCH_LIMIT)), 1), COMPANY_SEARCH_MAX_LIMIT)
+    except ValueError:
+        limit = COMPANY_SEARCH_LIMIT
+    companies = Company.objects.search(request.GET.get("q", ""), limit=limit)
+    # Выдача ограничена limit — версия считается по самим найденным записям.
+    etag = version_etag("company-search", *((company.pk, company.updated_at) for company in companies))
+    return conditional_json_response(
+        request,
+        etag,
+        lambda: {"results": [_serialize_company(company) for company in companies]},
+        last_modified=latest(*(company.updated_at for company in companies)),
+        use_last_modified=False,
+    )
+
+
 @login_required
 @require_http_methods(["POST"])
 def create_company(request):
@@ -193,21 +299,86 @@ def create_company(request):
         inn=_normalize(inn),
         website=_normalize(website),
     )
+    return JsonResponse(_serialize_company(company))
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def import_companies(request):
+    result = None
+    form = ImportForm(request.POST or None, request.FILES or None)
+    if request.method == "POST" and form.is_valid():
+        upload = form.cleaned_data["file"]
+        try:
+            result = import_file(upload.file, upload.name, request.user)
+        except (ImportFileError, UnicodeDecodeError) as exc:
+            form.add_error("file", str(exc))
+    wants_json = request.GET.get("format") == "json" or "application/json" in request.META.get("HTTP_ACCEPT", "")
+    if wants_json and request.method == "POST":
+        if result is None:
+            return JsonResponse({"errors": form.errors}, status=400)
+        return JsonResponse(result.as_dict(max_errors=IMPORT_REPORT_MAX_ERRORS))
+    return render(
+        request,
+        "deals/import.html",
+        {
+            "form": form,
+            "result": result,
+            "errors": result.errors[:IMPORT_REPORT_MAX_ERRORS] if result else [],
+        },
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+def company_duplicates(request):
+    groups = dedup.find_company_duplicates()
+    shown = groups[:DUPLICATE_GROUPS_LIMIT]
+    companies = Company.objects.in_bulk([pk for group in shown for pk in group.ids])
     return JsonResponse(
         {
-            "id": company.id,
-            "name": company.name,
-            "phone": company.phone or "",
-            "email": company.email or "",
-            "address": company.address or "",
-            "inn": company.inn or "",
-            "website": company.website or "",
-            "type": company.type,
-            "type_display": company.get_type_display(),
+            "total": len(groups),
+            "groups": [
+                {
+                    "reasons": group.reasons,
+                    "companies": [_serialize_company(companies[pk]) for pk in group.ids if pk in companies],
+                }
+                for group in shown
+            ],
         }
     )
 
 
+@login_required
+@require_http_methods(["POST"])
+def merge_companies(request, pk):
+    # Слияние удаляет компании, которые видят все пользователи, — только для персонала.
+    if not (request.user.is_superuser or request.user.is_staff):
+        return JsonResponse({"error": "Нет доступа"}, status=403)
+    target = get_object_or_404(Company, pk=pk)
+
+    content_type = request.META.get("CONTENT_TYPE", "")
+    if "application/json" in content_type:
+        try:
+            payload = json.loads(request.body.decode("utf-8") or "{}")
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            payload = {}
+        source_ids = payload.get("sources") or []
+    else:
+        source_ids = request.POST.getlist("sources")
+    try:
+        source_ids = {int(value) for value in source_ids} - {target.pk}
+    except (TypeError, ValueError):
+        return JsonResponse({"errors": {"sources": ["Укажите id компаний."]}}, status=400)
+    sources = list(Company.objects.filter(pk__in=source_ids))
+    if not sources or len(sources) != len(source_ids):
+        return JsonResponse({"errors": {"sources": ["Компании для слияния не найдены."]}}, status=400)
+
+    moved = dedup.merge_companies(target, sources)
+    target.refresh_from_db()
+    return JsonResponse({"company": _serialize_company(target), "moved": moved})
+
+
 @login_required
 @require_http_methods(["POST"])
 def update_company(request, pk):
@@ -246,26 +417,14 @@ def update_company(request, pk):
 
     company.save()
 
-    return JsonResponse(
-        {
-            "id": company.id,
-            "name": company.name,
-            "phone": company.phone or "",
-            "email": company.email or "",
-            "address": company.address or "",
-            "inn": company.inn or "",
-            "website": company.website or "",
-            "type": company.type,
-            "type_display": company.get_type_display(),
-        }
-    )
+    return JsonResponse(_serialize_company(company))
 
 
-@login_required
-@require_http_methods(["POST"])
-def deal_contact_create(request, pk):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_contact_create(request, pk):
+    deal = await aget_object_or_404(Deal.objects.select_related("client"), pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
     if not deal.client:
         return JsonResponse({"error": "Сначала выберите клиента для сделки."}, status=400)
@@ -291,7 +450,7 @@ def deal_contact_create(request, pk):
 
     contact = Contact(
         company=deal.client,
-        owner=deal.owner,
+        owner_id=deal.owner_id,
         name=name,
         position=_normalize(payload.get("position")) or "",
         phone=_normalize(payload.get("phone")) or "",
@@ -300,22 +459,23 @@ def deal_contact_create(request, pk):
     )
 
     try:
-        contact.full_clean()
+        # full_clean проверяет внешние ключи запросами к БД.
+        await sync_to_async(contact.full_clean)()
     except ValidationError as exc:
         return JsonResponse({"errors": exc.message_dict}, status=400)
 
-    contact.save()
+    await contact.asave()
     return JsonResponse({"contact": _serialize_contact(contact)}, status=201)
 
 
-@login_required
-@require_http_methods(["POST"])
-def deal_contact_update(request, pk, contact_id):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_contact_update(request, pk, contact_id):
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
 
-    contact = get_object_or_404(Contact, pk=contact_id)
+    contact = await aget_object_or_404(Contact, pk=contact_id)
     if deal.client_id and contact.company_id != deal.client_id:
         return JsonResponse({"error": "Контакт не относится к выбранному клиенту."}, status=400)
 
@@ -345,143 +505,663 @@ def deal_contact_update(request, pk, contact_id):
     contact.messengers = _normalize(payload.get("messengers")) or ""
 
     try:
-        contact.full_clean()
+        await sync_to_async(contact.full_clean)()
     except ValidationError as exc:
         return JsonResponse({"errors": exc.message_dict}, status=400)
 
-    contact.save()
+    await contact.asave()
     return JsonResponse({"contact": _serialize_contact(contact)})
 
 
-@login_required
-@require_http_methods(["POST"])
-def deal_contact_delete(request, pk, contact_id):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_contact_delete(request, pk, contact_id):
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
 
-    contact = get_object_or_404(Contact, pk=contact_id)
+    contact = await aget_object_or_404(Contact, pk=contact_id)
     if deal.client_id and contact.company_id != deal.client_id:
         return JsonResponse({"error": "Контакт не относится к выбранному клиенту."}, status=400)
 
-    contact.delete()
+    await contact.adelete()
     return JsonResponse({"status": "ok"})
 
 
-@login_required
-@require_http_methods(["GET"])
-def company_contacts(request, pk):
-    company = get_object_or_404(Company, pk=pk)
-    contacts = company.contacts.all().order_by("name")
-    return JsonResponse({"contacts": [_serialize_contact(contact) for contact in contacts]})
+@async_login_required
+@async_require_http_methods(["GET"])
+async def company_contacts(request, pk):
+    company = await aget_object_or_404(Company, pk=pk)
+    # Индекс (company, updated_at): версия списка без чтения самих контактов.
+    state = await aversion_state(company.contacts.all())
+    etag = version_etag(f"contacts-{company.pk}", state["count"], state["last_id"], state["last_modified"])
 
+    async def build_payload():
+        contacts = company.contacts.all().order_by("name")
+        return {"contacts": [_serialize_contact(contact) async for contact in contacts]}
 
-@login_required
-@require_http_methods(["POST"])
-def deal_action_create(request, pk):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+    return await aconditional_json_response(
+        request, etag, build_payload, last_modified=state["last_modified"], use_last_modified=False
+    )
+
+
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_action_create(request, pk):
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
 
     form = DealActionForm(_get_action_form_data(request))
-    if form.is_valid():
+    # Проверка ModelForm включает full_clean модели — в потоке ORM.
+    if await sync_to_async(form.is_valid)():
         action = form.save(commit=False)
         action.deal = deal
-        action.save()
+        await action.asave()
         return JsonResponse({"action": _serialize_action(action)}, status=201)
 
     return JsonResponse({"errors": form.errors}, status=400)
 
 
-@login_required
-@require_http_methods(["POST"])
-def deal_action_update(request, pk, action_id):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_action_update(request, pk, action_id):
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
 
-    action = get_object_or_404(DealAction, pk=action_id, deal=deal)
+    action = await aget_object_or_404(DealAction, pk=action_id, deal=deal)
+    action.deal = deal  # уже загружена: индексу и сигналам не нужен повторный запрос
     form = DealActionForm(_get_action_form_data(request), instance=action)
-    if form.is_valid():
-        action = form.save()
+    if await sync_to_async(form.is_valid)():
+        action = form.save(commit=False)
+        await action.asave()
         return JsonResponse({"action": _serialize_action(action)})
 
     return JsonResponse({"errors": form.errors}, status=400)
 
 
-@login_required
-@require_http_methods(["POST"])
-def deal_action_delete(request, pk, action_id):
-    deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_action_delete(request, pk, action_id):
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return JsonResponse({"error": "Нет доступа"}, status=403)
 
-    action = get_object_or_404(DealAction, pk=action_id, deal=deal)
-    action.delete()
+    action = await aget_object_or_404(DealAction, pk=action_id, deal=deal)
+    await action.adelete()
     return JsonResponse({"status": "ok"})
 
 
+@async_login_required
+@async_require_http_methods(["POST"])
+async def deal_actions_batch(request, pk):
+    """
+    Пакет операций над действиями сделки:
+    {"operations": [{"op": "create", "data": {...}}, {"op": "update", "id": 1, "data": {...}},
+    {"op": "delete", "id": 2}]}.
+    Сначала проверяются все операции; если хоть одна ошибочна, ничего не
+    применяется. Иначе всё записывается в одной транзакции через bulk_create,
+    bulk_update и один DELETE. В ответе results — по элементу на операцию.
+    """
+    deal = await aget_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
+        return JsonResponse({"error": "Нет доступа"}, status=403)
+
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
+    operations = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(operations, list):
+        return JsonResponse({"error": "Ожидается список operations"}, status=400)
+    if len(operations) > ACTION_BATCH_MAX_OPERATIONS:
+        return JsonResponse(
+            {"error": f"Не больше {ACTION_BATCH_MAX_OPERATIONS} операций за запрос"}, status=400
+        )
+
+    # Все затронутые действия — одним запросом. type() is int, а не isinstance: true — не pk 1.
+    ids = [op.get("id") for op in operations if isinstance(op, dict) and type(op.get("id")) is int]
+    existing = await DealAction.objects.filter(deal=deal).ain_bulk(ids)
+
+    results = []
+    to_create, to_update, to_delete = [], [], []
+    touched = set()
+    has_errors = False
+    for operation in operations:
+        if not isinstance(operation, dict):
+            operation = {}
+        kind = operation.get("op")
+        action_id = operation.get("id")
+        error = None
+        if kind not in ("create", "update", "delete"):
+            error = {"op": ["Неизвестная операция"]}
+        elif kind != "create" and (type(action_id) is not int or action_id not in existing):
+            error = {"id": ["Действие не найдено"]}
+        elif kind != "create" and action_id in touched:
+            error = {"id": ["Действие уже изменено в этом пакете"]}
+
+        if error is None and kind == "delete":
+            touched.add(action_id)
+            to_delete.append(existing[action_id])
+            results.append({"op": kind, "id": action_id, "status": "ok"})
+            continue
+        if error is None:
+            payload = operation.get("data") if isinstance(operation.get("data"), dict) else {}
+            error = {
+                field: ["Ожидается строка, число или null"]
+                for field in ACTION_FORM_FIELDS
+                if field in payload and not (payload[field] is None or isinstance(payload[field], (str, int, float)))
+            } or None
+        if error is None:
+            data = _action_form_data(payload)
+            data.setdefault("recurrence", DealAction.Recurrence.NONE)
+            form = DealActionForm(data, instance=existing[action_id] if kind == "update" else None)
+            if await sync_to_async(form.is_valid)():
+                action = form.save(commit=False)
+                action.deal = deal
+                if kind == "create":
+                    to_create.append(action)
+                else:
+                    touched.add(action_id)
+                    to_update.append(action)
+                results.append({"op": kind, "id": action_id, "status": "ok", "action": action})
+                continue
+            error = form.errors
+
+        has_errors = True
+        results.append({"op": kind, "id": action_id, "status": "error", "errors": error})
+
+    if has_errors:
+        for result in results:
+            result.pop("action", None)
+        return JsonResponse({"results": results}, status=400)
+
+    await sync_to_async(_apply_action_batch)(to_create, to_update, to_delete)
+
+    for result in results:
+        if "action" in result:
+            result["id"] = result["action"].pk
+            result["action"] = _serialize_action(result["action"])
+    return JsonResponse({"results": results})
+
+
+def _apply_action_batch(to_create, to_update, to_delete):
+    # transaction.atomic не работает в async-коде — вся транзакция в одном потоке.
+    with transaction.atomic():
+        DealAction.objects.bulk_create(to_create)
+        if to_update:
+            # bulk_update не вызывает save(): версию выставляем сами.
+            now = timezone.now()
+            for action in to_update:
+                action.updated_at = now
+            DealAction.objects.bulk_update(to_update, sorted(ACTION_FORM_FIELDS | {"remind_anchor", "updated_at"}))
+        # Массовые запись и обновление проходят мимо сигналов — индекс обновляем явно.
+        fulltext.index_objects(to_create + to_update)
+        if to_delete:
+            DealAction.objects.filter(pk__in=[action.pk for action in to_delete]).delete()
+
+
+@login_required
+@require_http_methods(["GET"])
+def actions_agenda(request):
+    try:
+        start = _parse_agenda_bound(request.GET.get("start"))
+        end = _parse_agenda_bound(request.GET.get("end"))
+    except ValueError:
+        return JsonResponse({"error": "Некорректная дата"}, status=400)
+    if start is None:
+        start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    if end is None:
+        end = start + timedelta(days=AGENDA_DEFAULT_DAYS)
+    if end <= start:
+        return JsonResponse({"error": "Конец периода должен быть позже начала"}, status=400)
+    if end - start > timedelta(days=AGENDA_MAX_DAYS):
+        return JsonResponse({"error": f"Период не может быть длиннее {AGENDA_MAX_DAYS} дней"}, status=400)
+
+    # Лента зависит от действий владельца и названий его сделок: версия — два
+    # агрегата по индексам (deal, updated_at) и (owner, updated_at).
+    actions_state = version_state(DealAction.objects.filter(deal__owner=request.user))
+    deals_state = version_state(Deal.objects.filter(owner=request.user))
+    etag = version_etag(
+        f"agenda-{request.user.pk}",
+        start,
+        end,
+        *actions_state.values(),
+        *deals_state.values(),
+    )
+    return conditional_json_response(
+        request,
+        etag,
+        lambda: _build_agenda(request.user, start, end),
+        last_modified=latest(actions_state["last_modified"], deals_state["last_modified"]),
+        use_last_modified=False,
+    )
+
+
+def _build_agenda(user, start, end):
+    # Разовые действия — только из окна; повторяющиеся — все, что начались до его конца.
+    actions = (
+        DealAction.objects.filter(deal__owner=user, starts_at__lt=end)
+        .filter(~Q(recurrence=DealAction.Recurrence.NONE) | Q(starts_at__gte=start))
+        .select_related("deal")
+        .order_by("pk")
+    )
+
+    occurrences = []
+    truncated = False
+    for action in actions.iterator(chunk_size=AGENDA_BATCH_SIZE):
+        remaining = AGENDA_MAX_OCCURRENCES - len(occurrences)
+        for occurs_at in recurrence.expand(
+            action.starts_at, action.recurrence, action.custom_interval_days, start, end, limit=remaining + 1
+        ):
+            if len(occurrences) >= AGENDA_MAX_OCCURRENCES:
+                truncated = True
+                break
+            occurrences.append((occurs_at, action))
+        if truncated:
+            break
+
+    occurrences.sort(key=lambda item: (item[0], item[1].pk))
+    return {
+        "start": timezone.localtime(start).isoformat(),
+        "end": timezone.localtime(end).isoformat(),
+        "truncated": truncated,
+        "occurrences": [_serialize_occurrence(action, occurs_at) for occurs_at, action in occurrences],
+    }
+
+
+def _parse_month(value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise ValueError(value) from None
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _pipeline_summary(rows):
+    """Свёртка строк (owner, stage, ...) в воронку по этапам и таблицу по владельцам."""
+    def empty():
+        return {"deal_count": 0, "total_cost": Decimal("0.00")}
+
+    stages, owners, total = {}, {}, empty()
+    for row in rows:
+        stage = stages.setdefault(row["stage"], {
+            "id": row["stage"],
+            "name": row["stage__name"] or "Без этапа",
+            "order_index": row["stage__order_index"],
+            **empty(),
+        })
+        owner = owners.setdefault(row["owner"], {"id": row["owner"], "username": row["owner__username"], "stages": {}, **empty()})
+        owner["stages"][row["stage"]] = {"deal_count": row["deal_count"], "total_cost": row["total_cost"]}
+        for bucket in (stage, owner, total):
+            bucket["deal_count"] += row["deal_count"]
+            bucket["total_cost"] += row["total_cost"]
+    # Сделки без этапа — в конце воронки.
+    stage_list = sorted(stages.values(), key=lambda item: (item["id"] is None, item["order_index"] or 0, item["id"] or 0))
+    owner_list = sorted(owners.values(), key=lambda item: item["username"])
+    for owner in owner_list:
+        owner["cells"] = [owner["stages"].get(stage["id"], empty()) for stage in stage_list]
+    return stage_list, owner_list, total
+
+
+def _serialize_bucket(bucket):
+    return {"deal_count": bucket["deal_count"], "total_cost": str(bucket["total_cost"])}
+
+
+def _parse_board_stage(value):
+    """Этап колонки: id, "none" — сделки без этапа. ValueError для неизвестного."""
+    if value in ("none", "", None):
+        return None
+    try:
+        stage_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(value)
+    if stage_id not in refdata.stage_by_id():
+        raise ValueError(value)
+    return stage_id
+
+
+def _board_columns(user):
+    """Колонки доски со счётчиками из PipelineRollup — без сканирования сделок."""
+    rows = PipelineRollup.objects.order_by()
+    if not user.is_superuser:
+        rows = rows.filter(owner=user)
+    totals = {
+        row["stage"]: row
+        for row in rows.values("stage").annotate(deal_count=Sum("deal_count"), total_cost=Sum("total_cost"))
+    }
+    empty = {"deal_count": 0, "total_cost": rollups.ZERO}
+    columns = [
+        {"id": stage.pk, "key": str(stage.pk), "name": stage.name, **_serialize_bucket(totals.get(stage.pk, empty))}
+        for stage in refdata.stages()
+    ]
+    columns.append({"id": None, "key": "none", "name": "Без этапа", **_serialize_bucket(totals.get(None, empty))})
+    return columns
+
+
+def _serialize_board_deal(deal):
+    return {
+        "id": deal.id,
+        "title": deal.title,
+        "cost": str(deal.cost) if deal.cost is not None else None,
+        "client": deal.client.name if deal.client_id else "",
+        "owner": deal.owner.username,
+        "updated_at": timezone.localtime(deal.updated_at).strftime("%d.%m.%Y %H:%M"),
+        "url": reverse("deal_edit", args=[deal.pk]),
+    }
+
+
+@login_required
+@require_http_methods(["GET"])
+def pipeline_board(request):
+    # Страница отдаёт только заголовки колонок; сделки колонки догружают сами.
+    return render(request, "deals/board.html", {"columns": _board_columns(request.user)})
+
+
+@login_required
+@require_http_methods(["GET"])
+def board_column(request):
+    try:
+        stage_id = _parse_board_stage(request.GET.get("stage"))
+    except ValueError:
+        return JsonResponse({"error": "Неизвестный этап"}, status=400)
+    try:
+        page_size = min(max(int(request.GET.get("per_page", BOARD_PAGE_SIZE)), 1), BOARD_MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = BOARD_PAGE_SIZE
+
+    # Индексы (owner, stage, -updated_at, -id) и (stage, -updated_at, -id).
+    deals = visible_deals(request.user).filter(stage_id=stage_id).select_related("client", "owner")
+    try:
+        page = paginate_keyset(deals, BOARD_ORDERING, cursor=request.GET.get("cursor"), page_size=page_size)
+    except InvalidCursor:
+        return JsonResponse({"error": "Некорректный курсор"}, status=400)
+    return JsonResponse(
+        {"deals": [_serialize_board_deal(deal) for deal in page.items], "next_cursor": page.next_cursor}
+    )
+
+
+@login_required
+@require_http_methods(["POST"])
+def board_move(request):
+    """
+    Перенос сделок на этап одним UPDATE: {"deals": [id, ...], "stage": id | null}.
+    UPDATE проходит мимо save() и сигналов, поэтому сводку воронки и updated_at
+    поддерживаем здесь явно.
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8") or "{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"error": "Ожидается объект"}, status=400)
+    deal_ids = payload.get("deals")
+    if not isinstance(deal_ids, list) or not all(isinstance(pk, int) for pk in deal_ids):
+        return JsonResponse({"error": "Ожидается список id сделок"}, status=400)
+    if len(deal_ids) > BOARD_MAX_MOVE:
+        return JsonResponse({"error": f"Не больше {BOARD_MAX_MOVE} сделок за раз"}, status=400)
+    try:
+        stage_id = _parse_board_stage(payload.get("stage"))
+    except ValueError:
+        return JsonResponse({"error": "Неизвестный этап"}, status=400)
+
+    with transaction.atomic():
+        # Чужие и уже стоящие на этапе сделки просто не попадают в выборку.
+        before = list(
+            visible_deals(request.user)
+            .filter(pk__in=deal_ids)
+            .exclude(stage_id=stage_id)
+            .select_for_update()
+            .values("pk", *rollups.FIELDS)
+        )
+        moved_ids = [row.pop("pk") for row in before]
+        if moved_ids:
+            Deal.objects.filter(pk__in=moved_ids).update(stage_id=stage_id, updated_at=timezone.now())
+            rollups.record_changes([(row, {**row, "stage_id": stage_id}) for row in before])
+
+    return JsonResponse({"moved": moved_ids, "columns": _board_columns(request.user)})
+
+
+@login_required
+@require_http_methods(["GET"])
+def pipeline_dashboard(request):
+    try:
+        start = _parse_month(request.GET.get("from"))
+        end = _parse_month(request.GET.get("to"))
+    except ValueError:
+        return JsonResponse({"error": "Месяц указывается как ГГГГ-ММ"}, status=400)
+    if end is None:
+        end = rollups.month_of(timezone.now())
+    if start is None:
+        start = _add_months(end, -(PIPELINE_DEFAULT_MONTHS - 1))
+    if end < start:
+        return JsonResponse({"error": "Конец периода должен быть не раньше начала"}, status=400)
+
+    # Только сводная таблица: сами сделки не сканируются.
+    rows = PipelineRollup.objects.filter(month__gte=start, month__lte=end)
+    if not request.user.is_superuser:
+        rows = rows.filter(owner=request.user)
+    elif request.GET.get("owner", "").isdigit():
+        rows = rows.filter(owner_id=int(request.GET["owner"]))
+    rows = rows.order_by()
+
+    stage_list, owner_list, total = _pipeline_summary(
+        rows.values("owner", "owner__username", "stage", "stage__name", "stage__order_index")
+        .annotate(deal_count=Sum("deal_count"), total_cost=Sum("total_cost"))
+        .filter(deal_count__gt=0)
+    )
+    months = list(
+        rows.values("month").annotate(deal_count=Sum("deal_count"), total_cost=Sum("total_cost")).order_by("month")
+    )
+
+    if request.GET.get("format") == "json" or "application/json" in request.META.get("HTTP_ACCEPT", ""):
+        return JsonResponse({
+            "from": start.strftime("%Y-%m"),
+            "to": end.strftime("%Y-%m"),
+            "total": _serialize_bucket(total),
+            "stages": [{"id": stage["id"], "name": stage["name"], **_serialize_bucket(stage)} for stage in stage_list],
+            "owners": [
+                {
+                    "id": owner["id"],
+                    "username": owner["username"],
+                    **_serialize_bucket(owner),
+                    "stages": [
+                        {"id": stage["id"], **_serialize_bucket(cell)}
+                        for stage, cell in zip(stage_list, owner["cells"])
+                    ],
+                }
+                for owner in owner_list
+            ],
+            "months": [
+                {"month": row["month"].strftime("%Y-%m"), **_serialize_bucket(row)}
+                for row in months if row["deal_count"]
+            ],
+        })
+    return render(
+        request,
+        "deals/pipeline.html",
+        {
+            "start": start,
+            "end": end,
+            "stages": stage_list,
+            "owners": owner_list,
+            "months": [row for row in months if row["deal_count"]],
+            "total": total,
+        },
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+def export_data(request, entity):
+    export_format = request.GET.get("format", "csv")
+    try:
+        lines = exports.export(entity, request.user, request.GET, export_format, columns=request.GET.get("columns"))
+    except exports.ExportError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    if isinstance(request, ASGIRequest):
+        # Синхронный поток под ASGI Django сначала собирает в список — вся выгрузка оказалась бы в памяти.
+        lines = aiter_sync(lines)
+    response = StreamingHttpResponse(lines, content_type=exports.FORMATS[export_format])
+    filename = f"{entity}-{timezone.localdate():%Y%m%d}.{export_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def deals_list(request):
-    if request.user.is_superuser:
-        deals = Deal.objects.all().order_by("-updated_at")
-    else:
-        deals = Deal.objects.filter(owner=request.user).order_by("-updated_at")
-    return render(request, "deals/deals_list.html", {"deals": deals})
+    deals, filters = filter_deals(visible_deals(request.user), request.GET)
+
+    sort = request.GET.get("sort", DEFAULT_DEALS_SORT)
+    if sort not in DEALS_SORTS:
+        sort = DEFAULT_DEALS_SORT
+    try:
+        page_size = min(max(int(request.GET.get("per_page", DEALS_PAGE_SIZE)), 1), 200)
+    except ValueError:
+        page_size = DEALS_PAGE_SIZE
+
+    try:
+        page = paginate_keyset(
+            deals.select_related("stage", "owner", "client"),
+            DEALS_SORTS[sort],
+            cursor=request.GET.get("cursor"),
+            page_size=page_size,
+        )
+    except InvalidCursor:
+        return redirect(f"{request.path}?{urlencode({**filters, 'sort': sort})}")
+
+    base_query = {**filters, "per_page": page_size}
+    sort_links = {}
+    for column in ("title", "updated_at", "created_at"):
+        next_sort = f"-{column}" if sort == column else column
+        sort_links[column] = urlencode({**base_query, "sort": next_sort})
+
+    return render(
+        request,
+        "deals/deals_list.html",
+        {
+            "deals": page.items,
+            "page": page,
+            "sort": sort,
+            "filters": filters,
+            "stages": refdata.stages(),
+            "sort_links": sort_links,
+            "first_page_query": urlencode({**base_query, "sort": sort}),
+            "export_query": urlencode(filters),
+            "next_page_query": urlencode({**base_query, "sort": sort, "cursor": page.next_cursor})
+            if page.has_next else "",
+        },
+    )
 
 @login_required
 def deal_detail(request, pk):
     deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return HttpResponseForbidden("Нет доступа")
-    stages = Stage.objects.all().order_by("order_index")
-    return render(request, "deals/deal_detail.html", {"deal": deal, "stages": stages})
+    return render(request, "deals/deal_detail.html", {"deal": deal, "stages": refdata.stages()})
 
 @login_required
+@csrf_exempt
 def upload_document(request, pk):
+    # Обработчик загрузки нужно подменить до того, как CSRF-проверка прочитает тело запроса.
+    request.upload_handlers = [BlobUploadHandler(request)]
+    return _upload_document(request, pk)
+
+@csrf_protect
+def _upload_document(request, pk):
     deal = get_object_or_404(Deal, pk=pk)
-    if not (request.user.is_superuser or deal.owner == request.user):
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
         return HttpResponseForbidden("Нет доступа")
     if request.method == "POST":
         form = DocumentUploadForm(request.POST, request.FILES)
-        if form.is_valid():
+        handler = request.upload_handlers[0]
+        if handler.rejected:
+            form.errors.pop("file", None)
+            form.add_error("file", f"Файл слишком большой. Максимум {handler.max_size} байт.")
+        elif form.is_valid():
             f = form.cleaned_data["file"]
-            max_size = getattr(settings, "MAX_UPLOAD_SIZE", 200 * 1024 * 1024)
-            if f.size > max_size:
-                form.add_error("file", f"Файл слишком большой. Максимум {max_size} байт.")
-            else:
-                chunks = []
-                for chunk in f.chunks():
-                    chunks.append(chunk)
-                blob = b"".join(chunks)
+            with transaction.atomic(), Blob.objects.acquiring(f.writer) as blob:
                 Document.objects.create(
                     deal=deal,
                     filename=f.name,
-                    content_type=getattr(f, "content_type", ""),
+                    content_type=f.content_type,
                     size=f.size,
-                    data=blob,
+                    blob=blob,
                     uploader=request.user,
                 )
-                return redirect("deal_edit", pk=deal.pk)
+            return redirect("deal_edit", pk=deal.pk)
     else:
         form = DocumentUploadForm()
     return render(request, "deals/upload_document.html", {"form": form, "deal": deal})
 
+def _serialize_document(doc):
+    return {
+        "id": doc.id,
+        "filename": doc.filename,
+        "size": doc.size,
+        "content_type": doc.content_type,
+        "uploaded_at": timezone.localtime(doc.uploaded_at).isoformat(),
+        "uploader": {"id": doc.uploader_id, "username": doc.uploader.username} if doc.uploader_id else None,
+        "download_url": reverse("download_document", args=[doc.id]),
+    }
+
+
 @login_required
-def download_document(request, doc_id):
-    doc = get_object_or_404(Document, pk=doc_id)
-    if not (request.user.is_superuser or doc.deal.owner == request.user):
+@require_http_methods(["GET"])
+def deal_documents(request, pk):
+    deal = get_object_or_404(Deal, pk=pk)
+    if not (request.user.is_superuser or deal.owner_id == request.user.id):
+        return JsonResponse({"error": "Нет доступа"}, status=403)
+
+    # Один агрегатный запрос: любое добавление или удаление меняет count или max(id).
+    state = deal.documents.aggregate(count=Count("id"), last_id=Max("id"))
+    etag = f'"docs-{deal.pk}-{state["count"]}-{state["last_id"] or 0}"'
+
+    def build_payload():
+        documents = deal.documents.select_related("uploader").order_by("uploaded_at", "id")
+        return {"documents": [_serialize_document(doc) for doc in documents]}
+
+    return conditional_json_response(request, etag, build_payload)
+
+
+@async_login_required
+async def download_document(request, doc_id):
+    doc = await aget_object_or_404(Document.objects.select_related("deal", "blob").defer("data"), pk=doc_id)
+    if not (request.user.is_superuser or doc.deal.owner_id == request.user.id):
         return HttpResponseForbidden("Нет доступа")
-    response = HttpResponse(doc.data, content_type=doc.content_type or "application/octet-stream")
-    response["Content-Length"] = str(doc.size)
-    response["Content-Disposition"] = f'attachment; filename="{smart_str(doc.filename)}"'
-    return response
+    return document_response(request, doc)
 
 @login_required
 def delete_document(request, doc_id):
-    doc = get_object_or_404(Document, pk=doc_id)
-    if not (request.user.is_superuser or doc.deal.owner == request.user):
+    doc = get_object_or_404(Document.objects.select_related("deal").defer("data"), pk=doc_id)
+    if not (request.user.is_superuser or doc.deal.owner_id == request.user.id):
         return HttpResponseForbidden("Нет доступа")
     deal_id = doc.deal.pk
     doc.delete()
     return redirect("deal_edit", pk=deal_id)
+
+
+# Заголовки, которые ставит reverse proxy: запрос пришёл не напрямую от клиента.
+PROXY_HEADERS = ("Forwarded", "X-Forwarded-For", "X-Real-IP")
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    # Без логина — для локального сборщика; доступ по адресу и, если задан, по токену.
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden("Нет доступа")
+    token = settings.METRICS_TOKEN
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return HttpResponseForbidden("Нет доступа")
+    elif any(header in request.headers for header in PROXY_HEADERS):
+        # За локальным reverse proxy REMOTE_ADDR — адрес самого прокси, то есть любой клиент.
+        return HttpResponseForbidden("Через прокси /metrics доступен только с METRICS_TOKEN")
+    return HttpResponse(metrics.REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")